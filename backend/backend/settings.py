@@ -40,6 +40,8 @@ INSTALLED_APPS = [
     'suppliers',
     'purchase_orders',
     'products',
+    'fx',
+    'documents',
 ]
 
 MIDDLEWARE = [
@@ -79,6 +81,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets readers proceed while a writer commits; IMMEDIATE takes
+            # the write lock up front instead of failing on lock upgrade.
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -158,6 +167,22 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Client IPs come from REMOTE_ADDR unless the app runs behind this many
+    # trusted proxies, so X-Forwarded-For cannot be spoofed to dodge limits.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    'DEFAULT_THROTTLE_CLASSES': [
+        'users.throttling.AnonBurstRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_RATE_ANON', '300/min'),
+        'write': os.environ.get('THROTTLE_RATE_WRITE', '60/min'),
+        'login': os.environ.get('THROTTLE_RATE_LOGIN', '20/min'),
+        'login_identifier': os.environ.get('THROTTLE_RATE_LOGIN_IDENTIFIER', '5/min'),
+        'register': os.environ.get('THROTTLE_RATE_REGISTER', '10/hour'),
+        'password_reset': os.environ.get('THROTTLE_RATE_PASSWORD_RESET', '10/hour'),
+        'password_reset_email': os.environ.get('THROTTLE_RATE_PASSWORD_RESET_EMAIL', '3/hour'),
+        'password_reset_verify': os.environ.get('THROTTLE_RATE_PASSWORD_RESET_VERIFY', '30/hour'),
+    },
 }
 
 
@@ -167,7 +192,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login is written in batches by users.last_login instead
+    'UPDATE_LAST_LOGIN': False,
     
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
@@ -176,6 +202,11 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# Buffered last_login updates (see users/last_login.py). An interval of 0
+# writes each login immediately.
+LAST_LOGIN_FLUSH_INTERVAL_SECONDS = int(os.environ.get('LAST_LOGIN_FLUSH_INTERVAL_SECONDS', 30))
+LAST_LOGIN_UPDATE_GRANULARITY_SECONDS = int(os.environ.get('LAST_LOGIN_UPDATE_GRANULARITY_SECONDS', 300))
+
 
 # Email Settings
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
@@ -194,6 +225,36 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Prime Apparel CRM <no
 # Password reset configuration
 PASSWORD_RESET_OTP_EXPIRY_MINUTES = int(os.environ.get('PASSWORD_RESET_OTP_EXPIRY_MINUTES', 10))
 PASSWORD_RESET_MAX_ATTEMPTS = int(os.environ.get('PASSWORD_RESET_MAX_ATTEMPTS', 5))
+PASSWORD_RESET_RETENTION_HOURS = int(os.environ.get('PASSWORD_RESET_RETENTION_HOURS', 24))
+
+# Lead intake: submissions with the same email and product type within this
+# window are merged into one lead
+LEAD_DEDUP_WINDOW_HOURS = int(os.environ.get('LEAD_DEDUP_WINDOW_HOURS', 24))
+
+# Automatic assignment of new unassigned leads: 'least_open', 'round_robin',
+# or '' to disable (see leads/assignment.py)
+LEAD_ASSIGNMENT_STRATEGY = os.environ.get('LEAD_ASSIGNMENT_STRATEGY', 'least_open')
+
+# Reference attachment uploads (see leads/attachments.py)
+LEAD_ATTACHMENT_MAX_BYTES = int(os.environ.get('LEAD_ATTACHMENT_MAX_BYTES', 10 * 1024 * 1024))
+LEAD_ATTACHMENT_MAX_FILES = int(os.environ.get('LEAD_ATTACHMENT_MAX_FILES', 10))
+
+# Currency that costings, orders and purchase orders are normalized to, and
+# how long each process caches the exchange rate table (see fx/rates.py)
+BASE_CURRENCY = os.environ.get('BASE_CURRENCY', 'USD').upper()
+FX_RATE_CACHE_SECONDS = int(os.environ.get('FX_RATE_CACHE_SECONDS', 300))
+
+# Document numbering (see documents/numbering.py). Formats may use {type},
+# {year} and {number}; numbering years start in the given month (4 for an
+# April-March financial year). Each process reserves numbers in blocks.
+DOCUMENT_NUMBER_FORMATS = {
+    'PI': os.environ.get('PI_NUMBER_FORMAT', 'PI-{year}-{number:05d}'),
+    'PO': os.environ.get('PO_NUMBER_FORMAT', 'PO-{year}-{number:05d}'),
+}
+DOCUMENT_NUMBER_YEAR_START_MONTH = int(os.environ.get('DOCUMENT_NUMBER_YEAR_START_MONTH', 1))
+DOCUMENT_NUMBER_BLOCK_SIZE = int(os.environ.get('DOCUMENT_NUMBER_BLOCK_SIZE', 20))
+# Threads rendering order PDFs in the background (see orders/invoices.py)
+ORDER_DOCUMENT_WORKERS = int(os.environ.get('ORDER_DOCUMENT_WORKERS', 2))
 
 # reCAPTCHA (Google) settings
 RECAPTCHA_SITE_KEY = os.environ.get('RECAPTCHA_SITE_KEY', '')
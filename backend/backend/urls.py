@@ -15,6 +15,8 @@ urlpatterns = [
     path('api/users/manage/', include('users.admin_urls')),
     path('api/leads/', include('leads.urls')),
     path('api/products/', include('products.urls')),
+    path('api/costings/', include('costings.urls')),
+    path('api/orders/', include('orders.urls')),
 ]
 
 # Serve media files in development
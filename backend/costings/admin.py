@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Costing
+from .models import Costing, CostingRevision
+from .pricing import recalculate
 
 
 @admin.register(Costing)
@@ -7,7 +8,8 @@ class CostingAdmin(admin.ModelAdmin):
     list_display = ['style_name', 'style_number', 'exw_price', 'currency', 'created_by', 'created_at']
     list_filter = ['currency', 'created_at']
     search_fields = ['style_name', 'style_number']
-    readonly_fields = ['exw_price', 'total_price', 'created_at', 'updated_at']
+    readonly_fields = ['exw_price', 'total_price', 'exw_price_base', 'created_at', 'updated_at']
+    actions = ['recalculate_prices']
     
     fieldsets = (
         ('Style Information', {
@@ -17,10 +19,33 @@ class CostingAdmin(admin.ModelAdmin):
             'fields': ('fabric_cost', 'fabric_consumption', 'trim_cost', 'cm_cost', 'packing_cost', 'overhead_cost')
         }),
         ('Pricing', {
-            'fields': ('profit_margin', 'currency', 'exw_price', 'total_price')
+            'fields': ('profit_margin', 'currency', 'exw_price', 'total_price', 'exw_price_base')
         }),
         ('Additional', {
             'fields': ('notes', 'created_by', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+
+    def save_model(self, request, obj, form, change):
+        obj._revision_user = request.user
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Recalculate prices of selected costings')
+    def recalculate_prices(self, request, queryset):
+        updated = recalculate(queryset, user=request.user)
+        self.message_user(request, f'Recalculated prices for {updated} costings.')
+
+
+@admin.register(CostingRevision)
+class CostingRevisionAdmin(admin.ModelAdmin):
+    list_display = ['costing', 'revision', 'is_snapshot', 'style_number', 'user', 'created_at']
+    list_filter = ['is_snapshot', 'created_at']
+    search_fields = ['style_number']
+    readonly_fields = ['costing', 'revision', 'is_snapshot', 'changes', 'style_number', 'user', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,51 @@
+"""
+Django management command to recompute costing prices in the database
+Usage: python manage.py recalculate_costings [--check] [--drifted-only] [--currency USD] [--lead ID] [--id ID ...]
+
+Prices are normally computed by Costing.save; run this after bulk_update,
+QuerySet.update or raw SQL edits to cost components. Prices are rewritten
+with one UPDATE per batch of costings. With --check, drifted costings are
+only reported.
+"""
+from django.core.management.base import BaseCommand
+
+from costings.models import Costing
+from costings.pricing import drifted, recalculate
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Costing exw_price/total_price in SQL, or reports drifted rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report costings with stale prices')
+        parser.add_argument('--drifted-only', action='store_true', help='Only update costings with stale prices')
+        parser.add_argument('--currency')
+        parser.add_argument('--lead', type=int)
+        parser.add_argument('--id', type=int, action='append', dest='ids')
+
+    def handle(self, *args, **options):
+        costings = Costing.objects.all()
+        if options['currency']:
+            costings = costings.filter(currency=options['currency'].upper())
+        if options['lead']:
+            costings = costings.filter(lead_id=options['lead'])
+        if options['ids']:
+            costings = costings.filter(pk__in=options['ids'])
+
+        if options['check']:
+            stale = drifted(costings)
+            ids = list(stale.order_by('pk').values_list('pk', flat=True)[:20])
+            total = stale.count()
+            if not total:
+                self.stdout.write(self.style.SUCCESS('All costing prices are up to date'))
+                return
+            more = ', ...' if total > len(ids) else ''
+            self.stdout.write(self.style.WARNING(
+                f'{total} costings have stale prices: {", ".join(map(str, ids))}{more}'
+            ))
+            return
+
+        if options['drifted_only']:
+            costings = Costing.objects.filter(pk__in=drifted(costings).values('pk'))
+        updated = recalculate(costings)
+        self.stdout.write(self.style.SUCCESS(f'Recalculated prices for {updated} costings'))
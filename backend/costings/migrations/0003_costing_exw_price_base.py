@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_base_currency_amounts(apps, schema_editor):
+    # Other currencies need exchange rates: run load_fx_rates afterwards
+    Costing = apps.get_model('costings', 'Costing')
+    base = getattr(settings, 'BASE_CURRENCY', 'USD')
+    Costing.objects.filter(currency__iexact=base).update(exw_price_base=F('exw_price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costings', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='costing',
+            name='exw_price_base',
+            field=models.DecimalField(decimal_places=2, editable=False, help_text='EXW price in the base currency (see fx/rates.py)', max_digits=12, null=True),
+        ),
+        migrations.RunPython(copy_base_currency_amounts, migrations.RunPython.noop),
+    ]
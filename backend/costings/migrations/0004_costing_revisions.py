@@ -0,0 +1,67 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:26
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def snapshot_existing_costings(apps, schema_editor):
+    from costings.models import Costing as CurrentCosting
+
+    Costing = apps.get_model('costings', 'Costing')
+    CostingRevision = apps.get_model('costings', 'CostingRevision')
+    attnames = [CurrentCosting._meta.get_field(name).attname for name in CurrentCosting.REVISED_FIELDS]
+    batch = []
+    for row in Costing.objects.values('pk', 'created_by_id', *attnames).iterator(chunk_size=1000):
+        changes = {
+            name: str(row[attname]) if isinstance(row[attname], Decimal) else row[attname]
+            for name, attname in zip(CurrentCosting.REVISED_FIELDS, attnames)
+        }
+        batch.append(CostingRevision(
+            costing_id=row['pk'], revision=1, is_snapshot=True, changes=changes,
+            style_number=row['style_number'], user_id=row['created_by_id'],
+        ))
+        if len(batch) >= 1000:
+            CostingRevision.objects.bulk_create(batch)
+            batch = []
+    CostingRevision.objects.bulk_create(batch)
+    Costing.objects.update(current_revision=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costings', '0003_costing_exw_price_base'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='costing',
+            name='current_revision',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='CostingRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.PositiveIntegerField()),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('changes', models.JSONField(help_text='Revised field values; all of them for snapshots, else only changed ones')),
+                ('style_number', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('costing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='costings.costing')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Costing Revision',
+                'verbose_name_plural': 'Costing Revisions',
+                'ordering': ['costing', '-revision'],
+                'indexes': [models.Index(fields=['costing', 'is_snapshot', '-revision'], name='costing_rev_snapshot_idx'), models.Index(fields=['style_number', '-created_at'], name='costing_rev_style_idx')],
+                'constraints': [models.UniqueConstraint(fields=('costing', 'revision'), name='costing_revision_uniq')],
+            },
+        ),
+        migrations.RunPython(snapshot_existing_costings, migrations.RunPython.noop),
+    ]
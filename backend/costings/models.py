@@ -1,6 +1,12 @@
+from decimal import Decimal
+
 from django.db import models
 from django.conf import settings
 
+from fx.rates import to_base
+
+from .pricing import exw_price
+
 
 class Costing(models.Model):
     """
@@ -24,6 +30,10 @@ class Costing(models.Model):
     currency = models.CharField(max_length=3, default='USD')
     exw_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False, null=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False, null=True)
+    exw_price_base = models.DecimalField(
+        max_digits=12, decimal_places=2, editable=False, null=True,
+        help_text='EXW price in the base currency (see fx/rates.py)'
+    )
     
     # Additional Info
     notes = models.TextField(blank=True)
@@ -32,6 +42,9 @@ class Costing(models.Model):
     lead = models.ForeignKey('leads.Lead', on_delete=models.SET_NULL, null=True, blank=True, related_name='costings')
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     
+    # Number of the latest CostingRevision (see costings/revisions.py)
+    current_revision = models.PositiveIntegerField(default=0, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -41,19 +54,83 @@ class Costing(models.Model):
         verbose_name = 'Costing'
         verbose_name_plural = 'Costings'
     
+    # Fields whose values are kept in CostingRevision
+    REVISED_FIELDS = [
+        'style_name', 'style_number', 'fabric_cost', 'fabric_consumption',
+        'trim_cost', 'cm_cost', 'packing_cost', 'overhead_cost',
+        'profit_margin', 'currency', 'exw_price', 'total_price', 'notes', 'lead',
+    ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._revision_snapshot = instance.revision_values()
+        return instance
+    
+    def revision_values(self):
+        """
+        JSON-ready values of the loaded REVISED_FIELDS. Decimals are written
+        with the field's decimal places, as they are stored, so a value reads
+        the same whether it was assigned ('5') or loaded ('5.00').
+        """
+        values = {}
+        for name in self.REVISED_FIELDS:
+            field = self._meta.get_field(name)
+            if field.attname in self.__dict__:
+                value = self.__dict__[field.attname]
+                if isinstance(field, models.DecimalField) and value is not None:
+                    value = str(field.to_python(value).quantize(Decimal(1).scaleb(-field.decimal_places)))
+                values[name] = value
+        return values
+    
     def save(self, *args, **kwargs):
         """Auto-calculate prices before saving"""
-        base_cost = (
-            (self.fabric_cost * self.fabric_consumption) +
-            self.trim_cost +
-            self.cm_cost +
-            self.packing_cost +
-            self.overhead_cost
+        self.exw_price = exw_price(
+            self.fabric_cost,
+            self.fabric_consumption,
+            self.trim_cost,
+            self.cm_cost,
+            self.packing_cost,
+            self.overhead_cost,
+            self.profit_margin,
         )
-        profit_amount = base_cost * (self.profit_margin / 100)
-        self.exw_price = base_cost + profit_amount
         self.total_price = self.exw_price
+        self.currency = (self.currency or '').upper()
+        self.exw_price_base = to_base(self.exw_price, self.currency, self.created_at)
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f'{self.style_name} - ${self.exw_price:.2f} EXW'
+
+
+class CostingRevision(models.Model):
+    """
+    Append-only history of a costing. Revision 1 and every
+    REVISION_SNAPSHOT_INTERVAL-th revision store all revised fields; the
+    others only the fields that changed (see costings/revisions.py).
+    """
+    costing = models.ForeignKey(Costing, on_delete=models.CASCADE, related_name='revisions')
+    revision = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    changes = models.JSONField(help_text='Revised field values; all of them for snapshots, else only changed ones')
+    # Denormalized from the costing for per-style queries
+    style_number = models.CharField(max_length=100, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['costing', '-revision']
+        verbose_name = 'Costing Revision'
+        verbose_name_plural = 'Costing Revisions'
+        constraints = [
+            models.UniqueConstraint(fields=['costing', 'revision'], name='costing_revision_uniq'),
+        ]
+        indexes = [
+            # Snapshot lookup when reconstructing a version
+            models.Index(fields=['costing', 'is_snapshot', '-revision'], name='costing_rev_snapshot_idx'),
+            # Latest revisions per style
+            models.Index(fields=['style_number', '-created_at'], name='costing_rev_style_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.costing_id} r{self.revision}'
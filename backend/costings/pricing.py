@@ -0,0 +1,232 @@
+"""
+Costing price formula.
+
+    base = fabric_cost * fabric_consumption + trim + cm + packing + overhead
+    exw  = base * (1 + profit_margin / 100), rounded half-even to cents
+
+``exw_price`` computes one price with Decimal arithmetic and is what
+``Costing.save`` uses. ``price_matrix`` evaluates the same formula for many
+variants and what-if scenarios at once: every input has two decimal places,
+so the computation is carried out on scaled integers (exact, and much
+faster than Decimal), each base cost is reused for every margin, and the
+results are rounded to cents exactly like ``exw_price``. Adjusted inputs
+are rounded to cents first, as the model fields would store them.
+``exw_price_expression`` is the same computation in SQL, used to recompute
+and check stored prices in bulk (bulk_update and QuerySet.update bypass
+``Costing.save``).
+"""
+from decimal import ROUND_HALF_EVEN, Decimal
+from itertools import product
+
+from django.db import transaction
+from django.db.models import BigIntegerField, BooleanField, Case, DecimalField, ExpressionWrapper, F, Q, Value, When
+from django.db.models.functions import Cast, Mod, Round
+from django.db.models.lookups import Exact, GreaterThan
+
+CENTS = Decimal('0.01')
+
+COMPONENT_FIELDS = ('fabric_cost', 'fabric_consumption', 'trim_cost', 'cm_cost', 'packing_cost', 'overhead_cost')
+# Fields what-if scenarios may adjust by a percentage
+ADJUSTABLE_FIELDS = COMPONENT_FIELDS
+MAX_MATRIX_CELLS = 200_000
+
+
+def exw_price(fabric_cost, fabric_consumption, trim_cost, cm_cost, packing_cost, overhead_cost, profit_margin):
+    # Unsaved instances may still hold the fields' int defaults
+    fabric_cost, fabric_consumption, trim_cost, cm_cost, packing_cost, overhead_cost, profit_margin = (
+        Decimal(str(value)) for value in
+        (fabric_cost, fabric_consumption, trim_cost, cm_cost, packing_cost, overhead_cost, profit_margin)
+    )
+    base_cost = fabric_cost * fabric_consumption + trim_cost + cm_cost + packing_cost + overhead_cost
+    return (base_cost + base_cost * (profit_margin / 100)).quantize(CENTS, rounding=ROUND_HALF_EVEN)
+
+
+def _cents(value):
+    return int(Decimal(value).quantize(CENTS, rounding=ROUND_HALF_EVEN) * 100)
+
+
+def _divide(numerator, denominator):
+    """Integer division rounded half-even, matching Decimal quantization."""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def _adjust_cents(cents, basis_points):
+    return _divide(cents * (10_000 + basis_points), 10_000)
+
+
+def price_matrix(variants, adjustments=None, profit_margins=None):
+    """
+    Price every variant under every scenario.
+
+    ``variants`` are mappings with the COMPONENT_FIELDS and ``profit_margin``.
+    ``adjustments`` maps ADJUSTABLE_FIELDS to lists of percentage changes and
+    ``profit_margins`` optionally replaces each variant's own margin with each
+    of the given values; scenarios are all combinations of these. Returns
+    ``(scenarios, prices)`` where ``prices[v][s]`` is the EXW price of variant
+    ``v`` under scenario ``s``.
+    """
+    adjustments = {name: values for name, values in (adjustments or {}).items() if values}
+    unknown = set(adjustments) - set(ADJUSTABLE_FIELDS)
+    if unknown:
+        raise ValueError(f'Cannot adjust: {", ".join(sorted(unknown))}')
+    if len(variants) * scenario_count(adjustments, profit_margins) > MAX_MATRIX_CELLS:
+        raise ValueError(f'At most {MAX_MATRIX_CELLS} prices can be computed per request.')
+
+    adjusted_names = list(adjustments)
+    margin_axis = [_cents(margin) for margin in profit_margins] if profit_margins else [None]
+    combos = list(product(*([_cents(value) for value in adjustments[name]] for name in adjusted_names)))
+
+    scenarios = [
+        {
+            'adjustments': {name: Decimal(bp).scaleb(-2) for name, bp in zip(adjusted_names, combo)},
+            'profit_margin': Decimal(margin).scaleb(-2) if margin is not None else None,
+        }
+        for combo in combos
+        for margin in margin_axis
+    ]
+
+    prices = []
+    for variant in variants:
+        cents = {name: _cents(variant.get(name) or 0) for name in COMPONENT_FIELDS}
+        own_margin = _cents(variant.get('profit_margin') or 0)
+        row = []
+        for combo in combos:
+            values = dict(cents)
+            for name, basis_points in zip(adjusted_names, combo):
+                values[name] = _adjust_cents(values[name], basis_points)
+            # base cost in units of 1e-4
+            base = (
+                values['fabric_cost'] * values['fabric_consumption']
+                + 100 * (values['trim_cost'] + values['cm_cost'] + values['packing_cost'] + values['overhead_cost'])
+            )
+            for margin in margin_axis:
+                margin = own_margin if margin is None else margin
+                # base * (10000 + margin) is in units of 1e-8; round to cents
+                row.append(Decimal(_divide(base * (10_000 + margin), 1_000_000)).scaleb(-2))
+        prices.append(row)
+    return scenarios, prices
+
+
+def scenario_count(adjustments=None, profit_margins=None):
+    count = len(profit_margins) if profit_margins else 1
+    for values in (adjustments or {}).values():
+        count *= len(values) or 1
+    return count
+
+
+
+def _cents_expression(field):
+    return Cast(Round(F(field) * 100), BigIntegerField())
+
+
+def exw_price_expression():
+    """
+    ``exw_price`` as a database expression over a costing's own columns, so
+    prices can be recomputed and checked in SQL. Uses the same integer
+    arithmetic and half-even rounding as ``price_matrix``.
+    """
+    integer = BigIntegerField()
+    base = ExpressionWrapper(
+        _cents_expression('fabric_cost') * _cents_expression('fabric_consumption')
+        + 100 * (
+            _cents_expression('trim_cost') + _cents_expression('cm_cost')
+            + _cents_expression('packing_cost') + _cents_expression('overhead_cost')
+        ),
+        output_field=integer,
+    )
+    scaled = ExpressionWrapper(base * (10_000 + _cents_expression('profit_margin')), output_field=integer)
+    quotient = ExpressionWrapper(scaled / 1_000_000, output_field=integer)
+    remainder = ExpressionWrapper(scaled - quotient * 1_000_000, output_field=integer)
+    cents = Case(
+        When(GreaterThan(remainder, 500_000), then=quotient + 1),
+        When(Exact(remainder, 500_000), then=quotient + Mod(quotient, 2)),
+        default=quotient,
+        output_field=integer,
+    )
+    # Divide by a float literal: integer division would truncate, and the
+    # result is the closest double to the exact price, i.e. what storing the
+    # Decimal price writes on backends without a native decimal type.
+    return ExpressionWrapper(cents / Value(100.0), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def _differs(field):
+    return Case(
+        When(Q(**{f'{field}__isnull': True}) | ~Q(**{field: F('recalculated_price')}), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
+def recalculate(queryset, user=None, batch_size=50_000, chunk_size=2000):
+    """
+    Recompute exw_price/total_price of every costing in ``queryset``, one
+    UPDATE per ``batch_size`` costings (consecutive pk ranges of the
+    queryset). Base-currency prices are set in the same statement for
+    costings in the base currency and cleared for the others, which are then
+    converted by fx.rates.normalize. Costings whose prices change get a
+    revision by ``user``, as a save would give them. The costings and which
+    of their prices change are read before anything is written, so a
+    queryset filtered on the prices (such as ``drifted()``) is recalculated
+    in full.
+    """
+    from fx.rates import NORMALIZED_AMOUNTS, base_currency, normalize
+
+    from .revisions import record_price_revisions
+
+    spec = next(spec for spec in NORMALIZED_AMOUNTS if spec.model == 'costings.Costing')
+    price = exw_price_expression()
+    base = base_currency()
+    queryset = queryset.order_by()
+    ids, changed, foreign = [], {}, []
+    updated = 0
+    with transaction.atomic():
+        rows = (
+            queryset
+            .annotate(recalculated_price=price)
+            .annotate(exw_changed=_differs('exw_price'), total_changed=_differs('total_price'))
+            .order_by('pk')
+            .values_list('pk', 'currency', 'exw_changed', 'total_changed')
+        )
+        for pk, currency, exw_changed, total_changed in rows.iterator(chunk_size=5000):
+            ids.append(pk)
+            if exw_changed or total_changed:
+                changed[pk] = [name for name, flag in (('exw_price', exw_changed), ('total_price', total_changed)) if flag]
+            if currency.upper() != base:
+                foreign.append(pk)
+
+        for start in range(0, len(ids), batch_size):
+            end = ids[min(start + batch_size, len(ids)) - 1]
+            updated += queryset.filter(pk__gte=ids[start], pk__lte=end).update(
+                exw_price=price,
+                total_price=price,
+                exw_price_base=Case(
+                    When(currency__iexact=base, then=price),
+                    default=Value(None),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
+
+        changed = list(changed.items())
+        for start in range(0, len(changed), chunk_size):
+            record_price_revisions(dict(changed[start:start + chunk_size]), user=user)
+        for start in range(0, len(foreign), chunk_size):
+            normalize(spec, queryset.model.objects.filter(pk__in=foreign[start:start + chunk_size]))
+    return updated
+
+
+def drifted(queryset):
+    """Costings whose stored prices differ from what the formula gives."""
+    return (
+        queryset
+        .annotate(expected_price=exw_price_expression())
+        .filter(
+            Q(exw_price__isnull=True)
+            | Q(total_price__isnull=True)
+            | ~Q(exw_price=F('expected_price'))
+            | ~Q(total_price=F('expected_price'))
+        )
+    )
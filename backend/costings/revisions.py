@@ -0,0 +1,111 @@
+"""
+Costing revisions.
+
+Every save of a costing that changes one of ``Costing.REVISED_FIELDS``
+appends a ``CostingRevision`` holding only the changed values, and so does
+every price change made in bulk by pricing.recalculate. Every
+REVISION_SNAPSHOT_INTERVAL revisions (and for the first one) all values are
+stored instead, so a version is rebuilt from the nearest snapshot plus at
+most that many small diffs rather than from the whole history.
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import Costing, CostingRevision
+
+REVISION_SNAPSHOT_INTERVAL = 20
+
+
+def record_revision(costing, user_id=None, created=False):
+    """Append a revision for the changes since ``costing`` was loaded; returns it or None."""
+    before = None if created else getattr(costing, '_revision_snapshot', None)
+    after = costing.revision_values()
+    costing._revision_snapshot = after
+    if before is None and not created:
+        # Loaded without a snapshot (e.g. built by hand); nothing to compare with
+        return None
+    changes = after if before is None else {
+        name: value for name, value in after.items() if name not in before or before[name] != value
+    }
+    if not changes:
+        return None
+
+    with transaction.atomic():
+        current = (
+            Costing.objects.select_for_update()
+            .filter(pk=costing.pk)
+            .values_list('current_revision', flat=True)
+            .get()
+        )
+        revision = current + 1
+        is_snapshot = revision == 1 or revision % REVISION_SNAPSHOT_INTERVAL == 0
+        if is_snapshot and len(after) < len(Costing.REVISED_FIELDS):
+            # Deferred fields: complete the snapshot from the database
+            after = Costing.objects.get(pk=costing.pk).revision_values()
+        entry = CostingRevision.objects.create(
+            costing_id=costing.pk,
+            revision=revision,
+            is_snapshot=is_snapshot,
+            changes=after if is_snapshot else changes,
+            style_number=costing.__dict__.get('style_number', ''),
+            user_id=user_id,
+        )
+        Costing.objects.filter(pk=costing.pk).update(current_revision=F('current_revision') + 1)
+    costing.current_revision = revision
+    return entry
+
+
+def record_price_revisions(changed_fields, user=None):
+    """
+    Append a revision to each costing whose prices were rewritten in SQL
+    (see pricing.recalculate), ``changed_fields`` mapping costing ids to the
+    names of the fields that changed. Must run in the transaction that
+    rewrote the prices, after the rewrite.
+    """
+    if not changed_fields:
+        return []
+    entries = []
+    for costing in Costing.objects.select_for_update().filter(pk__in=list(changed_fields)).order_by('pk'):
+        revision = costing.current_revision + 1
+        is_snapshot = revision == 1 or revision % REVISION_SNAPSHOT_INTERVAL == 0
+        values = costing.revision_values()
+        entries.append(CostingRevision(
+            costing_id=costing.pk,
+            revision=revision,
+            is_snapshot=is_snapshot,
+            changes=values if is_snapshot else {name: values[name] for name in changed_fields[costing.pk]},
+            style_number=costing.style_number,
+            user=user,
+        ))
+    CostingRevision.objects.bulk_create(entries)
+    Costing.objects.filter(pk__in=list(changed_fields)).update(current_revision=F('current_revision') + 1)
+    return entries
+
+
+def reconstruct(costing_id, revision):
+    """Field values of a costing as of ``revision``, or None if it does not exist."""
+    entries = CostingRevision.objects.filter(costing_id=costing_id, revision__lte=revision)
+    snapshot = (
+        entries.filter(is_snapshot=True)
+        .order_by('-revision')
+        .values_list('revision', flat=True)
+        .first()
+    )
+    if snapshot is None or not entries.filter(revision=revision).exists():
+        return None
+    values = {}
+    for changes in entries.filter(revision__gte=snapshot).order_by('revision').values_list('changes', flat=True):
+        values.update(changes)
+    return values
+
+
+def latest_per_style(queryset=None):
+    """The most recent revision of each style number."""
+    queryset = queryset if queryset is not None else CostingRevision.objects.all()
+    latest = (
+        queryset
+        .filter(style_number=OuterRef('style_number'))
+        .order_by('-created_at', '-pk')
+        .values('pk')[:1]
+    )
+    return queryset.filter(pk=Subquery(latest))
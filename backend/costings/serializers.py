@@ -0,0 +1,69 @@
+from decimal import Decimal
+
+from rest_framework import serializers
+
+from .models import Costing, CostingRevision
+from .pricing import ADJUSTABLE_FIELDS, COMPONENT_FIELDS, MAX_MATRIX_CELLS, scenario_count
+
+
+class CostingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Costing
+        fields = [
+            'id', 'style_name', 'style_number', *COMPONENT_FIELDS,
+            'profit_margin', 'currency', 'exw_price', 'total_price', 'exw_price_base', 'notes',
+            'lead', 'created_by', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'exw_price', 'total_price', 'exw_price_base', 'created_by', 'created_at', 'updated_at']
+
+
+class CostingRevisionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CostingRevision
+        fields = ['id', 'costing', 'revision', 'is_snapshot', 'changes', 'style_number', 'user', 'created_at']
+        read_only_fields = fields
+
+
+class CostingVariantSerializer(serializers.ModelSerializer):
+    """Unsaved style variant priced by the scenario engine."""
+    class Meta:
+        model = Costing
+        fields = ['style_name', 'style_number', *COMPONENT_FIELDS, 'profit_margin']
+        extra_kwargs = {'style_name': {'required': False}}
+
+
+class CostingScenarioSerializer(serializers.Serializer):
+    """
+    Variants (saved costings and/or ad-hoc inputs) and the what-if axes to
+    price them under: percentage changes per cost component and profit margins.
+    """
+    costing_ids = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    variants = CostingVariantSerializer(many=True, required=False, default=list)
+    adjustments = serializers.DictField(
+        child=serializers.ListField(
+            child=serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('-100')),
+            max_length=100,
+        ),
+        required=False,
+        default=dict,
+    )
+    profit_margins = serializers.ListField(
+        child=serializers.DecimalField(max_digits=5, decimal_places=2),
+        required=False,
+        default=list,
+        max_length=100,
+    )
+
+    def validate_adjustments(self, value):
+        unknown = set(value) - set(ADJUSTABLE_FIELDS)
+        if unknown:
+            raise serializers.ValidationError(f'Cannot adjust: {", ".join(sorted(unknown))}')
+        return value
+
+    def validate(self, attrs):
+        variants = len(attrs['costing_ids']) + len(attrs['variants'])
+        if not variants:
+            raise serializers.ValidationError('Provide costing_ids and/or variants to price.')
+        if variants * scenario_count(attrs['adjustments'], attrs['profit_margins']) > MAX_MATRIX_CELLS:
+            raise serializers.ValidationError(f'At most {MAX_MATRIX_CELLS} prices can be computed per request.')
+        return attrs
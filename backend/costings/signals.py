@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Costing
+from .revisions import record_revision
+
+
+@receiver(post_save, sender=Costing, dispatch_uid='costings_record_revision')
+def record_costing_revision(sender, instance, created, raw=False, **kwargs):
+    """Append a CostingRevision for every save that changes a revised field."""
+    if raw:
+        return
+    user = getattr(instance, '_revision_user', None)
+    user_id = user.pk if user is not None else (instance.created_by_id if created else None)
+    record_revision(instance, user_id=user_id, created=created)
@@ -1,3 +1,123 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
-# Create your tests here.
+from users.models import User
+
+from .models import Costing, CostingRevision
+from .pricing import drifted, recalculate
+from .revisions import reconstruct
+
+
+class RecalculateRevisionTests(TestCase):
+    """Bulk recalculation records revisions for the costings whose prices it changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='ADMIN')
+
+    def create(self, **values):
+        return Costing.objects.create(**{
+            'style_name': 'Tee', 'style_number': 'T-1', 'fabric_cost': 1, 'fabric_consumption': 1, 'cm_cost': 1,
+            **values,
+        })
+
+    def test_changed_prices_get_a_revision(self):
+        stale, current = self.create(style_number='T-1'), self.create(style_number='T-2')
+        Costing.objects.filter(pk=stale.pk).update(fabric_cost=5)
+
+        self.assertEqual(recalculate(Costing.objects.all(), user=self.admin), 2)
+
+        revision = CostingRevision.objects.get(costing=stale, revision=2)
+        self.assertFalse(revision.is_snapshot)
+        self.assertEqual(revision.changes, {'exw_price': '7.20', 'total_price': '7.20'})
+        self.assertEqual(revision.user, self.admin)
+        self.assertEqual(revision.style_number, 'T-1')
+        self.assertEqual(reconstruct(stale.pk, 2)['exw_price'], '7.20')
+        self.assertEqual(Costing.objects.get(pk=stale.pk).current_revision, 2)
+        self.assertEqual(Costing.objects.get(pk=current.pk).current_revision, 1)
+        self.assertFalse(CostingRevision.objects.filter(costing=current, revision__gt=1).exists())
+
+    def test_drifted_only_run(self):
+        stale = self.create()
+        Costing.objects.filter(pk=stale.pk).update(total_price=Decimal('1.00'))
+
+        recalculate(Costing.objects.filter(pk__in=drifted(Costing.objects.all()).values('pk')), batch_size=1)
+
+        self.assertEqual(CostingRevision.objects.get(costing=stale, revision=2).changes, {'total_price': '2.40'})
+        self.assertFalse(drifted(Costing.objects.all()).exists())
+
+    def test_unchanged_prices_get_no_revision(self):
+        self.create()
+        recalculate(Costing.objects.all())
+        self.assertEqual(CostingRevision.objects.count(), 1)
+
+
+class RecordRevisionTests(TestCase):
+    """Saves that change no value record no revision."""
+
+    def test_same_decimal_written_differently(self):
+        costing = Costing.objects.create(
+            style_name='Tee', style_number='T-1', fabric_cost=1, fabric_consumption=1, cm_cost=1,
+        )
+        costing = Costing.objects.get(pk=costing.pk)
+        costing.fabric_cost = Decimal('1')
+        costing.cm_cost = '1.0'
+        costing.save()
+        self.assertEqual(CostingRevision.objects.filter(costing=costing).count(), 1)
+
+        costing.fabric_cost = Decimal('2')
+        costing.save()
+        self.assertEqual(CostingRevision.objects.get(costing=costing, revision=2).changes['fabric_cost'], '2.00')
+
+
+class RevisionHistoryTests(TestCase):
+    """Revisions store diffs between snapshots and rebuild every version."""
+
+    def setUp(self):
+        self.costing = Costing.objects.create(
+            style_name='Tee', style_number='T-1', fabric_cost=1, fabric_consumption=1, cm_cost=1,
+        )
+        self.versions = {1: self.stored()}
+
+    def stored(self):
+        return Costing.objects.get(pk=self.costing.pk).revision_values()
+
+    def revise(self, count):
+        costing = Costing.objects.get(pk=self.costing.pk)
+        for _ in range(count):
+            revision = costing.current_revision + 1
+            if revision % 3:
+                costing.notes = f'Revision {revision}'
+            else:
+                costing.fabric_cost = Decimal(revision)
+            costing.save()
+            self.versions[revision] = self.stored()
+
+    def test_diffs_between_snapshots(self):
+        self.revise(41)
+        revisions = {entry.revision: entry for entry in CostingRevision.objects.filter(costing=self.costing)}
+        self.assertEqual(sorted(revisions), list(range(1, 43)))
+        self.assertEqual([number for number, entry in sorted(revisions.items()) if entry.is_snapshot], [1, 20, 40])
+        self.assertEqual(revisions[20].changes, self.versions[20])
+        self.assertEqual(revisions[2].changes, {'notes': 'Revision 2'})
+        # A cost change also stores the prices it moved
+        self.assertEqual(set(revisions[3].changes), {'fabric_cost', 'exw_price', 'total_price'})
+        self.assertEqual(Costing.objects.get(pk=self.costing.pk).current_revision, 42)
+
+    def test_round_trip_across_snapshots(self):
+        self.revise(44)
+        for revision, values in self.versions.items():
+            with self.subTest(revision=revision), self.assertNumQueries(3):
+                self.assertEqual(reconstruct(self.costing.pk, revision), values)
+        self.assertIsNone(reconstruct(self.costing.pk, 46))
+
+    def test_snapshot_of_a_partially_loaded_costing(self):
+        self.revise(18)
+        costing = Costing.objects.only('notes', 'current_revision').get(pk=self.costing.pk)
+        costing.notes = 'Deferred'
+        costing.save(update_fields=['notes'])
+        entry = CostingRevision.objects.get(costing=self.costing, revision=20)
+        self.assertTrue(entry.is_snapshot)
+        self.assertEqual(entry.changes, self.stored())
+        self.assertEqual(reconstruct(self.costing.pk, 20)['notes'], 'Deferred')
@@ -1,3 +1,173 @@
-from django.shortcuts import render
+from django.db.models import Q
+from rest_framework import serializers, viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from users.throttling import WriteRateThrottle
+from .models import Costing, CostingRevision
+from .revisions import latest_per_style, reconstruct
+from .pricing import COMPONENT_FIELDS, drifted, price_matrix, recalculate
+from .serializers import CostingRevisionSerializer, CostingSerializer, CostingScenarioSerializer
 
-# Create your views here.
+
+class CostingViewSet(viewsets.ModelViewSet):
+    """
+    Costing sheets
+    - ADMIN: all costings
+    - SELLER: costings they created or for leads assigned to them
+    """
+    serializer_class = CostingSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [WriteRateThrottle]
+    filterset_fields = ['lead', 'currency', 'created_by']
+    search_fields = ['style_name', 'style_number']
+    ordering_fields = ['created_at', 'updated_at', 'exw_price', 'style_name']
+
+    def get_queryset(self):
+        user = self.request.user
+        role = getattr(user, 'role', '').upper()
+        if role == 'ADMIN':
+            return Costing.objects.all()
+        if role == 'SELLER':
+            return Costing.objects.filter(Q(created_by=user) | Q(lead__assigned_to=user))
+        raise PermissionDenied('Only admin or seller users can access costings')
+
+    def perform_create(self, serializer):
+        self._check_lead(serializer.validated_data.get('lead'))
+        serializer.save(created_by=self.request.user)
+
+    def perform_update(self, serializer):
+        if 'lead' in serializer.validated_data:
+            self._check_lead(serializer.validated_data['lead'])
+        serializer.instance._revision_user = self.request.user
+        serializer.save()
+
+    @action(detail=True, methods=['get'])
+    def revisions(self, request, pk=None):
+        """Paginated revisions of a costing, newest first, each with only its changed fields."""
+        costing = self.get_object()
+        queryset = CostingRevision.objects.filter(costing=costing).order_by('-revision')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = CostingRevisionSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = CostingRevisionSerializer(queryset, many=True)
+        return Response({'success': True, 'data': serializer.data})
+
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<revision>[0-9]+)')
+    def revision(self, request, pk=None, revision=None):
+        """All revised fields of a costing as they were at ``revision``."""
+        costing = self.get_object()
+        values = reconstruct(costing.pk, int(revision))
+        if values is None:
+            return Response({'success': False, 'error': 'Revision not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'success': True, 'revision': int(revision), 'data': values})
+
+    @action(detail=False, methods=['get'], url_path='revisions/latest')
+    def latest_revisions(self, request):
+        """The most recent revision of each style (``?style_number=`` to narrow)."""
+        revisions = CostingRevision.objects.filter(costing__in=self.get_queryset())
+        if request.query_params.get('style_number'):
+            revisions = revisions.filter(style_number=request.query_params['style_number'])
+        queryset = latest_per_style(revisions).order_by('style_number')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = CostingRevisionSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = CostingRevisionSerializer(queryset, many=True)
+        return Response({'success': True, 'data': serializer.data})
+
+    @action(detail=False, methods=['post'])
+    def recalculate(self, request):
+        """
+        Recompute prices with set-based UPDATEs for the costings matching the
+        list filters (query params); ``?drifted=true`` limits it to stale rows.
+        """
+        self._ensure_admin(request)
+        costings = self.filter_queryset(self.get_queryset())
+        if request.query_params.get('drifted', '').lower() in ('1', 'true', 'yes'):
+            costings = Costing.objects.filter(pk__in=drifted(costings).values('pk'))
+        updated = recalculate(costings, user=request.user)
+        return Response({'success': True, 'updated': updated})
+
+    @action(detail=False, methods=['get'])
+    def drift(self, request):
+        """Count (and list up to ``limit`` ids of) costings whose stored prices are stale."""
+        self._ensure_admin(request)
+        stale = drifted(self.filter_queryset(self.get_queryset()))
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError:
+            limit = 100
+        rows = stale.order_by('pk').values_list('id', 'exw_price', 'total_price', 'expected_price')[:limit]
+        price = serializers.DecimalField(max_digits=10, decimal_places=2)
+        return Response({
+            'success': True,
+            'count': stale.count(),
+            'data': [
+                {
+                    'id': pk,
+                    'exw_price': price.to_representation(exw) if exw is not None else None,
+                    'total_price': price.to_representation(total) if total is not None else None,
+                    'expected_price': price.to_representation(expected),
+                }
+                for pk, exw, total, expected in rows
+            ],
+        })
+
+    def _check_lead(self, lead):
+        user = self.request.user
+        if lead is not None and user.role != 'ADMIN' and lead.assigned_to_id != user.pk:
+            raise PermissionDenied('You can only attach costings to leads assigned to you')
+
+    def _ensure_admin(self, request):
+        if getattr(request.user, 'role', '').upper() != 'ADMIN':
+            raise PermissionDenied('Only admin users can recalculate costings')
+
+    @action(detail=False, methods=['post'])
+    def scenarios(self, request):
+        """
+        Price many style variants under what-if scenarios in one request, e.g.
+        {"costing_ids": [1, 2], "variants": [{...}], "adjustments":
+        {"fabric_cost": [0, 8]}, "profit_margins": [15, 20, 25]}.
+        ``prices[v][s]`` is the EXW price of variant ``v`` under scenario
+        ``s``; prices equal what Costing.save would compute for those inputs.
+        """
+        serializer = CostingScenarioSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        variants = []
+        if data['costing_ids']:
+            found = {
+                row['id']: row
+                for row in self.get_queryset().filter(pk__in=data['costing_ids']).values(
+                    'id', 'style_name', 'style_number', *COMPONENT_FIELDS, 'profit_margin',
+                )
+            }
+            missing = [pk for pk in data['costing_ids'] if pk not in found]
+            if missing:
+                return Response(
+                    {'success': False, 'error': f'Costings not found: {", ".join(map(str, missing))}'},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            variants.extend(found[pk] for pk in data['costing_ids'])
+        variants.extend(data['variants'])
+
+        scenarios, prices = price_matrix(variants, data['adjustments'], data['profit_margins'])
+        return Response({
+            'success': True,
+            'variants': [
+                {'id': variant.get('id'), 'style_name': variant.get('style_name', ''), 'style_number': variant.get('style_number', '')}
+                for variant in variants
+            ],
+            'scenarios': [
+                {
+                    'adjustments': {name: str(value) for name, value in scenario['adjustments'].items()},
+                    'profit_margin': str(scenario['profit_margin']) if scenario['profit_margin'] is not None else None,
+                }
+                for scenario in scenarios
+            ],
+            'prices': [[str(price) for price in row] for row in prices],
+        })
@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import DocumentSequence
+
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ['doc_type', 'year', 'next_value']
+    list_filter = ['doc_type', 'year']
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(max_length=10)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Document Sequence',
+                'verbose_name_plural': 'Document Sequences',
+                'ordering': ['doc_type', '-year'],
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'year'), name='document_sequence_uniq')],
+            },
+        ),
+    ]
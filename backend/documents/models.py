@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class DocumentSequence(models.Model):
+    """
+    Next free number of a document type (PI, PO, ...) in a numbering year.
+    Numbers are reserved from here in blocks (see documents/numbering.py).
+    """
+    doc_type = models.CharField(max_length=10)
+    year = models.PositiveSmallIntegerField()
+    next_value = models.PositiveBigIntegerField(default=1)
+    
+    class Meta:
+        ordering = ['doc_type', '-year']
+        verbose_name = 'Document Sequence'
+        verbose_name_plural = 'Document Sequences'
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'year'], name='document_sequence_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.doc_type} {self.year}: next {self.next_value}'
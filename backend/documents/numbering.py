@@ -0,0 +1,162 @@
+"""
+Document numbers (proforma invoices, purchase orders, ...).
+
+Each document type has one sequence per numbering year in
+``DocumentSequence``. A process reserves numbers in blocks of
+DOCUMENT_NUMBER_BLOCK_SIZE with a single UPDATE and hands them out from
+memory, so creating a document normally costs no extra query and bulk
+creation reserves all the numbers it needs at once. Blocks never overlap
+between processes (the UPDATE is serialized by the row lock on PostgreSQL
+and by the IMMEDIATE write transaction on SQLite); numbers left in a block
+when a process exits, or used by a transaction that rolls back, are
+skipped, so sequences can have gaps but never duplicates.
+
+A block reserved inside a transaction only becomes reusable by other
+transactions once that transaction commits: if it rolls back, the
+reservation is undone in the database and the block is discarded here.
+The block is handed over by an on_commit callback; the allocator keeps only
+a weak reference to it, and Django drops the callback (and so the block)
+when the transaction or the savepoint it was registered in rolls back
+(CPython frees it right away).
+"""
+import os
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DocumentSequence
+
+DEFAULT_FORMAT = '{type}-{year}-{number:05d}'
+
+
+def numbering_year(on=None):
+    """Numbering year of a date; years start in DOCUMENT_NUMBER_YEAR_START_MONTH."""
+    day = on or timezone.localdate()
+    start_month = getattr(settings, 'DOCUMENT_NUMBER_YEAR_START_MONTH', 1)
+    return day.year if day.month >= start_month else day.year - 1
+
+
+def format_number(doc_type, year, number):
+    formats = getattr(settings, 'DOCUMENT_NUMBER_FORMATS', {})
+    return formats.get(doc_type, DEFAULT_FORMAT).format(type=doc_type, year=year, number=number)
+
+
+def _reserve_block(doc_type, year, size):
+    """Reserve ``size`` consecutive numbers in the database; returns [start, end)."""
+    with transaction.atomic():
+        DocumentSequence.objects.bulk_create(
+            [DocumentSequence(doc_type=doc_type, year=year)],
+            ignore_conflicts=True,
+        )
+        sequence = DocumentSequence.objects.filter(doc_type=doc_type, year=year)
+        sequence.update(next_value=F('next_value') + size)
+        end = sequence.values_list('next_value', flat=True).get()
+    return [end - size, end]
+
+
+class _Promotion:
+    """on_commit callback handing a block reserved in a transaction to the shared pool."""
+
+    def __init__(self, allocator, key, block):
+        self.allocator = allocator
+        self.key = key
+        self.block = block
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.allocator._release(self.key, self.block)
+
+
+class NumberAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        # Committed blocks, shared by all threads: {(doc_type, year): [[start, end], ...]}
+        self._blocks = {}
+        # Blocks reserved by the current thread's open transaction:
+        # {(doc_type, year): weak reference to its _Promotion}
+        self._local = threading.local()
+
+    def _take(self, blocks, count):
+        numbers = []
+        while blocks and len(numbers) < count:
+            block = blocks[0]
+            taken = min(block[1] - block[0], count - len(numbers))
+            numbers.extend(range(block[0], block[0] + taken))
+            block[0] += taken
+            if block[0] >= block[1]:
+                blocks.pop(0)
+        return numbers
+
+    def _pending(self, key):
+        """The block the current transaction reserved for ``key``, if it is still usable."""
+        pending = getattr(self._local, 'blocks', None)
+        if pending is None:
+            pending = self._local.blocks = {}
+        promotion = pending[key]() if key in pending else None
+        if promotion is None or promotion.done:
+            # Rolled back (Django dropped the callback) or already committed
+            pending.pop(key, None)
+            return None
+        return promotion.block
+
+    def reserve(self, doc_type, count=1, on=None):
+        """Return ``count`` new numbers of a document type for the year of ``on``."""
+        year = numbering_year(on)
+        key = (doc_type, year)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: blocks inherited from the parent are not ours
+                self._pid, self._blocks = os.getpid(), {}
+            numbers = self._take(self._blocks.get(key, []), count)
+        remaining = count - len(numbers)
+        if not remaining:
+            return numbers
+
+        block_size = max(remaining, getattr(settings, 'DOCUMENT_NUMBER_BLOCK_SIZE', 20))
+        if not connection.in_atomic_block:
+            block = _reserve_block(doc_type, year, block_size)
+            numbers.extend(self._take([block], remaining))
+            self._release(key, block)
+            return numbers
+
+        block = self._pending(key)
+        if block is not None:
+            numbers.extend(self._take([block], remaining))
+            remaining = count - len(numbers)
+        if remaining:
+            block = _reserve_block(doc_type, year, max(remaining, block_size))
+            numbers.extend(self._take([block], remaining))
+            promotion = _Promotion(self, key, block)
+            transaction.on_commit(promotion)
+            self._local.blocks[key] = weakref.ref(promotion)
+        return numbers
+
+    def _release(self, key, block):
+        if block[0] < block[1]:
+            with self._lock:
+                self._blocks.setdefault(key, []).append(block)
+
+    def clear(self):
+        with self._lock:
+            self._blocks = {}
+        self._local.blocks = {}
+
+
+allocator = NumberAllocator()
+
+
+def next_number(doc_type, on=None):
+    """A new formatted document number, e.g. ``PI-2026-00042``."""
+    return next_numbers(doc_type, 1, on)[0]
+
+
+def next_numbers(doc_type, count, on=None):
+    """``count`` new formatted document numbers, reserved at once (for bulk creation)."""
+    year = numbering_year(on)
+    return [format_number(doc_type, year, number) for number in allocator.reserve(doc_type, count, on)]
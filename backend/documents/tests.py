@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from .models import DocumentSequence
+from .numbering import allocator, next_number
+
+
+class Rollback(Exception):
+    pass
+
+
+@override_settings(DOCUMENT_NUMBER_BLOCK_SIZE=20, DOCUMENT_NUMBER_FORMATS={}, DOCUMENT_NUMBER_YEAR_START_MONTH=1)
+class NumberAllocatorTests(TransactionTestCase):
+    """Numbers come from blocks; blocks of rolled-back transactions and savepoints are not kept."""
+
+    def setUp(self):
+        allocator.clear()
+        self.addCleanup(allocator.clear)
+
+    def reserve(self, doc_type='PI', count=1):
+        return allocator.reserve(doc_type, count, on=date(2026, 5, 1))
+
+    def test_sequential_within_a_transaction(self):
+        with transaction.atomic():
+            # Savepoint, sequence row, UPDATE, read back, release
+            with self.assertNumQueries(5):
+                numbers = self.reserve()
+            with self.assertNumQueries(0):
+                for _ in range(19):
+                    numbers += self.reserve()
+            numbers += self.reserve(count=30)
+        self.assertEqual(numbers, list(range(1, 51)))
+        self.assertEqual(DocumentSequence.objects.get(doc_type='PI', year=2026).next_value, 51)
+
+    def test_committed_block_is_shared(self):
+        with transaction.atomic():
+            self.assertEqual(self.reserve(), [1])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.reserve(count=19), list(range(2, 21)))
+        self.assertEqual(self.reserve(), [21])
+
+    def test_rollback_reuses_the_block(self):
+        with self.assertRaises(Rollback), transaction.atomic():
+            self.assertEqual(self.reserve(count=3), [1, 2, 3])
+            raise Rollback
+        self.assertFalse(DocumentSequence.objects.exists())
+        with transaction.atomic():
+            self.assertEqual(self.reserve(count=3), [1, 2, 3])
+        self.assertEqual(self.reserve(), [4])
+
+    def test_savepoint_rollback(self):
+        with transaction.atomic():
+            self.assertEqual(self.reserve('PO'), [1])
+            with self.assertRaises(Rollback), transaction.atomic():
+                # A block reserved in the savepoint goes with it...
+                self.assertEqual(self.reserve('PI'), [1])
+                # ...one reserved before it stays (its number 2 is skipped)
+                self.assertEqual(self.reserve('PO'), [2])
+                raise Rollback
+            self.assertEqual(self.reserve('PI'), [1])
+            self.assertEqual(self.reserve('PO'), [3])
+        self.assertEqual(DocumentSequence.objects.get(doc_type='PI').next_value, 21)
+        self.assertEqual(DocumentSequence.objects.get(doc_type='PO').next_value, 21)
+
+    def test_yearly_sequences(self):
+        self.assertEqual(next_number('PI', on=date(2025, 12, 31)), 'PI-2025-00001')
+        self.assertEqual(next_number('PI', on=date(2026, 1, 1)), 'PI-2026-00001')
+        self.assertEqual(next_number('PI', on=date(2025, 6, 1)), 'PI-2025-00002')
+        self.assertEqual(next_number('PO', on=date(2026, 1, 1)), 'PO-2026-00001')
+        with override_settings(DOCUMENT_NUMBER_YEAR_START_MONTH=4, DOCUMENT_NUMBER_FORMATS={'PI': 'PI/{year}/{number}'}):
+            self.assertEqual(next_number('PI', on=date(2026, 3, 31)), 'PI/2025/3')
+            self.assertEqual(next_number('PI', on=date(2026, 4, 1)), 'PI/2026/2')
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class FxConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'fx'
+    verbose_name = 'Exchange Rates'
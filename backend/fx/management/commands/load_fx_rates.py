@@ -0,0 +1,79 @@
+"""
+Django management command to load exchange rates from a file
+Usage: python manage.py load_fx_rates rates.csv [--no-normalize]
+
+CSV files have a header row with ``date,currency,rate``; JSON files hold a
+list of ``{"date": ..., "currency": ..., "rate": ...}`` objects. Rates are
+the base-currency (BASE_CURRENCY) value of one unit of the currency and
+replace existing rates for the same currency and date. Base-currency
+amounts of costings, orders and purchase orders dated on or after the
+earliest loaded rate are then recomputed, together with the order
+revenue rollups of those months.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from fx.models import ExchangeRate
+from fx.rates import base_currency, normalize_all, rate_cache
+from orders.analytics import refresh_since
+
+
+class Command(BaseCommand):
+    help = 'Loads dated exchange rates from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--no-normalize', action='store_true', help='Do not recompute base-currency amounts')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rates = {}
+        for line, row in enumerate(self.read_rows(Path(options['path'])), start=1):
+            try:
+                day = parse_date(str(row['date']).strip())
+                currency = str(row['currency']).strip().upper()
+                value = Decimal(str(row['rate']).strip())
+            except (KeyError, ValueError, InvalidOperation) as exc:
+                raise CommandError(f'Row {line}: {exc!r}')
+            if day is None or len(currency) != 3 or value <= 0:
+                raise CommandError(f'Row {line}: expected a YYYY-MM-DD date, a 3-letter currency and a positive rate')
+            if currency != base_currency():
+                rates[(currency, day)] = value
+
+        if not rates:
+            self.stdout.write(self.style.WARNING('No rates to load'))
+            return
+
+        with transaction.atomic():
+            ExchangeRate.objects.bulk_create(
+                [ExchangeRate(currency=currency, date=day, rate=value) for (currency, day), value in rates.items()],
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['currency', 'date'],
+                update_fields=['rate'],
+            )
+        rate_cache.clear()
+        currencies = sorted({currency for currency, _ in rates})
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(rates)} rates for {", ".join(currencies)}'))
+
+        if not options['no_normalize']:
+            since = min(day for _, day in rates)
+            for model, count in normalize_all(currencies, since=since).items():
+                self.stdout.write(f'Normalized {count} {model} amounts')
+            buckets = refresh_since(since)
+            self.stdout.write(f'Refreshed {buckets} order revenue rollups')
+
+    def read_rows(self, path):
+        try:
+            with path.open(newline='', encoding='utf-8') as handle:
+                if path.suffix.lower() == '.json':
+                    return list(json.load(handle))
+                return list(csv.DictReader(handle))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class ExchangeRate(models.Model):
+    """
+    Value of one unit of ``currency`` in the base currency (BASE_CURRENCY)
+    from ``date`` until the next rate for that currency.
+    """
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    
+    class Meta:
+        ordering = ['currency', '-date']
+        verbose_name = 'Exchange Rate'
+        verbose_name_plural = 'Exchange Rates'
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='fx_rate_currency_date_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.currency} {self.rate} on {self.date}'
@@ -0,0 +1,154 @@
+"""
+Currency conversion to the base currency (BASE_CURRENCY).
+
+Rates come from the ``ExchangeRate`` table, normally filled by the
+``load_fx_rates`` command. The full rate history is small, so each process
+loads it once into sorted per-currency lists and memoizes the rates in
+effect on each day; the cache expires after FX_RATE_CACHE_SECONDS and is
+dropped immediately when this process loads new rates.
+
+Models with an amount in a free currency keep a ``*_base`` copy converted
+at the rate of their business date, set on save and recomputed in bulk by
+``normalize`` (see NORMALIZED_AMOUNTS), so reports can sum across
+currencies in SQL.
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+CENTS = Decimal('0.01')
+
+NormalizedAmount = namedtuple('NormalizedAmount', ['model', 'amount_field', 'base_field', 'date_field'])
+
+NORMALIZED_AMOUNTS = (
+    NormalizedAmount('costings.Costing', 'exw_price', 'exw_price_base', 'created_at'),
+    NormalizedAmount('orders.Order', 'total_amount', 'total_amount_base', 'pi_date'),
+    NormalizedAmount('purchase_orders.PurchaseOrder', 'total_amount', 'total_amount_base', 'created_at'),
+)
+
+
+def base_currency():
+    return getattr(settings, 'BASE_CURRENCY', 'USD').upper()
+
+
+class RateCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._history = None
+        self._days = {}
+        self._loaded_at = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._history = None
+            self._days = {}
+
+    def _load(self):
+        from .models import ExchangeRate
+
+        history = {}
+        for currency, day, rate in ExchangeRate.objects.order_by('currency', 'date').values_list('currency', 'date', 'rate'):
+            dates, rates = history.setdefault(currency.upper(), ([], []))
+            dates.append(day)
+            rates.append(rate)
+        return history
+
+    def rates_on(self, day):
+        """{currency: rate} of every currency with a rate in effect on ``day``."""
+        ttl = getattr(settings, 'FX_RATE_CACHE_SECONDS', 300)
+        with self._lock:
+            if self._history is None or time.monotonic() - self._loaded_at > ttl:
+                self._history = self._load()
+                self._days = {}
+                self._loaded_at = time.monotonic()
+            rates = self._days.get(day)
+            if rates is None:
+                rates = {base_currency(): Decimal(1)}
+                for currency, (dates, values) in self._history.items():
+                    index = bisect.bisect_right(dates, day)
+                    if index:
+                        rates[currency] = values[index - 1]
+                if len(self._days) > 4096:
+                    self._days.clear()
+                self._days[day] = rates
+            return rates
+
+
+rate_cache = RateCache()
+
+
+def _as_date(value):
+    if value is None:
+        return timezone.localdate()
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    if isinstance(value, date):
+        return value
+    return timezone.localdate()
+
+
+def rate(currency, on=None):
+    """Base-currency value of one unit of ``currency`` on a date, or None if unknown."""
+    return rate_cache.rates_on(_as_date(on)).get((currency or '').upper())
+
+
+def to_base(amount, currency, on=None):
+    """``amount`` converted to the base currency (rounded to cents), or None."""
+    if amount is None:
+        return None
+    fx_rate = rate(currency, on)
+    if fx_rate is None:
+        return None
+    return (Decimal(str(amount)) * fx_rate).quantize(CENTS, rounding=ROUND_HALF_EVEN)
+
+
+def normalize(spec, queryset=None, batch_size=1000):
+    """
+    Recompute ``spec.base_field`` for the rows of ``queryset`` (default: all).
+    Rows already in the base currency are copied in one UPDATE; the others
+    are converted with the cached rates and written with bulk_update.
+    Returns the number of rows processed.
+    """
+    model = apps.get_model(spec.model)
+    queryset = (queryset if queryset is not None else model.objects.all()).order_by()
+    base = base_currency()
+
+    # Inside a caller's transaction (e.g. an order total refresh) no savepoint is needed
+    with transaction.atomic(savepoint=False):
+        updated = queryset.filter(currency__iexact=base).update(**{spec.base_field: F(spec.amount_field)})
+        batch = []
+        rows = (
+            queryset.exclude(currency__iexact=base)
+            .values_list('pk', 'currency', spec.amount_field, spec.date_field)
+            .iterator(chunk_size=batch_size)
+        )
+        for pk, currency, amount, when in rows:
+            batch.append(model(pk=pk, **{spec.base_field: to_base(amount, currency, when)}))
+            if len(batch) >= batch_size:
+                updated += model.objects.bulk_update(batch, [spec.base_field])
+                batch = []
+        if batch:
+            updated += model.objects.bulk_update(batch, [spec.base_field])
+    return updated
+
+
+def normalize_all(currencies=None, since=None):
+    """Recompute base amounts of every registered model, optionally limited to some currencies/dates."""
+    results = {}
+    for spec in NORMALIZED_AMOUNTS:
+        queryset = apps.get_model(spec.model).objects.all()
+        if currencies:
+            queryset = queryset.filter(currency__in=list(currencies))
+        if since:
+            queryset = queryset.filter(**{f'{spec.date_field}__date__gte': since})
+        results[spec.model] = normalize(spec, queryset)
+    return results
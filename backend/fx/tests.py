@@ -0,0 +1,82 @@
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .models import ExchangeRate
+from .rates import rate, rate_cache, to_base
+
+
+@override_settings(BASE_CURRENCY='USD', FX_RATE_CACHE_SECONDS=300)
+class RateCacheTests(TestCase):
+    """Rates in effect on a day come from the cache, which expires and is dropped on load."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency='EUR', date=date(2026, 1, 1), rate=Decimal('1.10')),
+            ExchangeRate(currency='EUR', date=date(2026, 3, 1), rate=Decimal('1.20')),
+            ExchangeRate(currency='GBP', date=date(2026, 2, 1), rate=Decimal('1.30')),
+        ])
+
+    def setUp(self):
+        rate_cache.clear()
+        self.addCleanup(rate_cache.clear)
+        self.clock = 1000.0
+        patcher = mock.patch('fx.rates.time.monotonic', side_effect=lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_in_effect(self):
+        self.assertEqual(rate('EUR', date(2026, 1, 1)), Decimal('1.10'))
+        self.assertEqual(rate('eur', date(2026, 2, 28)), Decimal('1.10'))
+        self.assertEqual(rate('EUR', date(2026, 3, 1)), Decimal('1.20'))
+        self.assertEqual(rate('EUR', datetime(2027, 1, 1, 12, tzinfo=dt_timezone.utc)), Decimal('1.20'))
+
+    def test_fallback_when_unknown(self):
+        # Before a currency's first rate, or with no rate at all, amounts are not converted
+        self.assertIsNone(rate('GBP', date(2026, 1, 31)))
+        self.assertIsNone(rate('JPY', date(2026, 6, 1)))
+        self.assertIsNone(rate('', date(2026, 6, 1)))
+        self.assertIsNone(to_base(100, 'JPY', date(2026, 6, 1)))
+        self.assertIsNone(to_base(None, 'EUR', date(2026, 6, 1)))
+        self.assertEqual(to_base('10.005', 'GBP', date(2026, 2, 1)), Decimal('13.01'))
+
+    def test_base_currency(self):
+        self.assertEqual(rate('USD', date(2020, 1, 1)), Decimal(1))
+        self.assertEqual(to_base(Decimal('12.345'), 'usd', date(2020, 1, 1)), Decimal('12.34'))
+        with override_settings(BASE_CURRENCY='EUR'):
+            rate_cache.clear()
+            self.assertEqual(rate('EUR', date(2020, 1, 1)), Decimal(1))
+
+    def test_cached_until_expiry(self):
+        with self.assertNumQueries(1):
+            rate('EUR', date(2026, 1, 1))
+            rate('GBP', date(2026, 5, 1))
+        ExchangeRate.objects.create(currency='EUR', date=date(2026, 4, 1), rate=Decimal('1.25'))
+        self.clock += 300
+        with self.assertNumQueries(0):
+            self.assertEqual(rate('EUR', date(2026, 4, 2)), Decimal('1.20'))
+        self.clock += 1
+        with self.assertNumQueries(1):
+            self.assertEqual(rate('EUR', date(2026, 4, 2)), Decimal('1.25'))
+
+    def test_clear(self):
+        rate('EUR', date(2026, 4, 2))
+        ExchangeRate.objects.create(currency='EUR', date=date(2026, 4, 1), rate=Decimal('1.25'))
+        rate_cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(rate('EUR', date(2026, 4, 2)), Decimal('1.25'))
+
+    def test_load_command_drops_the_cache(self):
+        self.assertIsNone(rate('CHF', date(2026, 5, 1)))
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as rates:
+            rates.write('date,currency,rate\n2026-05-01,chf,1.15\n2026-05-01,USD,2\n')
+            rates.flush()
+            call_command('load_fx_rates', rates.name, '--no-normalize', stdout=StringIO())
+        self.assertEqual(rate('CHF', date(2026, 5, 1)), Decimal('1.15'))
+        self.assertFalse(ExchangeRate.objects.filter(currency='USD').exists())
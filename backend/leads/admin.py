@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import Lead, LeadHistory
+from .models import Lead, LeadFunnelDaily, LeadHistory, LeadRoutingRule, SellerWorkload
 
 
 class LeadHistoryInline(admin.TabularInline):
     model = LeadHistory
     extra = 0
-    readonly_fields = ['action', 'timestamp', 'user']
+    readonly_fields = ['action', 'field', 'old_value', 'new_value', 'timestamp', 'user']
 
 
 @admin.register(Lead)
@@ -16,6 +16,10 @@ class LeadAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     inlines = [LeadHistoryInline]
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        obj.record_history(user=request.user, actions=() if change else ['Lead created'])
+    
     fieldsets = (
         ('Contact Information', {
             'fields': ('name', 'email', 'phone', 'country')
@@ -35,6 +39,27 @@ class LeadAdmin(admin.ModelAdmin):
 
 @admin.register(LeadHistory)
 class LeadHistoryAdmin(admin.ModelAdmin):
-    list_display = ['lead', 'action', 'user', 'timestamp']
-    list_filter = ['timestamp']
+    list_display = ['lead', 'action', 'field', 'user', 'timestamp']
+    list_filter = ['field', 'timestamp']
     search_fields = ['lead__name', 'action']
+
+
+@admin.register(LeadRoutingRule)
+class LeadRoutingRuleAdmin(admin.ModelAdmin):
+    list_display = ['country', 'product_type', 'seller', 'is_active', 'created_at']
+    list_filter = ['is_active', 'country', 'product_type']
+    search_fields = ['country', 'product_type', 'seller__email']
+
+
+@admin.register(SellerWorkload)
+class SellerWorkloadAdmin(admin.ModelAdmin):
+    list_display = ['seller', 'open_leads', 'last_assigned_at']
+    search_fields = ['seller__email']
+    readonly_fields = ['seller', 'open_leads', 'last_assigned_at']
+
+
+@admin.register(LeadFunnelDaily)
+class LeadFunnelDailyAdmin(admin.ModelAdmin):
+    list_display = ['date', 'status', 'country', 'product_type', 'assigned_to', 'entered', 'exited']
+    list_filter = ['status', 'date']
+    search_fields = ['country', 'product_type']
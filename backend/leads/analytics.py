@@ -0,0 +1,256 @@
+"""
+Lead funnel analytics.
+
+Status transitions are folded into ``LeadFunnelDaily`` as they happen (see
+the signals in leads/signals.py and the intake path), so reports only sum
+small rollup rows instead of scanning leads and their history.
+``rebuild_funnel`` regenerates the rollups from the status history.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import Lead, LeadFunnelDaily, LeadHistory
+
+FUNNEL_STAGES = ['NEW', 'QUALIFIED', 'SCOPE_LOCKED', 'PI_SENT', 'ORDER_CONFIRMED']
+GROUP_FIELDS = ('country', 'product_type', 'assigned_to', 'period')
+PERIODS = ('day', 'week', 'month', 'year')
+
+
+class FunnelDeltas:
+    """
+    Accumulates rollup increments and writes them. A few buckets get one
+    UPDATE each; larger sets (batch intake) are looked up with one query and
+    updated with one UPDATE per distinct increment, so the number of queries
+    does not grow with the number of buckets.
+    """
+
+    # Up to this many buckets, separate UPDATEs beat looking them up first
+    LOOKUP_THRESHOLD = 8
+
+    def __init__(self):
+        self.buckets = defaultdict(lambda: [0, 0, 0])
+
+    def _bucket(self, when, country, product_type, assigned_to_id, status):
+        return self.buckets[(timezone.localdate(when), country, product_type, assigned_to_id, status)]
+
+    def enter(self, when, country, product_type, assigned_to_id, status):
+        self._bucket(when, country, product_type, assigned_to_id, status)[0] += 1
+
+    def exit(self, when, country, product_type, assigned_to_id, status, since=None):
+        bucket = self._bucket(when, country, product_type, assigned_to_id, status)
+        bucket[1] += 1
+        if since:
+            bucket[2] += max(int((when - since).total_seconds()), 0)
+
+    @staticmethod
+    def _increment(entered, exited, seconds):
+        return {
+            'entered': F('entered') + entered,
+            'exited': F('exited') + exited,
+            'seconds_in_stage': F('seconds_in_stage') + seconds,
+        }
+
+    def _update_each(self):
+        """Update the buckets one by one; returns the keys of those with no row yet."""
+        missing = []
+        for (date, country, product_type, assigned_to_id, status), deltas in self.buckets.items():
+            updated = LeadFunnelDaily.objects.filter(
+                date=date,
+                status=status,
+                country=country,
+                product_type=product_type,
+                assigned_to_id=assigned_to_id,
+            ).update(**self._increment(*deltas))
+            if not updated:
+                missing.append((date, country, product_type, assigned_to_id, status))
+        return missing
+
+    def _update_grouped(self):
+        """Update the buckets by increment; returns the keys of those with no row yet."""
+        keys = self.buckets.keys()
+        stored = {}
+        rows = LeadFunnelDaily.objects.filter(
+            date__in={key[0] for key in keys},
+            country__in={key[1] for key in keys},
+            product_type__in={key[2] for key in keys},
+            status__in={key[4] for key in keys},
+        ).values_list('pk', 'date', 'country', 'product_type', 'assigned_to_id', 'status')
+        for pk, *key in rows:
+            stored.setdefault(tuple(key), pk)
+
+        missing = []
+        by_increment = defaultdict(list)
+        for key, deltas in self.buckets.items():
+            if key in stored:
+                by_increment[tuple(deltas)].append(stored[key])
+            else:
+                missing.append(key)
+        for deltas, pks in by_increment.items():
+            LeadFunnelDaily.objects.filter(pk__in=pks).update(**self._increment(*deltas))
+        return missing
+
+    def save(self):
+        if not self.buckets:
+            return
+        with transaction.atomic():
+            if len(self.buckets) <= self.LOOKUP_THRESHOLD:
+                missing = self._update_each()
+            else:
+                missing = self._update_grouped()
+            rows = []
+            for key in missing:
+                date, country, product_type, assigned_to_id, status = key
+                entered, exited, seconds = self.buckets[key]
+                rows.append(LeadFunnelDaily(
+                    date=date, country=country, product_type=product_type,
+                    assigned_to_id=assigned_to_id, status=status,
+                    entered=entered, exited=exited, seconds_in_stage=seconds,
+                ))
+            LeadFunnelDaily.objects.bulk_create(rows)
+        self.buckets.clear()
+
+
+def record_new_leads(leads):
+    """Count newly created leads as entering their initial status."""
+    deltas = FunnelDeltas()
+    for lead in leads:
+        deltas.enter(lead.status_changed_at, lead.country, lead.product_type, lead.assigned_to_id, lead.status)
+    deltas.save()
+
+
+def record_status_change(lead, previous_assignee_id, previous_status, since):
+    """Count a lead leaving ``previous_status`` and entering its current status."""
+    deltas = FunnelDeltas()
+    when = lead.status_changed_at
+    deltas.exit(when, lead.country, lead.product_type, previous_assignee_id, previous_status, since)
+    deltas.enter(when, lead.country, lead.product_type, lead.assigned_to_id, lead.status)
+    deltas.save()
+
+
+def rebuild_funnel(chunk_size=2000):
+    """
+    Regenerate all rollups from lead creation times and the status and
+    assignee history. As when they happen, a stage exit is credited to the
+    lead's assignee before the change and the entry to the one after it (an
+    assignee change saved together with the status change applies to the
+    entry only). Leads without assignee history are credited to their
+    current assignee.
+    """
+    deltas = FunnelDeltas()
+    changes = defaultdict(list)
+    for lead_id, field, timestamp, user_id, old_value, new_value in (
+        LeadHistory.objects
+        .filter(field__in=('status', 'assigned_to'))
+        .order_by('lead_id', 'timestamp', 'pk')
+        .values_list('lead_id', 'field', 'timestamp', 'user_id', 'old_value', 'new_value')
+        .iterator(chunk_size=chunk_size)
+    ):
+        changes[lead_id].append((field, timestamp, user_id, old_value, new_value))
+
+    leads = Lead.objects.order_by().values_list(
+        'pk', 'country', 'product_type', 'assigned_to_id', 'status', 'created_at',
+    )
+    for pk, country, product_type, assigned_to_id, status, created_at in leads.iterator(chunk_size=chunk_size):
+        history = changes.pop(pk, [])
+        statuses = [change for change in history if change[0] == 'status']
+        assignments = [change for change in history if change[0] == 'assigned_to']
+        assignee = assignments[0][3] if assignments else assigned_to_id
+        current, since = (statuses[0][3] if statuses else status), created_at
+        deltas.enter(created_at, country, product_type, assignee, current)
+        for index, (field, timestamp, user_id, old_value, new_value) in enumerate(history):
+            if field == 'assigned_to':
+                assignee = new_value
+                continue
+            deltas.exit(timestamp, country, product_type, assignee, old_value, since)
+            following = history[index + 1] if index + 1 < len(history) else None
+            if following and following[0] == 'assigned_to' and _same_save(timestamp, user_id, following):
+                assignee = following[4]
+            deltas.enter(timestamp, country, product_type, assignee, new_value)
+            current, since = new_value, timestamp
+
+    with transaction.atomic():
+        LeadFunnelDaily.objects.all().delete()
+        LeadFunnelDaily.objects.bulk_create(
+            [
+                LeadFunnelDaily(
+                    date=date, country=country, product_type=product_type,
+                    assigned_to_id=assigned_to_id, status=status,
+                    entered=entered, exited=exited, seconds_in_stage=seconds,
+                )
+                for (date, country, product_type, assigned_to_id, status), (entered, exited, seconds)
+                in deltas.buckets.items()
+            ],
+            batch_size=chunk_size,
+        )
+    return len(deltas.buckets)
+
+
+def _same_save(timestamp, user_id, change):
+    # Entries of one save are created together, status before assignee (Lead.AUDITED_FIELDS)
+    _, other_timestamp, other_user_id, _, _ = change
+    return other_user_id == user_id and abs((other_timestamp - timestamp).total_seconds()) < 1
+
+
+def funnel_report(rollups, group_by=None, period='month'):
+    """
+    Summarize rollup rows into funnel stages, optionally per group.
+
+    Each stage reports how many leads entered and left it, the share of
+    entrants that reached the next stage, and the average days spent in it
+    by leads that left.
+    """
+    group_fields = []
+    if group_by == 'period':
+        rollups = rollups.annotate(period=Trunc('date', period))
+        group_fields = ['period']
+    elif group_by:
+        group_fields = [group_by]
+
+    rows = (
+        rollups
+        .order_by()
+        .values(*group_fields, 'status')
+        .annotate(
+            entered_total=Sum('entered'),
+            exited_total=Sum('exited'),
+            seconds_total=Sum('seconds_in_stage'),
+        )
+    )
+
+    grouped = defaultdict(dict)
+    for row in rows:
+        key = row[group_fields[0]] if group_fields else None
+        grouped[key][row['status']] = row
+
+    if not group_fields:
+        return {'stages': _stages(grouped.get(None, {}))}
+    return {
+        'groups': [
+            {'group': key, 'stages': _stages(statuses)}
+            for key, statuses in sorted(grouped.items(), key=lambda item: (item[0] is None, str(item[0])))
+        ],
+    }
+
+
+def _stages(statuses):
+    stages = []
+    order = FUNNEL_STAGES + ['LOST']
+    for index, status in enumerate(order):
+        row = statuses.get(status, {})
+        entered = row.get('entered_total') or 0
+        exited = row.get('exited_total') or 0
+        seconds = row.get('seconds_total') or 0
+        next_status = FUNNEL_STAGES[index + 1] if index + 1 < len(FUNNEL_STAGES) else None
+        next_entered = (statuses.get(next_status, {}).get('entered_total') or 0) if next_status else None
+        stages.append({
+            'status': status,
+            'entered': entered,
+            'exited': exited,
+            'conversion_rate': round(next_entered / entered, 4) if next_status and entered else None,
+            'avg_days_in_stage': round(seconds / exited / 86400, 2) if exited else None,
+        })
+    return stages
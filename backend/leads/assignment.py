@@ -0,0 +1,182 @@
+"""
+Automatic lead assignment.
+
+New leads without an assignee are routed to approved, active sellers:
+
+* ``LeadRoutingRule`` rows restrict the candidates for leads of a given
+  country and/or product type (the most specific matching rules win);
+* among the candidates, LEAD_ASSIGNMENT_STRATEGY picks the seller:
+  ``least_open`` (fewest open leads) or ``round_robin`` (longest since last
+  assignment). An empty strategy disables automatic assignment.
+
+Open-lead counts live in ``SellerWorkload`` and are adjusted with ``F()``
+updates whenever a lead is assigned, reassigned, closed, reopened or
+deleted. The workload rows of the candidates are locked while a batch is
+assigned, so concurrent intake requests cannot pick from stale counts.
+"""
+import heapq
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Lead, LeadRoutingRule, SellerWorkload
+
+CLOSED_STATUSES = ('ORDER_CONFIRMED', 'LOST')
+STRATEGIES = ('least_open', 'round_robin')
+
+_NEVER = datetime.min.replace(tzinfo=dt_timezone.utc)
+
+
+def is_open(status):
+    return status not in CLOSED_STATUSES
+
+
+def eligible_sellers():
+    return get_user_model().objects.filter(role='SELLER', approval_status='APPROVED', is_active=True)
+
+
+def adjust_open_leads(deltas, assigned_at=None):
+    """Apply ``{seller_id: delta}`` to the open-lead counters, one UPDATE per distinct delta."""
+    deltas = {seller_id: delta for seller_id, delta in deltas.items() if seller_id and delta}
+    if not deltas:
+        return
+    SellerWorkload.objects.bulk_create(
+        [SellerWorkload(seller_id=seller_id) for seller_id in deltas],
+        ignore_conflicts=True,
+    )
+    by_delta = {}
+    for seller_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(seller_id)
+    for delta, seller_ids in by_delta.items():
+        fields = {'open_leads': F('open_leads') + delta}
+        if assigned_at and delta > 0:
+            fields['last_assigned_at'] = assigned_at
+        SellerWorkload.objects.filter(seller_id__in=seller_ids).update(**fields)
+
+
+def track_change(before, after):
+    """
+    Update counters for a lead going from ``before`` to ``after``, each an
+    ``(assigned_to_id, status)`` pair or None when the lead does not exist.
+    """
+    deltas = Counter()
+    if before and before[0] and is_open(before[1]):
+        deltas[before[0]] -= 1
+    if after and after[0] and is_open(after[1]):
+        deltas[after[0]] += 1
+    before_seller = before[0] if before else None
+    after_seller = after[0] if after else None
+    reassigned = after_seller and after_seller != before_seller
+    adjust_open_leads(deltas, assigned_at=timezone.now() if reassigned else None)
+
+
+def _candidate_groups(leads, rules, default_candidates):
+    """Map each lead to the tuple of seller ids it may be assigned to."""
+    groups = []
+    for lead in leads:
+        best, candidates = -1, set()
+        for rule in rules:
+            if not rule.matches(lead):
+                continue
+            specificity = bool(rule.country) + bool(rule.product_type)
+            if specificity > best:
+                best, candidates = specificity, {rule.seller_id}
+            elif specificity == best:
+                candidates.add(rule.seller_id)
+        candidates &= default_candidates
+        groups.append(tuple(sorted(candidates or default_candidates)))
+    return groups
+
+
+def assign_leads(leads, strategy=None):
+    """
+    Set ``assigned_to`` on unsaved leads that have none. Must run inside the
+    transaction that saves the leads, which then calls record_new_leads() for
+    the leads actually inserted. Returns the number of leads assigned.
+    """
+    strategy = strategy if strategy is not None else getattr(settings, 'LEAD_ASSIGNMENT_STRATEGY', 'least_open')
+    if strategy not in STRATEGIES:
+        return 0
+    pending = [lead for lead in leads if not lead.assigned_to_id]
+    if not pending:
+        return 0
+
+    seller_ids = set(eligible_sellers().values_list('pk', flat=True))
+    if not seller_ids:
+        return 0
+    SellerWorkload.objects.bulk_create(
+        [SellerWorkload(seller_id=seller_id) for seller_id in seller_ids],
+        ignore_conflicts=True,
+    )
+    workloads = {
+        workload.seller_id: workload
+        for workload in SellerWorkload.objects.select_for_update().filter(seller_id__in=seller_ids)
+    }
+    rules = list(LeadRoutingRule.objects.filter(is_active=True, seller_id__in=seller_ids))
+
+    # Sellers ordered by how long ago they last received a lead; reassigned
+    # to the back as the batch proceeds.
+    order = sorted(seller_ids, key=lambda seller_id: (workloads[seller_id].last_assigned_at or _NEVER, seller_id))
+    recency = {seller_id: rank for rank, seller_id in enumerate(order)}
+    next_rank = len(order)
+    open_counts = {seller_id: workloads[seller_id].open_leads for seller_id in seller_ids}
+
+    def priority(seller_id):
+        if strategy == 'round_robin':
+            return (recency[seller_id],)
+        return (open_counts[seller_id], recency[seller_id])
+
+    # One priority queue per distinct candidate set; counts are shared, so
+    # entries made stale by another queue are re-keyed when popped.
+    queues = {}
+    for lead, candidates in zip(pending, _candidate_groups(pending, rules, seller_ids)):
+        queue = queues.get(candidates)
+        if queue is None:
+            queue = queues[candidates] = [(priority(seller_id), seller_id) for seller_id in candidates]
+            heapq.heapify(queue)
+        while True:
+            key, seller_id = heapq.heappop(queue)
+            if key == priority(seller_id):
+                break
+            heapq.heappush(queue, (priority(seller_id), seller_id))
+
+        lead.assigned_to_id = seller_id
+        recency[seller_id] = next_rank
+        next_rank += 1
+        if is_open(lead.status):
+            open_counts[seller_id] += 1
+        heapq.heappush(queue, (priority(seller_id), seller_id))
+
+    return len(pending)
+
+
+def record_new_leads(leads):
+    """Count newly inserted leads (e.g. from bulk_create, which sends no signals)."""
+    deltas = Counter(lead.assigned_to_id for lead in leads if lead.assigned_to_id and is_open(lead.status))
+    adjust_open_leads(deltas, assigned_at=timezone.now())
+
+
+def rebuild_workloads():
+    """Recompute every seller's counter from the leads table (repair tool)."""
+    counts = dict(
+        Lead.objects
+        .filter(assigned_to__isnull=False)
+        .exclude(status__in=CLOSED_STATUSES)
+        .order_by()
+        .values_list('assigned_to')
+        .annotate(total=Count('pk'))
+    )
+    with transaction.atomic():
+        SellerWorkload.objects.bulk_create(
+            [SellerWorkload(seller_id=seller_id) for seller_id in counts],
+            ignore_conflicts=True,
+        )
+        SellerWorkload.objects.filter(~Q(seller_id__in=list(counts))).update(open_leads=0)
+        for seller_id, total in counts.items():
+            SellerWorkload.objects.filter(seller_id=seller_id).update(open_leads=total)
+    return counts
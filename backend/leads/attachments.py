@@ -0,0 +1,163 @@
+"""
+Reference attachments for leads.
+
+Uploads are parsed with ``AttachmentUploadHandler`` in front of Django's
+temporary-file handler, so files are streamed to disk chunk by chunk and a
+request is stopped as soon as a file exceeds LEAD_ATTACHMENT_MAX_BYTES or
+its leading bytes are not an allowed type (the client's content type is not
+trusted). Stored files are appended to ``Lead.reference_images`` under a
+row lock; preview thumbnails are rendered in a background thread pool once
+the transaction commits.
+"""
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+from .models import Lead
+
+logger = logging.getLogger(__name__)
+
+# (extension, leading bytes) of accepted attachment types
+SIGNATURES = (
+    ('jpg', (b'\xff\xd8\xff',)),
+    ('png', (b'\x89PNG\r\n\x1a\n',)),
+    ('gif', (b'GIF87a', b'GIF89a')),
+    ('webp', (b'RIFF',)),
+    ('pdf', (b'%PDF-',)),
+)
+IMAGE_TYPES = ('jpg', 'png', 'gif', 'webp')
+PREVIEW_SIZE = 320
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='lead-preview')
+
+
+def max_file_bytes():
+    return getattr(settings, 'LEAD_ATTACHMENT_MAX_BYTES', 10 * 1024 * 1024)
+
+
+def max_files():
+    return getattr(settings, 'LEAD_ATTACHMENT_MAX_FILES', 10)
+
+
+def sniff_type(head):
+    """Return the attachment extension matching the first bytes of a file, or None."""
+    for ext, signatures in SIGNATURES:
+        if any(head.startswith(signature) for signature in signatures):
+            if ext == 'webp' and head[8:12] != b'WEBP':
+                continue
+            return ext
+    return None
+
+
+class AttachmentUploadHandler(FileUploadHandler):
+    """
+    Validates each uploaded file while it streams, then passes the chunks on
+    to the next handler. Files are rejected on their first chunk if the type
+    is not allowed, or as soon as they grow past the size limit; ``error``
+    explains why the upload was stopped.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.file_count = 0
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.file_count += 1
+        if self.file_count > max_files():
+            self._stop(f'Upload at most {max_files()} files per request.')
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            if sniff_type(raw_data[:16]) is None:
+                self._stop(f'{self.file_name}: only JPEG, PNG, GIF, WebP and PDF files are accepted.')
+        self.received += len(raw_data)
+        if self.received > max_file_bytes():
+            self._stop(f'{self.file_name}: files may be at most {filesizeformat(max_file_bytes())}.')
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def _stop(self, message):
+        self.error = message
+        raise StopUpload(connection_reset=False)
+
+
+def attachment_path(lead_id, ext):
+    return f'leads/{lead_id}/{uuid.uuid4().hex}.{ext}'
+
+
+def preview_path(path):
+    directory, name = os.path.split(path)
+    return f'{directory}/previews/{os.path.splitext(name)[0]}.webp'
+
+
+def store_attachments(lead_id, files):
+    """Save uploaded files to storage; returns their storage paths."""
+    paths = []
+    try:
+        for upload in files:
+            ext = sniff_type(upload.read(16))
+            upload.seek(0)
+            # Storage backends copy File objects chunk by chunk
+            paths.append(default_storage.save(attachment_path(lead_id, ext), upload))
+    except Exception:
+        delete_attachments(paths)
+        raise
+    return paths
+
+
+def delete_attachments(paths):
+    for path in paths:
+        default_storage.delete(path)
+
+
+def attach_to_lead(lead_id, urls, user=None):
+    """Append attachment URLs to a lead under a row lock and record it in the history."""
+    with transaction.atomic():
+        lead = Lead.objects.select_for_update().get(pk=lead_id)
+        lead.reference_images = list(lead.reference_images or []) + list(urls)
+        lead.save(update_fields=['reference_images', 'updated_at'])
+        lead.record_history(user=user)
+    return lead
+
+
+def render_preview(path):
+    """Write a WebP thumbnail next to an image attachment."""
+    with default_storage.open(path, 'rb') as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        image.convert('RGB').save(buffer, 'WEBP', quality=80, method=4)
+    target = preview_path(path)
+    if default_storage.exists(target):
+        default_storage.delete(target)
+    return default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def _render_in_background(paths):
+    for path in paths:
+        try:
+            render_preview(path)
+        except Exception:
+            logger.exception('Failed to render preview for %s', path)
+
+
+def schedule_previews(paths):
+    """Queue thumbnails for the image attachments once the current transaction commits."""
+    images = [path for path in paths if os.path.splitext(path)[1].lstrip('.') in IMAGE_TYPES]
+    if images:
+        transaction.on_commit(lambda: _executor.submit(_render_in_background, images))
@@ -0,0 +1,31 @@
+import django_filters
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Lead
+from .search import search_leads
+
+
+class LeadFilter(django_filters.FilterSet):
+    """Indexed pipeline filters for LeadViewSet."""
+
+    status = django_filters.MultipleChoiceFilter(choices=Lead.STATUS_CHOICES)
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lte')
+    quantity_min = django_filters.NumberFilter(field_name='quantity', lookup_expr='gte')
+    quantity_max = django_filters.NumberFilter(field_name='quantity', lookup_expr='lte')
+
+    class Meta:
+        model = Lead
+        fields = ['status', 'country', 'product_type', 'assigned_to']
+
+
+class LeadSearchFilter(BaseFilterBackend):
+    """`?search=` over the lead token index instead of LIKE '%term%' scans."""
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search_leads(queryset, query)
@@ -0,0 +1,101 @@
+"""
+Lead intake with duplicate detection.
+
+Each submission gets a fingerprint of its normalized email, product type and
+time bucket (LEAD_DEDUP_WINDOW_HOURS). ``Lead.fingerprint`` is unique, so a
+batch is deduplicated against existing leads with one ``IN`` query and
+inserted with one ``bulk_create`` after the assignment engine has picked a
+seller for unassigned leads; resubmissions are recorded in the history
+of the lead they duplicate instead of creating a new one.
+"""
+import hashlib
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics
+from .assignment import assign_leads, record_new_leads
+from .models import Lead, LeadHistory
+from .search import index_leads
+
+IntakeResult = namedtuple('IntakeResult', ['lead', 'created'])
+
+# Submission fields kept in the history entry of a merged duplicate
+MERGED_FIELDS = ['name', 'phone', 'quantity', 'budget', 'message', 'reference_images']
+
+
+def normalize(value):
+    return ' '.join(str(value or '').lower().split())
+
+
+def lead_fingerprint(email, product_type, when=None):
+    window = int(getattr(settings, 'LEAD_DEDUP_WINDOW_HOURS', 24) * 3600) or 1
+    when = when or timezone.now()
+    bucket = int(when.timestamp()) // window
+    raw = f'{normalize(email)}|{normalize(product_type)}|{bucket}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def ingest_leads(rows, actor=None, defaults=None):
+    """
+    Create leads from validated submission dicts, merging duplicates.
+
+    Returns one IntakeResult per row, in order. ``defaults`` are extra field
+    values applied to newly created leads (e.g. ``user`` or ``assigned_to``).
+    """
+    defaults = defaults or {}
+    now = timezone.now()
+    batch = uuid.uuid4()
+    fingerprints = [lead_fingerprint(row['email'], row['product_type'], now) for row in rows]
+
+    with transaction.atomic():
+        leads = {
+            lead.fingerprint: lead
+            for lead in Lead.objects.filter(fingerprint__in=set(fingerprints))
+        }
+        existing = set(leads)
+
+        new_leads = {}
+        for fingerprint, row in zip(fingerprints, rows):
+            if fingerprint not in leads and fingerprint not in new_leads:
+                new_leads[fingerprint] = Lead(**{**row, **defaults}, fingerprint=fingerprint, intake_batch=batch)
+
+        if new_leads:
+            assign_leads(new_leads.values())
+            # A concurrent request may insert the same fingerprint first; that
+            # row is then picked up below and this submission merged into it.
+            # Only rows carrying this call's batch token were inserted here.
+            Lead.objects.bulk_create(new_leads.values(), ignore_conflicts=True)
+            for lead in Lead.objects.filter(fingerprint__in=list(new_leads)):
+                leads[lead.fingerprint] = lead
+                if lead.intake_batch != batch:
+                    existing.add(lead.fingerprint)
+
+        results = []
+        history = []
+        seen = set(existing)
+        for fingerprint, row in zip(fingerprints, rows):
+            lead = leads[fingerprint]
+            if fingerprint in seen:
+                results.append(IntakeResult(lead, False))
+                history.append(LeadHistory(
+                    lead=lead,
+                    user=actor,
+                    action='Duplicate inquiry merged',
+                    new_value={name: row[name] for name in MERGED_FIELDS if name in row},
+                ))
+            else:
+                seen.add(fingerprint)
+                results.append(IntakeResult(lead, True))
+                history.append(LeadHistory(lead=lead, user=actor, action='Lead created'))
+
+        LeadHistory.objects.bulk_create(history)
+        created = [result.lead for result in results if result.created]
+        record_new_leads(created)
+        analytics.record_new_leads(created)
+        index_leads(created)
+
+    return results
@@ -0,0 +1,18 @@
+"""
+Django management command to rebuild the lead funnel rollups
+Usage: python manage.py rebuild_lead_funnel
+
+Rollups are maintained incrementally; run this once after upgrading and
+after bulk edits that bypass Lead.save().
+"""
+from django.core.management.base import BaseCommand
+
+from leads.analytics import rebuild_funnel
+
+
+class Command(BaseCommand):
+    help = 'Regenerates LeadFunnelDaily rollups from leads and their status history'
+
+    def handle(self, *args, **options):
+        buckets = rebuild_funnel()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} funnel rollup rows'))
@@ -0,0 +1,19 @@
+"""
+Django management command to rebuild the lead search index
+Usage: python manage.py rebuild_lead_search_index [--batch-size 1000]
+"""
+from django.core.management.base import BaseCommand
+
+from leads.models import Lead
+from leads.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search tokens used by lead search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(Lead.objects.order_by('pk'), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} leads'))
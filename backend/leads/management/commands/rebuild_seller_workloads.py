@@ -0,0 +1,20 @@
+"""
+Django management command to recompute seller open-lead counters
+Usage: python manage.py rebuild_seller_workloads
+
+Counters are maintained incrementally; run this after bulk edits made with
+QuerySet.update() or raw SQL, which bypass the lead signals.
+"""
+from django.core.management.base import BaseCommand
+
+from leads.assignment import rebuild_workloads
+
+
+class Command(BaseCommand):
+    help = 'Recomputes SellerWorkload open-lead counters from the leads table'
+
+    def handle(self, *args, **options):
+        counts = rebuild_workloads()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt workloads for {len(counts)} sellers ({sum(counts.values())} open leads)'
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0003_lead_pipeline_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leadhistory',
+            name='field',
+            field=models.CharField(blank=True, help_text='Lead field changed, blank for general actions', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='leadhistory',
+            name='new_value',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='leadhistory',
+            name='old_value',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='leadhistory',
+            index=models.Index(fields=['lead', '-timestamp'], name='leadhistory_timeline_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0004_lead_history_audit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of normalized email, product type and submission window', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def initialize_workloads(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    SellerWorkload = apps.get_model('leads', 'SellerWorkload')
+    counts = (
+        Lead.objects
+        .filter(assigned_to__isnull=False)
+        .exclude(status__in=['ORDER_CONFIRMED', 'LOST'])
+        .order_by()
+        .values_list('assigned_to')
+        .annotate(total=Count('pk'))
+    )
+    SellerWorkload.objects.bulk_create(
+        [SellerWorkload(seller_id=seller_id, open_leads=total) for seller_id, total in counts]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0005_lead_fingerprint'),
+        ('users', '0006_user_avatar_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadRoutingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.CharField(blank=True, max_length=100)),
+                ('product_type', models.CharField(blank=True, max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lead_routing_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lead Routing Rule',
+                'verbose_name_plural': 'Lead Routing Rules',
+                'ordering': ['country', 'product_type'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SellerWorkload',
+            fields=[
+                ('seller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='lead_workload', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_leads', models.IntegerField(default=0)),
+                ('last_assigned_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Seller Workload',
+                'verbose_name_plural': 'Seller Workloads',
+                'indexes': [models.Index(fields=['open_leads', 'last_assigned_at'], name='workload_least_open_idx'), models.Index(fields=['last_assigned_at'], name='workload_round_robin_idx')],
+            },
+        ),
+        migrations.RunPython(initialize_workloads, migrations.RunPython.noop),
+    ]
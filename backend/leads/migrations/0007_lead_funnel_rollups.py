@@ -0,0 +1,50 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_existing_leads(apps, schema_editor):
+    # Best available estimate of when existing leads reached their status
+    Lead = apps.get_model('leads', 'Lead')
+    Lead.objects.update(status_changed_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0006_seller_workload_routing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='LeadFunnelDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('country', models.CharField(max_length=100)),
+                ('product_type', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('NEW', 'New'), ('QUALIFIED', 'Qualified'), ('SCOPE_LOCKED', 'Scope Locked'), ('PI_SENT', 'PI Sent'), ('ORDER_CONFIRMED', 'Order Confirmed'), ('LOST', 'Lost')], max_length=20)),
+                ('entered', models.IntegerField(default=0, help_text='Leads that moved into this status')),
+                ('exited', models.IntegerField(default=0, help_text='Leads that moved out of this status')),
+                ('seconds_in_stage', models.BigIntegerField(default=0, help_text='Total time spent in this status by leads that exited')),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lead Funnel Rollup',
+                'verbose_name_plural': 'Lead Funnel Rollups',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'status', 'country', 'product_type', 'assigned_to'], name='funnel_bucket_idx'), models.Index(fields=['assigned_to', 'date'], name='funnel_assignee_date_idx')],
+            },
+        ),
+        migrations.RunPython(stamp_existing_leads, migrations.RunPython.noop),
+    ]
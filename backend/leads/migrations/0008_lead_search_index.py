@@ -0,0 +1,77 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:15
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copies of the tokenizer and searchable fields as of this migration
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+SEARCHABLE_FIELDS = ('name', 'email', 'phone', 'country', 'product_type', 'message')
+MAX_TOKENS_PER_LEAD = 200
+
+
+def lead_tokens(row):
+    tokens = dict.fromkeys(
+        token[:64] for field in SEARCHABLE_FIELDS for token in TOKEN_RE.findall(str(row[field] or '').lower())
+    )
+    return set(list(tokens)[:MAX_TOKENS_PER_LEAD])
+
+
+def build_search_index(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    LeadSearchToken = apps.get_model('leads', 'LeadSearchToken')
+    batch = []
+    for row in Lead.objects.values('pk', *SEARCHABLE_FIELDS).iterator(chunk_size=1000):
+        batch.extend(LeadSearchToken(lead_id=row['pk'], token=token) for token in lead_tokens(row))
+        if len(batch) >= 5000:
+            LeadSearchToken.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        LeadSearchToken.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0007_lead_funnel_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['country', '-created_at'], name='lead_country_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['product_type', '-created_at'], name='lead_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['quantity'], name='lead_quantity_idx'),
+        ),
+        migrations.AddField(
+            model_name='leadsearchtoken',
+            name='lead',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='leads.lead'),
+        ),
+        migrations.AddIndex(
+            model_name='leadsearchtoken',
+            index=models.Index(fields=['token', 'lead'], name='lead_search_token_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leadsearchtoken',
+            constraint=models.UniqueConstraint(fields=('lead', 'token'), name='unique_lead_search_token'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0008_lead_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='intake_batch',
+            field=models.UUIDField(blank=True, editable=False, help_text='Intake call that inserted the lead; tells its own inserts from concurrent ones', null=True),
+        ),
+    ]
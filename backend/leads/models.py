@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class Lead(models.Model):
@@ -49,17 +50,132 @@ class Lead(models.Model):
         help_text='The buyer who created this lead (if logged in)'
     )
     
+    # Duplicate detection (see leads/intake.py)
+    fingerprint = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Hash of normalized email, product type and submission window'
+    )
+    intake_batch = models.UUIDField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Intake call that inserted the lead; tells its own inserts from concurrent ones'
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    status_changed_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Lead'
         verbose_name_plural = 'Leads'
+        indexes = [
+            # Seller pipelines: filter(assigned_to=...) [+ status] ordered by newest
+            models.Index(fields=['assigned_to', 'status', '-created_at'], name='lead_assignee_status_idx'),
+            # Admin pipeline views filtered by status
+            models.Index(fields=['status', '-created_at'], name='lead_status_created_idx'),
+            # Pipeline filters (see leads/filters.py)
+            models.Index(fields=['country', '-created_at'], name='lead_country_created_idx'),
+            models.Index(fields=['product_type', '-created_at'], name='lead_product_created_idx'),
+            models.Index(fields=['quantity'], name='lead_quantity_idx'),
+        ]
+    
+    # Fields whose changes are written to LeadHistory
+    AUDITED_FIELDS = [
+        'name', 'email', 'phone', 'country', 'product_type', 'quantity',
+        'budget', 'message', 'reference_images', 'status', 'assigned_to',
+    ]
     
     def __str__(self):
         return f'{self.name} - {self.product_type} ({self.get_status_display()})'
+    
+    def save(self, *args, **kwargs):
+        """Stamp status changes so the funnel rollups can measure time in stage"""
+        state = getattr(self, '_workload_state', None)
+        if state is not None and 'status' in self.__dict__ and state[1] != self.status:
+            self._stage_exit = (state[0], state[1], self.status_changed_at)
+            self.status_changed_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'status' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'status_changed_at'}
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._audit_snapshot = instance._audit_values()
+        instance._workload_state = instance.workload_state()
+        return instance
+    
+    def workload_state(self):
+        """(assigned_to_id, status) as tracked by SellerWorkload, or None if deferred."""
+        if 'assigned_to_id' not in self.__dict__ or 'status' not in self.__dict__:
+            return None
+        return (self.assigned_to_id, self.status)
+    
+    def _audit_values(self):
+        values = {}
+        for name in self.AUDITED_FIELDS:
+            attname = self._meta.get_field(name).attname
+            if attname in self.__dict__:
+                values[name] = self.__dict__[attname]
+        return values
+    
+    def build_history(self, user=None):
+        """
+        Return unsaved LeadHistory rows, one per audited field that changed since
+        the lead was loaded, and start tracking from the current values. Callers
+        save them together with LeadHistory.objects.bulk_create().
+        """
+        before = getattr(self, '_audit_snapshot', None)
+        after = self._audit_values()
+        self._audit_snapshot = after
+        if before is None:
+            return []
+        
+        entries = []
+        for name, new_value in after.items():
+            if name not in before or before[name] == new_value:
+                continue
+            old_value = before[name]
+            entries.append(LeadHistory(
+                lead=self,
+                user=user,
+                field=name,
+                old_value=old_value,
+                new_value=new_value,
+                action=self._describe_change(name, old_value, new_value),
+            ))
+        return entries
+    
+    def record_history(self, user=None, actions=()):
+        """
+        Write the LeadHistory rows of build_history() plus one row per extra
+        ``actions`` description. Every path that changes a saved lead calls
+        this after saving, in the same transaction. Returns the rows written.
+        """
+        entries = self.build_history(user=user)
+        entries.extend(LeadHistory(lead=self, user=user, action=action) for action in actions)
+        if entries:
+            LeadHistory.objects.bulk_create(entries)
+        return entries
+    
+    def _describe_change(self, name, old_value, new_value):
+        if name == 'status':
+            labels = dict(self.STATUS_CHOICES)
+            return f'Status changed from {labels.get(old_value, old_value)} to {labels.get(new_value, new_value)}'
+        if name == 'assigned_to':
+            if new_value is None:
+                return 'Unassigned'
+            assignee = self.assigned_to
+            return f'Assigned to {assignee.get_full_name() or assignee.email}'
+        return f'Updated {self._meta.get_field(name).verbose_name}'
 
 
 class LeadHistory(models.Model):
@@ -68,6 +184,9 @@ class LeadHistory(models.Model):
     """
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='history')
     action = models.CharField(max_length=255)
+    field = models.CharField(max_length=50, blank=True, help_text='Lead field changed, blank for general actions')
+    old_value = models.JSONField(null=True, blank=True)
+    new_value = models.JSONField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -79,6 +198,125 @@ class LeadHistory(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Lead History'
         verbose_name_plural = 'Lead Histories'
+        indexes = [
+            models.Index(fields=['lead', '-timestamp'], name='leadhistory_timeline_idx'),
+        ]
     
     def __str__(self):
         return f'{self.lead.name} - {self.action} at {self.timestamp}'
+
+
+class LeadSearchToken(models.Model):
+    """
+    Inverted index of lowercase words from a lead's contact details, product
+    and message, used for prefix search (see leads/search.py).
+    """
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lead', 'token'], name='unique_lead_search_token'),
+        ]
+        indexes = [
+            models.Index(fields=['token', 'lead'], name='lead_search_token_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.token} -> {self.lead_id}'
+
+
+class SellerWorkload(models.Model):
+    """
+    Per-seller counter of open (not confirmed/lost) assigned leads, maintained
+    by leads/assignment.py so the assignment engine never has to COUNT(*).
+    """
+    seller = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='lead_workload'
+    )
+    open_leads = models.IntegerField(default=0)
+    last_assigned_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Seller Workload'
+        verbose_name_plural = 'Seller Workloads'
+        indexes = [
+            models.Index(fields=['open_leads', 'last_assigned_at'], name='workload_least_open_idx'),
+            models.Index(fields=['last_assigned_at'], name='workload_round_robin_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.seller} - {self.open_leads} open'
+
+
+class LeadRoutingRule(models.Model):
+    """
+    Route leads matching a country and/or product type to a set of sellers.
+    Blank fields match anything.
+    """
+    country = models.CharField(max_length=100, blank=True)
+    product_type = models.CharField(max_length=100, blank=True)
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='lead_routing_rules'
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['country', 'product_type']
+        verbose_name = 'Lead Routing Rule'
+        verbose_name_plural = 'Lead Routing Rules'
+    
+    def __str__(self):
+        return f'{self.country or "Any country"} / {self.product_type or "Any product"} -> {self.seller}'
+    
+    def matches(self, lead):
+        if self.country and self.country.strip().lower() != (lead.country or '').strip().lower():
+            return False
+        if self.product_type and self.product_type.strip().lower() != (lead.product_type or '').strip().lower():
+            return False
+        return True
+
+
+class LeadFunnelDaily(models.Model):
+    """
+    Daily rollup of lead status transitions, maintained incrementally by
+    leads/analytics.py. Normally one row per day, country, product type,
+    assignee and status; readers always SUM, so a duplicate bucket created by
+    two concurrent first writers is harmless.
+    """
+    date = models.DateField()
+    country = models.CharField(max_length=100)
+    product_type = models.CharField(max_length=100)
+    assigned_to = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    status = models.CharField(max_length=20, choices=Lead.STATUS_CHOICES)
+    entered = models.IntegerField(default=0, help_text='Leads that moved into this status')
+    exited = models.IntegerField(default=0, help_text='Leads that moved out of this status')
+    seconds_in_stage = models.BigIntegerField(default=0, help_text='Total time spent in this status by leads that exited')
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'Lead Funnel Rollup'
+        verbose_name_plural = 'Lead Funnel Rollups'
+        indexes = [
+            # Bucket lookup for incremental updates and date-range scans
+            models.Index(
+                fields=['date', 'status', 'country', 'product_type', 'assigned_to'],
+                name='funnel_bucket_idx',
+            ),
+            models.Index(fields=['assigned_to', 'date'], name='funnel_assignee_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.date} {self.status}: +{self.entered}/-{self.exited}'
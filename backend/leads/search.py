@@ -0,0 +1,33 @@
+"""
+Prefix search over leads, using the same word-token index as the user
+directory (search/index.py): each lead's searchable text is split into
+lowercase tokens stored in ``LeadSearchToken`` and every search term must be
+a prefix of one of them, answered by a scan of the ``(token, lead)`` index.
+"""
+from search.index import TokenIndex
+
+from .models import LeadSearchToken
+
+SEARCHABLE_FIELDS = ('name', 'email', 'phone', 'country', 'product_type', 'message')
+# Long messages are indexed by their first words only
+MAX_TOKENS_PER_LEAD = 200
+
+lead_index = TokenIndex(LeadSearchToken, 'lead', SEARCHABLE_FIELDS, max_tokens=MAX_TOKENS_PER_LEAD)
+
+
+def index_leads(leads, batch_size=1000):
+    """Replace the search tokens of the given (saved) leads."""
+    lead_index.index(leads, batch_size=batch_size)
+
+
+def rebuild_index(queryset, batch_size=1000):
+    """Re-index every lead in the queryset. Returns the number of leads indexed."""
+    return lead_index.rebuild(queryset, batch_size=batch_size)
+
+
+def search_leads(queryset, query):
+    """
+    Filter a lead queryset to leads matching every term of the query as a
+    word prefix, ranked by the number of terms that match a word exactly.
+    """
+    return lead_index.search(queryset, query)
@@ -5,22 +5,54 @@ from .models import Lead, LeadHistory
 class LeadHistorySerializer(serializers.ModelSerializer):
     class Meta:
         model = LeadHistory
-        fields = ['id', 'action', 'timestamp', 'user']
+        fields = ['id', 'action', 'field', 'old_value', 'new_value', 'timestamp', 'user']
         read_only_fields = ['timestamp']
 
 
 class LeadSerializer(serializers.ModelSerializer):
-    history = LeadHistorySerializer(many=True, read_only=True)
+    """
+    Lead with a summary of its history. The full history is served, paginated,
+    by the `history` action; the summary fields are read from the annotations
+    added by LeadViewSet.get_queryset when present.
+    """
+    history_count = serializers.SerializerMethodField()
+    last_action = serializers.SerializerMethodField()
+    last_action_at = serializers.SerializerMethodField()
     
     class Meta:
         model = Lead
         fields = [
             'id', 'name', 'email', 'phone', 'country', 'product_type',
             'quantity', 'budget', 'message', 'reference_images', 'status',
-            'assigned_to', 'user', 'created_at', 'updated_at', 'history'
+            'assigned_to', 'user', 'created_at', 'updated_at',
+            'history_count', 'last_action', 'last_action_at',
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def get_history_count(self, obj):
+        if hasattr(obj, 'history_count'):
+            return obj.history_count
+        return obj.history.count()
+
+    def get_last_action(self, obj):
+        if hasattr(obj, 'last_action'):
+            return obj.last_action
+        latest = self._latest_history(obj)
+        return latest.action if latest else None
+
+    def get_last_action_at(self, obj):
+        if hasattr(obj, 'last_action_at'):
+            value = obj.last_action_at
+        else:
+            latest = self._latest_history(obj)
+            value = latest.timestamp if latest else None
+        return serializers.DateTimeField().to_representation(value) if value else None
+
+    def _latest_history(self, obj):
+        if not hasattr(obj, '_latest_history_cache'):
+            obj._latest_history_cache = obj.history.order_by('-timestamp').first()
+        return obj._latest_history_cache
+
 
 class LeadCreateSerializer(serializers.ModelSerializer):
     """Simplified serializer for creating leads"""
@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import analytics
+from .assignment import track_change
+from .models import Lead
+from .search import lead_index
+
+
+@receiver(post_save, sender=Lead, dispatch_uid='leads_track_workload_on_save')
+def track_workload_on_save(sender, instance, created, raw=False, **kwargs):
+    """Keep funnel rollups and SellerWorkload counters in step with lead changes."""
+    if raw:
+        return
+    stage_exit = instance.__dict__.pop('_stage_exit', None)
+    if created:
+        analytics.record_new_leads([instance])
+    elif stage_exit:
+        analytics.record_status_change(instance, *stage_exit)
+
+    before = None if created else getattr(instance, '_workload_state', None)
+    after = instance.workload_state()
+    if not created and (before is None or after is None):
+        # Unknown previous or current state (e.g. deferred fields); see rebuild_seller_workloads.
+        return
+    instance._workload_state = after
+    if before != after:
+        track_change(before, after)
+
+
+@receiver(post_delete, sender=Lead, dispatch_uid='leads_track_workload_on_delete')
+def track_workload_on_delete(sender, instance, **kwargs):
+    before = getattr(instance, '_workload_state', None) or instance.workload_state()
+    if before:
+        track_change(before, None)
+
+
+@receiver(post_save, sender=Lead, dispatch_uid='leads_index_search_tokens')
+def index_lead_search_tokens(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Keep the lead search index in sync with saved leads."""
+    if raw:
+        return
+    lead_index.index_saved(instance, created, update_fields, before=getattr(instance, '_audit_snapshot', None))
@@ -1,3 +1,323 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib import admin
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from users.models import User
+
+from .analytics import rebuild_funnel
+from .attachments import attach_to_lead
+from .intake import ingest_leads, lead_fingerprint
+from .models import Lead, LeadFunnelDaily, LeadHistory, LeadSearchToken
+from .search import MAX_TOKENS_PER_LEAD
+
+
+class LeadQueryCountTests(TestCase):
+    """The lead list and history stay at a fixed number of queries as leads and history grow."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='ADMIN')
+        cls.seller = User.objects.create_user(username='seller', email='seller@example.com', password='x', role='SELLER')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_leads(self, count, history=3):
+        leads = Lead.objects.bulk_create([
+            Lead(name=f'Lead {i}', email=f'lead{i}@example.com', country='DE', product_type='T-shirt', assigned_to=self.seller)
+            for i in range(count)
+        ])
+        LeadHistory.objects.bulk_create([
+            LeadHistory(lead=lead, user=self.admin, action=f'Action {i}')
+            for lead in leads
+            for i in range(history)
+        ])
+        return leads
+
+    def test_list(self):
+        self.add_leads(2)
+        with self.assertNumQueries(2):
+            self.client.get('/api/leads/')
+        self.add_leads(30, history=10)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/leads/')
+        self.assertEqual(response.json()['count'], 32)
+        self.assertEqual(sorted({lead['history_count'] for lead in response.json()['results']}), [3, 10])
+
+    def test_history(self):
+        few, many = self.add_leads(1, history=2)[0], self.add_leads(1, history=40)[0]
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/leads/{few.pk}/history/')
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/leads/{many.pk}/history/')
+        self.assertEqual(response.json()['count'], 40)
+
+
+@override_settings(LEAD_DEDUP_WINDOW_HOURS=24)
+class LeadIntakeTests(TestCase):
+    """ingest_leads merges submissions with the same fingerprint instead of creating duplicates."""
+
+    def row(self, email='buyer@example.com', product_type='T-shirt', **values):
+        return {'name': 'Buyer', 'email': email, 'country': 'DE', 'product_type': product_type, **values}
+
+    def ingest(self, rows, when):
+        with mock.patch('leads.intake.timezone.now', return_value=when):
+            return ingest_leads(rows)
+
+    def setUp(self):
+        self.now = timezone.now().replace(hour=12, minute=0)
+
+    def test_duplicates_in_one_batch(self):
+        results = self.ingest([
+            self.row(),
+            self.row(email=' Buyer@Example.com ', product_type='t-shirt', quantity=500),
+            self.row(product_type='Hoodie'),
+        ], self.now)
+
+        self.assertEqual([result.created for result in results], [True, False, True])
+        self.assertEqual(results[0].lead, results[1].lead)
+        self.assertEqual(Lead.objects.count(), 2)
+        merged = LeadHistory.objects.get(lead=results[0].lead, action='Duplicate inquiry merged')
+        self.assertEqual(merged.new_value, {'name': 'Buyer', 'quantity': 500})
+
+    def test_duplicates_of_stored_leads(self):
+        first, = self.ingest([self.row()], self.now)
+        second, = self.ingest([self.row()], self.now + timedelta(hours=1))
+        self.assertFalse(second.created)
+        self.assertEqual(second.lead, first.lead)
+        self.assertEqual(Lead.objects.count(), 1)
+
+    def test_outside_the_window(self):
+        first, = self.ingest([self.row()], self.now)
+        second, = self.ingest([self.row()], self.now + timedelta(hours=24))
+        self.assertTrue(second.created)
+        self.assertNotEqual(second.lead, first.lead)
+
+    def test_batch_tagging(self):
+        first = self.ingest([self.row(), self.row(email='other@example.com')], self.now)
+        second, = self.ingest([self.row(email='third@example.com')], self.now)
+        batches = {result.lead.intake_batch for result in first}
+        self.assertEqual(len(batches), 1)
+        self.assertIsNotNone(batches.pop())
+        self.assertNotEqual(second.lead.intake_batch, first[0].lead.intake_batch)
+
+    def test_lead_inserted_concurrently(self):
+        # Another request stores the same fingerprint between the lookup and the insert
+        rival = {}
+
+        def insert_rival(leads):
+            rival['lead'] = Lead.objects.create(
+                **self.row(), fingerprint=lead_fingerprint('buyer@example.com', 'T-shirt', self.now),
+                intake_batch=uuid.uuid4(),
+            )
+
+        with mock.patch('leads.intake.assign_leads', side_effect=insert_rival):
+            results = self.ingest([self.row(), self.row(email='other@example.com')], self.now)
+
+        self.assertEqual([result.created for result in results], [False, True])
+        self.assertEqual(results[0].lead, rival['lead'])
+        self.assertEqual(Lead.objects.count(), 2)
+        self.assertTrue(LeadHistory.objects.filter(lead=rival['lead'], action='Duplicate inquiry merged').exists())
+
+
+class LeadSearchTests(TestCase):
+    """?search= over the lead token index, combined with the pipeline filters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='ADMIN')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.hoodies = Lead.objects.create(
+            name='Anna Berg', email='anna@nordic.se', country='SE', product_type='Hoodie',
+            quantity=800, message='Organic cotton, brushed fleece',
+        )
+        self.tees = Lead.objects.create(
+            name='Ben Carter', email='ben@carter.co.uk', country='UK', product_type='T-shirt',
+            quantity=200, status='QUALIFIED',
+        )
+
+    def search(self, **params):
+        response = self.client.get('/api/leads/', params)
+        self.assertEqual(response.status_code, 200)
+        return [lead['id'] for lead in response.json()['results']]
+
+    def test_search(self):
+        self.assertEqual(self.search(search='hood'), [self.hoodies.pk])
+        self.assertEqual(self.search(search='ORGANIC fle'), [self.hoodies.pk])
+        self.assertEqual(self.search(search='carter.co'), [self.tees.pk])
+        self.assertEqual(self.search(search='anna carter'), [])
+
+    def test_search_with_filters(self):
+        self.assertEqual(self.search(search='b', status='QUALIFIED'), [self.tees.pk])
+        self.assertEqual(self.search(search='b', quantity_min=500), [self.hoodies.pk])
+
+    def test_index_follows_saves(self):
+        self.tees.product_type = 'Polo'
+        self.tees.save()
+        self.assertEqual(self.search(search='t-shirt'), [])
+        self.assertEqual(self.search(search='polo'), [self.tees.pk])
+        self.tees.refresh_from_db()
+        self.tees.status = 'SCOPE_LOCKED'
+        self.tees.save(update_fields=['status'])
+        self.assertEqual(self.search(search='polo'), [self.tees.pk])
+
+    def test_long_messages(self):
+        self.hoodies.message = ' '.join(f'word{i}' for i in range(MAX_TOKENS_PER_LEAD * 2))
+        self.hoodies.save()
+        self.assertEqual(LeadSearchToken.objects.filter(lead=self.hoodies).count(), MAX_TOKENS_PER_LEAD)
+
+    def test_migration_backfill(self):
+        expected = set(LeadSearchToken.objects.values_list('lead_id', 'token'))
+        LeadSearchToken.objects.all().delete()
+        import_module('leads.migrations.0008_lead_search_index').build_search_index(apps, None)
+        self.assertEqual(set(LeadSearchToken.objects.values_list('lead_id', 'token')), expected)
+
+
+class LeadFunnelTests(TestCase):
+    """Stage exits go to the assignee before a change and entries to the one after it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', role='ADMIN')
+        cls.anna = User.objects.create_user(username='anna', email='anna@example.com', password='x', role='SELLER')
+        cls.ben = User.objects.create_user(username='ben', email='ben@example.com', password='x', role='SELLER')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.lead = Lead.objects.create(
+            name='Lead', email='lead@example.com', country='DE', product_type='T-shirt', assigned_to=self.anna,
+        )
+
+    def update(self, **values):
+        response = self.client.patch(f'/api/leads/{self.lead.pk}/', values, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def rollups(self):
+        counts = {}
+        for row in LeadFunnelDaily.objects.all():
+            entered, exited = counts.get((row.assigned_to_id, row.status), (0, 0))
+            counts[(row.assigned_to_id, row.status)] = (entered + row.entered, exited + row.exited)
+        return {key: value for key, value in counts.items() if value != (0, 0)}
+
+    def test_reassignment(self):
+        self.update(assigned_to=self.ben.pk)
+        self.assertEqual(self.rollups(), {(self.anna.pk, 'NEW'): (1, 0)})
+        self.update(status='QUALIFIED')
+        self.update(status='SCOPE_LOCKED', assigned_to=self.anna.pk)
+        expected = {
+            (self.anna.pk, 'NEW'): (1, 0),
+            (self.ben.pk, 'NEW'): (0, 1),
+            (self.ben.pk, 'QUALIFIED'): (1, 1),
+            (self.anna.pk, 'SCOPE_LOCKED'): (1, 0),
+        }
+        self.assertEqual(self.rollups(), expected)
+
+        rebuild_funnel()
+        self.assertEqual(self.rollups(), expected)
+
+    def test_rebuild_without_assignee_history(self):
+        self.update(status='QUALIFIED')
+        Lead.objects.filter(pk=self.lead.pk).update(assigned_to=self.ben)
+        rebuild_funnel()
+        self.assertEqual(self.rollups(), {(self.ben.pk, 'NEW'): (1, 1), (self.ben.pk, 'QUALIFIED'): (1, 0)})
+
+    def test_report(self):
+        self.update(status='QUALIFIED', assigned_to=self.ben.pk)
+        self.update(status='LOST')
+
+        response = self.client.get('/api/leads/analytics/funnel/', {'group_by': 'assigned_to'})
+        self.assertEqual(response.status_code, 200)
+        stages = {
+            group['group']: {stage['status']: (stage['entered'], stage['exited']) for stage in group['stages']}
+            for group in response.json()['groups']
+        }
+        self.assertEqual(stages[self.anna.pk]['NEW'], (1, 1))
+        self.assertEqual(stages[self.anna.pk]['QUALIFIED'], (0, 0))
+        self.assertEqual(stages[self.ben.pk]['QUALIFIED'], (1, 1))
+        self.assertEqual(stages[self.ben.pk]['LOST'], (1, 0))
+
+        stages = self.client.get('/api/leads/analytics/funnel/').json()['stages']
+        self.assertEqual(stages[0]['conversion_rate'], 1.0)
+        self.assertEqual(stages[1]['conversion_rate'], 0.0)
+
+        self.client.force_authenticate(self.anna)
+        stages = self.client.get('/api/leads/analytics/funnel/').json()['stages']
+        self.assertEqual([(stage['status'], stage['entered']) for stage in stages if stage['entered']], [('NEW', 1)])
+
+
+class LeadHistoryTests(TestCase):
+    """Every path that changes a lead writes one history entry per changed field."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', role='ADMIN', first_name='Ada', last_name='Min',
+        )
+        cls.seller = User.objects.create_user(username='seller', email='seller@example.com', password='x', role='SELLER')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.lead = Lead.objects.create(
+            name='Lead', email='lead@example.com', country='DE', product_type='T-shirt', quantity=100, assigned_to=self.seller,
+        )
+
+    def entries(self):
+        return list(
+            LeadHistory.objects.filter(lead=self.lead).order_by('pk')
+            .values_list('field', 'old_value', 'new_value', 'action', 'user')
+        )
+
+    def test_api_update(self):
+        response = self.client.patch(
+            f'/api/leads/{self.lead.pk}/',
+            {'status': 'QUALIFIED', 'assigned_to': self.admin.pk, 'quantity': 250, 'country': 'DE'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.entries(), [
+            ('quantity', 100, 250, 'Updated quantity', self.admin.pk),
+            ('status', 'NEW', 'QUALIFIED', 'Status changed from New to Qualified', self.admin.pk),
+            ('assigned_to', self.seller.pk, self.admin.pk, 'Assigned to Ada Min', self.admin.pk),
+        ])
+        self.client.patch(f'/api/leads/{self.lead.pk}/', {'quantity': 250}, format='json')
+        self.assertEqual(len(self.entries()), 3)
+
+    def test_admin(self):
+        request = RequestFactory().post('/')
+        request.user = self.admin
+        lead_admin = admin.site._registry[Lead]
+
+        lead = Lead.objects.get(pk=self.lead.pk)
+        lead.status, lead.assigned_to = 'LOST', None
+        lead_admin.save_model(request, lead, form=None, change=True)
+        self.assertEqual(self.entries(), [
+            ('status', 'NEW', 'LOST', 'Status changed from New to Lost', self.admin.pk),
+            ('assigned_to', self.seller.pk, None, 'Unassigned', self.admin.pk),
+        ])
+
+        created = Lead(name='New', email='new@example.com', country='FR', product_type='Polo')
+        lead_admin.save_model(request, created, form=None, change=False)
+        self.assertEqual(
+            list(LeadHistory.objects.filter(lead=created).values_list('field', 'action')), [('', 'Lead created')],
+        )
+
+    def test_attachments(self):
+        attach_to_lead(self.lead.pk, ['/media/leads/a.png'], user=self.seller)
+        attach_to_lead(self.lead.pk, ['/media/leads/b.png'], user=self.seller)
+        self.assertEqual([entry[:3] for entry in self.entries()], [
+            ('reference_images', [], ['/media/leads/a.png']),
+            ('reference_images', ['/media/leads/a.png'], ['/media/leads/a.png', '/media/leads/b.png']),
+        ])
@@ -1,9 +1,30 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Lead
-from .serializers import LeadSerializer, LeadCreateSerializer
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
+from django_filters.rest_framework import DjangoFilterBackend
+from orders.conversion import convert_lead
+from orders.invoices import schedule_documents
+from orders.serializers import LeadConversionSerializer, OrderSerializer
+from users.throttling import WriteRateThrottle
+from . import analytics, attachments
+from .filters import LeadFilter, LeadSearchFilter
+from .intake import ingest_leads
+from .models import Lead, LeadFunnelDaily, LeadHistory
+from .serializers import LeadSerializer, LeadCreateSerializer, LeadHistorySerializer
 
 
 class LeadViewSet(viewsets.ModelViewSet):
@@ -16,6 +37,11 @@ class LeadViewSet(viewsets.ModelViewSet):
     queryset = Lead.objects.all()
     serializer_class = LeadSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [WriteRateThrottle]
+    filter_backends = [DjangoFilterBackend, LeadSearchFilter, OrderingFilter]
+    filterset_class = LeadFilter
+    ordering_fields = ['created_at', 'updated_at', 'status', 'quantity', 'name', 'country']
+    MAX_INTAKE_BATCH = 500
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -26,30 +52,243 @@ class LeadViewSet(viewsets.ModelViewSet):
         user = self.request.user
         role = getattr(user, 'role', '').upper()
         if role == 'ADMIN':
-            return Lead.objects.all()
-        if role == 'SELLER':
-            return Lead.objects.filter(assigned_to=user)
-        return Lead.objects.none()
+            queryset = Lead.objects.all()
+        elif role == 'SELLER':
+            queryset = Lead.objects.filter(assigned_to=user)
+        else:
+            return Lead.objects.none()
+        return self.annotate_history_summary(queryset)
+
+    @staticmethod
+    def annotate_history_summary(queryset):
+        """Add history_count/last_action/last_action_at as correlated subqueries."""
+        history = LeadHistory.objects.filter(lead=OuterRef('pk'))
+        latest = history.order_by('-timestamp')
+        return queryset.annotate(
+            history_count=Coalesce(
+                Subquery(
+                    history.order_by().values('lead').annotate(total=Count('pk')).values('total'),
+                    output_field=IntegerField(),
+                ),
+                0,
+            ),
+            last_action=Subquery(latest.values('action')[:1]),
+            last_action_at=Subquery(latest.values('timestamp')[:1]),
+        )
     
-    def perform_create(self, serializer):
+    def get_intake_defaults(self):
         # Auto-assign user if BUYER
         user = self.request.user
         if user.role == 'BUYER':
-            serializer.save(user=user)
-        elif user.role in ['SELLER', 'ADMIN']:
-            serializer.save(assigned_to=user)
-        else:
-            serializer.save()
+            return {'user': user}
+        if user.role in ['SELLER', 'ADMIN']:
+            return {'assigned_to': user}
+        return {}
+
+    def perform_create(self, serializer):
+        result = ingest_leads(
+            [serializer.validated_data],
+            actor=self.request.user,
+            defaults=self.get_intake_defaults(),
+        )[0]
+        serializer.instance = result.lead
+        return result
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            lead = serializer.save()
+            if lead.record_history(user=self.request.user):
+                # The history summary annotated by get_queryset is now stale
+                for attr in ('history_count', 'last_action', 'last_action_at'):
+                    lead.__dict__.pop(attr, None)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        result = self.perform_create(serializer)
         lead_instance = serializer.instance
+        if not result.created:
+            # The stored lead may belong to someone else; only confirm the merge.
+            return Response({'success': True, 'duplicate': True, 'data': {'id': lead_instance.pk}}, status=status.HTTP_200_OK)
         read_serializer = LeadSerializer(lead_instance, context=self.get_serializer_context())
         headers = self.get_success_headers(read_serializer.data)
-        return Response({'success': True, 'data': read_serializer.data}, status=status.HTTP_201_CREATED, headers=headers)
+        return Response({'success': True, 'duplicate': False, 'data': read_serializer.data}, status=status.HTTP_201_CREATED, headers=headers)
+
+    @action(detail=False, methods=['post'])
+    def intake(self, request):
+        """
+        Create one lead or a batch of leads (a JSON list, or {"leads": [...]}),
+        merging submissions that duplicate an existing lead.
+        """
+        payload = request.data
+        if isinstance(payload, dict) and 'leads' in payload:
+            payload = payload['leads']
+        many = isinstance(payload, list)
+        rows = payload if many else [payload]
+        if not rows or len(rows) > self.MAX_INTAKE_BATCH:
+            raise ValidationError(f'Submit between 1 and {self.MAX_INTAKE_BATCH} leads per request.')
+
+        serializer = LeadCreateSerializer(data=rows, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        results = ingest_leads(
+            serializer.validated_data,
+            actor=request.user,
+            defaults=self.get_intake_defaults(),
+        )
+        data = [{'id': result.lead.pk, 'created': result.created} for result in results]
+        created = sum(result.created for result in results)
+        return Response({
+            'success': True,
+            'created': created,
+            'merged': len(results) - created,
+            'data': data if many else data[0],
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
     
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser])
+    def attachments(self, request, pk=None):
+        """
+        Upload reference files (multipart field ``files``) and append their
+        URLs to the lead's reference_images. Admins and the assigned seller
+        may attach to any lead they can see; buyers to the leads they created.
+        """
+        lead = self.get_attachment_lead(pk)
+
+        limit = attachments.max_files() * attachments.max_file_bytes()
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > limit + 64 * 1024:
+            return Response({'success': False, 'error': 'Upload is too large.'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        # Validate while streaming and spool to temporary files, never memory
+        handler = attachments.AttachmentUploadHandler(request)
+        request.upload_handlers = [handler, TemporaryFileUploadHandler(request)]
+        files = request.FILES.getlist('files')
+        if handler.error:
+            for upload in files:
+                upload.close()
+            return Response({'success': False, 'error': handler.error}, status=status.HTTP_400_BAD_REQUEST)
+        if not files:
+            return Response({'success': False, 'error': 'No files provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        paths = attachments.store_attachments(lead.pk, files)
+        urls = [request.build_absolute_uri(default_storage.url(path)) for path in paths]
+        try:
+            with transaction.atomic():
+                lead = attachments.attach_to_lead(lead.pk, urls, user=request.user)
+                attachments.schedule_previews(paths)
+        except Exception:
+            attachments.delete_attachments(paths)
+            raise
+
+        return Response({
+            'success': True,
+            'urls': urls,
+            'previews': {
+                url: request.build_absolute_uri(default_storage.url(attachments.preview_path(path)))
+                for url, path in zip(urls, paths)
+                if path.rsplit('.', 1)[-1] in attachments.IMAGE_TYPES
+            },
+            'reference_images': lead.reference_images,
+        }, status=status.HTTP_201_CREATED)
+
+    def get_attachment_lead(self, pk):
+        user = self.request.user
+        if getattr(user, 'role', '').upper() == 'BUYER':
+            lead = Lead.objects.filter(pk=pk, user=user).only('pk').first()
+            if lead is None:
+                raise NotFound()
+            return lead
+        return self.get_object()
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Paginated history of a single lead, newest first."""
+        lead = self.get_object()
+        queryset = LeadHistory.objects.filter(lead=lead).order_by('-timestamp', '-pk')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = LeadHistorySerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = LeadHistorySerializer(queryset, many=True)
+        return Response({'success': True, 'data': serializer.data})
+
+    @action(detail=True, methods=['post'])
+    def convert(self, request, pk=None):
+        """
+        Convert the lead into an order: buyer details from the lead, prices
+        from its costings, the lead moved to Order Confirmed with its history,
+        all in one transaction. Lines are given as ``items`` ({costing,
+        quantity, unit_price?, size_breakdown?}); without them the lead's only
+        costing is ordered in the lead's quantity.
+        """
+        lead = self.get_object()
+        params = LeadConversionSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        try:
+            order = convert_lead(lead.pk, user=request.user, **params.validated_data)
+        except DjangoValidationError as exc:
+            raise ValidationError({'lead': exc.messages})
+        schedule_documents([order.pk])
+        return Response(
+            {'success': True, 'data': OrderSerializer(order, context=self.get_serializer_context()).data},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=['get'], url_path='analytics/funnel')
+    def funnel(self, request):
+        """
+        Funnel counts, conversion rates and time in stage from the daily
+        rollups. Query params: start/end (YYYY-MM-DD, default the last year),
+        group_by (country, product_type, assigned_to or period), period
+        (day, week, month or year), and country/product_type/assigned_to filters.
+        Sellers only see their own leads.
+        """
+        user = request.user
+        role = getattr(user, 'role', '').upper()
+        if role not in ('ADMIN', 'SELLER'):
+            raise PermissionDenied('Only admin or seller users can view lead analytics')
+
+        params = request.query_params
+        end = self._parse_date(params, 'end') or timezone.localdate()
+        start = self._parse_date(params, 'start') or end - timedelta(days=365)
+        group_by = params.get('group_by') or None
+        period = params.get('period', 'month')
+        if group_by and group_by not in analytics.GROUP_FIELDS:
+            raise ValidationError({'group_by': f'Use one of: {", ".join(analytics.GROUP_FIELDS)}.'})
+        if period not in analytics.PERIODS:
+            raise ValidationError({'period': f'Use one of: {", ".join(analytics.PERIODS)}.'})
+
+        rollups = LeadFunnelDaily.objects.filter(date__gte=start, date__lte=end)
+        if role == 'SELLER':
+            rollups = rollups.filter(assigned_to=user)
+        elif params.get('assigned_to'):
+            try:
+                assigned_to = int(params['assigned_to'])
+            except ValueError:
+                raise ValidationError({'assigned_to': 'Use a user id.'})
+            rollups = rollups.filter(assigned_to_id=assigned_to)
+        for field in ('country', 'product_type'):
+            if params.get(field):
+                rollups = rollups.filter(**{field: params[field]})
+
+        report = analytics.funnel_report(rollups, group_by=group_by, period=period)
+        return Response({'success': True, 'start': start, 'end': end, **report})
+
+    @staticmethod
+    def _parse_date(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Use the YYYY-MM-DD format.'})
+        return parsed
+
     @action(detail=False, methods=['get'], url_path='my-leads')
     def my_leads(self, request):
         """Get leads for current BUYER user"""
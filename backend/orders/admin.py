@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Order, OrderProduct
+from .invoices import schedule_documents
+from .models import Order, OrderEvent, OrderProduct, OrderRevenueMonthly, OrderStatusCount
 
 
 class OrderProductInline(admin.TabularInline):
@@ -8,17 +9,29 @@ class OrderProductInline(admin.TabularInline):
     readonly_fields = ['total_price']
 
 
+class OrderEventInline(admin.TabularInline):
+    model = OrderEvent
+    extra = 0
+    fields = ['created_at', 'from_status', 'to_status', 'user', 'note']
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['pi_number', 'buyer_name', 'total_amount', 'status', 'pi_date']
     list_filter = ['status', 'commercial_term', 'pi_date']
     search_fields = ['pi_number', 'buyer_name', 'buyer_email']
-    readonly_fields = ['pi_number', 'pi_date', 'created_at', 'updated_at']
-    inlines = [OrderProductInline]
+    readonly_fields = ['pi_number', 'pi_date', 'status_changed_at', 'created_at', 'updated_at']
+    inlines = [OrderProductInline, OrderEventInline]
+    actions = ['render_proforma_invoices']
     
     fieldsets = (
         ('order Information', {
-            'fields': ('lead', 'pi_number', 'status')
+            'fields': ('lead', 'pi_number', 'status', 'status_changed_at')
         }),
         ('Buyer Details', {
             'fields': ('buyer_name', 'buyer_company', 'buyer_address', 'buyer_email', 'buyer_phone')
@@ -34,3 +47,59 @@ class OrderAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+    def save_model(self, request, obj, form, change):
+        obj._status_user = request.user
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Render proforma invoice PDFs')
+    def render_proforma_invoices(self, request, queryset):
+        order_ids = list(queryset.values_list('pk', flat=True))
+        schedule_documents(order_ids)
+        self.message_user(request, f'Queued {len(order_ids)} proforma invoices for rendering.')
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ['order', 'from_status', 'to_status', 'user', 'created_at']
+    list_filter = ['to_status', 'created_at']
+    search_fields = ['order__pi_number', 'note']
+    readonly_fields = ['order', 'from_status', 'to_status', 'note', 'user', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OrderStatusCount)
+class OrderStatusCountAdmin(admin.ModelAdmin):
+    list_display = ['status', 'current', 'reached', 'exited']
+    readonly_fields = ['status', 'current', 'reached', 'seconds_from_pi', 'exited', 'seconds_in_status']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OrderRevenueMonthly)
+class OrderRevenueMonthlyAdmin(admin.ModelAdmin):
+    list_display = ['month', 'currency', 'commercial_term', 'buyer_company', 'status', 'orders', 'amount', 'amount_base']
+    list_filter = ['currency', 'commercial_term', 'status', 'month']
+    search_fields = ['buyer_company']
+    readonly_fields = [
+        'month', 'currency', 'commercial_term', 'buyer_company', 'status',
+        'orders', 'pieces', 'amount', 'amount_base', 'unconverted',
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
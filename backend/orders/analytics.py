@@ -0,0 +1,206 @@
+"""
+Order revenue analytics.
+
+``OrderRevenueMonthly`` holds, per PI month, the order count, pieces and
+amounts of every currency / commercial term / buyer company / status
+combination. Whenever orders change, the months they belong to are queued
+and recomputed from the orders table once the transaction commits (one
+GROUP BY over the month, using the pi_date index). Month granularity means
+the rollups stay exact even for writes that bypass Order.save, such as
+total refreshes, bulk status moves and currency normalization, as long as
+those writes report the orders they touched. Reports only sum rollup rows.
+``rebuild_revenue`` regenerates everything.
+"""
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+
+from .models import Order, OrderProduct, OrderRevenueMonthly
+
+GROUP_FIELDS = ('period', 'currency', 'commercial_term', 'buyer_company', 'status')
+BUCKET_FIELDS = ('currency', 'commercial_term', 'buyer_company', 'status')
+PERIODS = ('month', 'quarter', 'year')
+
+CENTS = Decimal('0.01')
+
+_pending = threading.local()
+
+
+def month_of(moment):
+    """First day of the (local) month of a datetime or date."""
+    if isinstance(moment, datetime):
+        moment = timezone.localtime(moment) if timezone.is_aware(moment) else moment
+    return date(moment.year, moment.month, 1)
+
+
+def _month_range(month):
+    following = (month + timedelta(days=32)).replace(day=1)
+    return (
+        timezone.make_aware(datetime.combine(month, time.min)),
+        timezone.make_aware(datetime.combine(following, time.min)),
+    )
+
+
+def _month_buckets(month):
+    start, end = _month_range(month)
+    pieces = (
+        OrderProduct.objects
+        .filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    rows = (
+        Order.objects
+        .filter(pi_date__gte=start, pi_date__lt=end)
+        .order_by()
+        .annotate(line_pieces=Coalesce(Subquery(pieces, output_field=IntegerField()), Value(0)))
+        .values(*BUCKET_FIELDS)
+        .annotate(
+            order_count=Count('pk'),
+            piece_count=Sum('line_pieces'),
+            amount_total=Sum('total_amount'),
+            amount_base_total=Sum('total_amount_base'),
+            unconverted_count=Count('pk', filter=Q(total_amount_base__isnull=True)),
+        )
+    )
+    return [
+        OrderRevenueMonthly(
+            month=month,
+            **{field: row[field] for field in BUCKET_FIELDS},
+            orders=row['order_count'],
+            pieces=row['piece_count'] or 0,
+            amount=row['amount_total'] or Decimal('0'),
+            amount_base=row['amount_base_total'] or Decimal('0'),
+            unconverted=row['unconverted_count'],
+        )
+        for row in rows
+    ]
+
+
+def refresh_months(months):
+    """Recompute the rollup rows of the given months from the orders."""
+    months = sorted(set(months))
+    if not months:
+        return 0
+    rows = []
+    with transaction.atomic():
+        for month in months:
+            rows.extend(_month_buckets(month))
+        OrderRevenueMonthly.objects.filter(month__in=months).delete()
+        OrderRevenueMonthly.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _flush():
+    months = getattr(_pending, 'months', None)
+    _pending.months = set()
+    if months:
+        refresh_months(months)
+
+
+def refresh_later(months):
+    """
+    Recompute ``months`` once the current transaction commits (immediately
+    outside a transaction). Months queued by several writes in the same
+    transaction are recomputed once.
+    """
+    months = {month for month in months if month}
+    if not months:
+        return
+    pending = getattr(_pending, 'months', None)
+    if pending is None:
+        pending = _pending.months = set()
+    pending.update(months)
+    transaction.on_commit(_flush)
+
+
+def orders_changed(order_ids):
+    """Queue the months of orders changed with QuerySet.update()."""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    pi_dates = Order.objects.filter(pk__in=order_ids).order_by().values_list('pi_date', flat=True).distinct()
+    refresh_later(month_of(pi_date) for pi_date in pi_dates)
+
+
+def refresh_since(since):
+    """Recompute every month from the month of ``since`` up to the last order."""
+    start, _ = _month_range(month_of(since))
+    pi_dates = Order.objects.filter(pi_date__gte=start).values_list('pi_date', flat=True)
+    return refresh_months({month_of(pi_date) for pi_date in pi_dates.iterator(chunk_size=2000)})
+
+
+def rebuild_revenue():
+    """Regenerate all rollups."""
+    months = {month_of(pi_date) for pi_date in Order.objects.values_list('pi_date', flat=True).iterator(chunk_size=2000)}
+    with transaction.atomic():
+        OrderRevenueMonthly.objects.exclude(month__in=months).delete()
+        return refresh_months(months)
+
+
+def revenue_report(rollups, group_by='period', period='month'):
+    """
+    Sum rollup rows per ``group_by`` (one of GROUP_FIELDS; ``period`` groups
+    by month, quarter or year). Each group reports the order count, pieces,
+    the total in the base currency and the totals per order currency.
+    """
+    if group_by == 'period':
+        rollups = rollups.annotate(period=Trunc('month', period))
+    rows = (
+        rollups
+        .order_by()
+        .values(group_by, 'currency')
+        .annotate(
+            order_total=Sum('orders'),
+            piece_total=Sum('pieces'),
+            amount_total=Sum('amount'),
+            amount_base_total=Sum('amount_base'),
+            unconverted_total=Sum('unconverted'),
+        )
+    )
+
+    groups = defaultdict(lambda: {
+        'orders': 0, 'pieces': 0, 'amount_base': Decimal('0'), 'unconverted': 0, 'amounts': {},
+    })
+    for row in rows:
+        group = groups[row[group_by]]
+        group['orders'] += row['order_total']
+        group['pieces'] += row['piece_total']
+        group['amount_base'] += row['amount_base_total']
+        group['unconverted'] += row['unconverted_total']
+        group['amounts'][row['currency']] = row['amount_total']
+
+    totals = {
+        'orders': sum(group['orders'] for group in groups.values()),
+        'pieces': sum(group['pieces'] for group in groups.values()),
+        'amount_base': sum((group['amount_base'] for group in groups.values()), Decimal('0')),
+        'unconverted': sum(group['unconverted'] for group in groups.values()),
+    }
+    ordered = sorted(groups.items(), key=lambda item: str(item[0]))
+    if group_by != 'period':
+        # Largest first, except for the time axis
+        ordered.sort(key=lambda item: item[1]['amount_base'], reverse=True)
+    return {
+        'totals': _money(totals),
+        'groups': [{group_by: key, **_money(values)} for key, values in ordered],
+    }
+
+
+def _money(values):
+    # Amounts as strings, the way the serializers render DecimalFields
+    values = dict(values, amount_base=_cents(values['amount_base']))
+    if 'amounts' in values:
+        values['amounts'] = {currency: _cents(amount) for currency, amount in sorted(values['amounts'].items())}
+    return values
+
+
+def _cents(amount):
+    return str(Decimal(amount or 0).quantize(CENTS))
@@ -0,0 +1,132 @@
+"""
+Lead to order conversion.
+
+``convert_lead`` turns a lead and its costings into an order in one
+transaction: the buyer details come from the lead (and the buyer's account),
+unit prices from the costings' EXW prices unless overridden, the order total
+is computed up front so the lines need no refresh pass, the lines and their
+sizes are inserted with bulk_create, and the lead moves to ORDER_CONFIRMED
+with its history recorded. The number of queries does not depend on the
+number of lines.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from costings.models import Costing
+from leads.models import Lead
+
+from .models import Order, OrderLineSize, OrderProduct
+from .sizes import SizeBreakdownError, check_size_breakdown, format_size_breakdown
+
+CONVERTIBLE_STATUSES = ('NEW', 'QUALIFIED', 'SCOPE_LOCKED', 'PI_SENT')
+ORDER_FIELDS = ('commercial_term', 'payment_terms', 'bank_details', 'buyer_company', 'buyer_address')
+
+
+def attach_prefetched(instance, name, objects):
+    """
+    Make ``instance.<name>.all()`` return ``objects`` without a query, the way
+    prefetch_related() caches a relation (a queryset with its results filled in).
+    """
+    cache = instance.__dict__.setdefault('_prefetched_objects_cache', {})
+    cache.pop(name, None)
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    cache[name] = queryset
+    return queryset
+
+
+def _lines(lead, costings, items):
+    """(costing, quantity, unit_price, sizes) for every requested line."""
+    if not items:
+        if len(costings) != 1 or not lead.quantity:
+            raise ValidationError(
+                'Give the lines to order: the lead needs exactly one costing and a quantity to convert without them.'
+            )
+        items = [{'costing': next(iter(costings)), 'quantity': lead.quantity}]
+
+    lines = []
+    for index, item in enumerate(items):
+        costing = costings.get(item['costing'])
+        if costing is None:
+            raise ValidationError(f'Line {index + 1}: costing {item["costing"]} is not linked to this lead.')
+        unit_price = item.get('unit_price')
+        if unit_price is None:
+            unit_price = costing.exw_price
+        if unit_price is None:
+            raise ValidationError(f'Line {index + 1}: costing {costing.pk} has no price.')
+        try:
+            sizes = check_size_breakdown(item.get('size_breakdown', ''), item['quantity'])
+        except SizeBreakdownError as exc:
+            raise ValidationError(f'Line {index + 1}: {exc}')
+        lines.append((costing, item['quantity'], unit_price, sizes))
+    return lines
+
+
+def convert_lead(lead_id, items=None, user=None, **order_fields):
+    """
+    Create an order from a lead. ``items`` are dicts with ``costing`` (id of
+    one of the lead's costings), ``quantity`` and optionally ``unit_price``
+    and ``size_breakdown``; without items the lead's only costing is ordered
+    in the lead's quantity. ``order_fields`` may set ORDER_FIELDS. Raises
+    ValidationError if the lead cannot be converted. Returns the order with
+    its lines (and their sizes) already attached.
+    """
+    unknown = set(order_fields) - set(ORDER_FIELDS)
+    if unknown:
+        raise TypeError(f'Unexpected order fields: {", ".join(sorted(unknown))}')
+
+    with transaction.atomic():
+        lead = Lead.objects.select_for_update().select_related('user').get(pk=lead_id)
+        if lead.status not in CONVERTIBLE_STATUSES:
+            raise ValidationError(f'A lead in status {lead.get_status_display()} cannot be converted to an order.')
+        costings = {costing.pk: costing for costing in Costing.objects.filter(lead=lead).order_by('pk')}
+        lines = _lines(lead, costings, items)
+        currencies = {costing.currency.upper() for costing, _, _, _ in lines}
+        if len(currencies) > 1:
+            raise ValidationError(f'The costings are in different currencies ({", ".join(sorted(currencies))}).')
+
+        products = [
+            OrderProduct(
+                style_name=costing.style_name,
+                style_number=costing.style_number,
+                quantity=quantity,
+                unit_price=unit_price,
+                total_price=OrderProduct.line_total(quantity, unit_price),
+                size_breakdown=format_size_breakdown(sizes),
+            )
+            for costing, quantity, unit_price, sizes in lines
+        ]
+        order = Order(
+            lead=lead,
+            buyer_name=lead.name,
+            buyer_email=lead.email,
+            buyer_phone=lead.phone,
+            buyer_company=lead.user.company if lead.user else '',
+            total_amount=sum(product.total_price for product in products),
+            currency=currencies.pop(),
+            **{name: value for name, value in order_fields.items() if value is not None},
+        )
+        order._status_user = user
+        order.save()
+
+        for product in products:
+            product.order = order
+        OrderProduct.objects.bulk_create(products)
+        sizes = []
+        for product, (_, _, _, line_sizes) in zip(products, lines):
+            sizes.extend(attach_prefetched(product, 'sizes', [
+                OrderLineSize(line=product, order=order, size=size, quantity=quantity, position=position)
+                for position, (size, quantity) in enumerate(line_sizes)
+            ]))
+        if sizes:
+            OrderLineSize.objects.bulk_create(sizes)
+
+        lead.status = 'ORDER_CONFIRMED'
+        lead.save(update_fields=['status', 'updated_at'])
+        lead.record_history(user=user, actions=[f'Converted to order {order.pi_number}'])
+
+    attach_prefetched(order, 'products', products)
+    order.line_count = len(products)
+    order.total_quantity = sum(product.quantity for product in products)
+    return order
@@ -0,0 +1,210 @@
+"""
+Proforma and commercial invoice PDFs.
+
+Documents are rendered from ``orders/invoice.html`` with WeasyPrint in a
+bounded thread pool (ORDER_DOCUMENT_WORKERS), never in the request: the API
+queues a render once the transaction commits and reports the document as
+pending until it is stored. Each PDF is saved under a fingerprint of
+everything it shows (the order's printed fields, its lines and the
+template), which is also recorded on the order, so a document whose data
+has not changed is served from storage without rendering again and a
+changed order gets a new file URL. ``render_batch`` renders many documents
+at once and reports how long each one took.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.template.loader import get_template, render_to_string
+
+from .models import Order, OrderProduct
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE = 'orders/invoice.html'
+
+DocumentKind = namedtuple('DocumentKind', ['title', 'file_field', 'fingerprint_field'])
+
+DOCUMENT_KINDS = {
+    'pi': DocumentKind('Proforma Invoice', 'pi_url', 'pi_fingerprint'),
+    'invoice': DocumentKind('Commercial Invoice', 'invoice_url', 'invoice_fingerprint'),
+}
+
+# Everything the template prints; a change to any of these re-renders.
+ORDER_FIELDS = (
+    'pi_number', 'buyer_name', 'buyer_company', 'buyer_address', 'buyer_email', 'buyer_phone',
+    'commercial_term', 'payment_terms', 'bank_details', 'total_amount', 'currency', 'pi_date',
+)
+LINE_FIELDS = ('style_name', 'style_number', 'size_breakdown', 'quantity', 'unit_price', 'total_price')
+
+RenderResult = namedtuple('RenderResult', ['order_id', 'kind', 'path', 'cached', 'seconds', 'error'])
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ORDER_DOCUMENT_WORKERS', 2),
+    thread_name_prefix='order-document',
+)
+# Documents queued on the shared pool and not started yet
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _template_digest():
+    return hashlib.sha256(get_template(TEMPLATE).template.source.encode()).hexdigest()
+
+
+def fingerprint(kind, order, lines):
+    """Content hash of what the ``kind`` document of ``order`` shows."""
+    payload = [
+        kind,
+        _template_digest(),
+        [str(getattr(order, field)) for field in ORDER_FIELDS],
+        [[str(getattr(line, field)) for field in LINE_FIELDS] for line in sorted(lines, key=lambda line: line.pk)],
+    ]
+    return hashlib.sha256(json.dumps(payload, separators=(',', ':')).encode()).hexdigest()[:16]
+
+
+def document_path(order, kind, fingerprint):
+    directory = Order._meta.get_field(DOCUMENT_KINDS[kind].file_field).upload_to
+    return f'{directory}{order.pi_number}-{fingerprint}.pdf'
+
+
+def document_status(order, kind='pi'):
+    """
+    ``{'status': 'ready', 'url': ...}`` if the stored document matches the
+    order's current data, else ``{'status': 'pending', 'url': None}``.
+    Uses prefetched ``products`` when available.
+    """
+    spec = DOCUMENT_KINDS[kind]
+    stored = getattr(order, spec.file_field)
+    if stored and getattr(order, spec.fingerprint_field) == fingerprint(kind, order, order.products.all()):
+        return {'status': 'ready', 'url': stored.url}
+    return {'status': 'pending', 'url': None}
+
+
+def _load(order_id, kind, lock=False):
+    spec = DOCUMENT_KINDS[kind]
+    orders = Order.objects.only(*ORDER_FIELDS, spec.file_field, spec.fingerprint_field)
+    if lock:
+        orders = orders.select_for_update()
+    order = orders.get(pk=order_id)
+    lines = list(OrderProduct.objects.filter(order_id=order_id).only('order', *LINE_FIELDS).order_by('pk'))
+    return order, lines
+
+
+def render_pdf(html):
+    # Imported here: loading WeasyPrint (Pango, fontconfig) is slow and only
+    # the render workers need it.
+    from weasyprint import HTML
+
+    return HTML(string=html, base_url=str(settings.MEDIA_ROOT)).write_pdf()
+
+
+def render_document(order_id, kind='pi', force=False):
+    """
+    Render and store one document unless the stored one is still current.
+    Returns a RenderResult; ``path`` is None if the order changed while it
+    was being rendered (the next request for it queues a new render).
+    """
+    start = time.perf_counter()
+    spec = DOCUMENT_KINDS[kind]
+    order, lines = _load(order_id, kind)
+    current = fingerprint(kind, order, lines)
+    stored = getattr(order, spec.file_field)
+    if (
+        not force and stored and getattr(order, spec.fingerprint_field) == current
+        and default_storage.exists(stored.name)
+    ):
+        return RenderResult(order_id, kind, stored.name, True, time.perf_counter() - start, None)
+
+    html = render_to_string(TEMPLATE, {
+        'title': spec.title,
+        'order': order,
+        'lines': lines,
+        'total_quantity': sum(line.quantity for line in lines),
+    })
+    pdf = render_pdf(html)
+    path = document_path(order, kind, current)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    path = default_storage.save(path, ContentFile(pdf))
+
+    # Only publish the file if the order still shows the same data.
+    with transaction.atomic():
+        locked, locked_lines = _load(order_id, kind, lock=True)
+        if fingerprint(kind, locked, locked_lines) != current:
+            default_storage.delete(path)
+            return RenderResult(order_id, kind, None, False, time.perf_counter() - start, 'Order changed while rendering')
+        Order.objects.filter(pk=order_id).update(**{spec.file_field: path, spec.fingerprint_field: current})
+    if stored and stored.name != path:
+        default_storage.delete(stored.name)
+    return RenderResult(order_id, kind, path, False, time.perf_counter() - start, None)
+
+
+def _render_in_background(order_id, kind, force):
+    with _queued_lock:
+        _queued.discard((order_id, kind, force))
+    close_old_connections()
+    try:
+        result = render_document(order_id, kind, force)
+        if not result.cached:
+            logger.info('Rendered %s of order %s in %.2fs', kind, order_id, result.seconds)
+    except Order.DoesNotExist:
+        pass
+    except Exception:
+        logger.exception('Failed to render %s of order %s', kind, order_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_documents(order_ids, kinds=('pi',), force=False):
+    """Queue renders once the current transaction commits; queued documents are not queued twice."""
+    order_ids = list(order_ids)
+
+    def submit():
+        for order_id in order_ids:
+            for kind in kinds:
+                with _queued_lock:
+                    if (order_id, kind, force) in _queued:
+                        continue
+                    _queued.add((order_id, kind, force))
+                _executor.submit(_render_in_background, order_id, kind, force)
+
+    transaction.on_commit(submit)
+
+
+def _render_timed(order_id, kind, force):
+    start = time.perf_counter()
+    try:
+        return render_document(order_id, kind, force)
+    except Exception as exc:
+        logger.exception('Failed to render %s of order %s', kind, order_id)
+        return RenderResult(order_id, kind, None, False, time.perf_counter() - start, str(exc) or type(exc).__name__)
+    finally:
+        close_old_connections()
+
+
+def render_batch(order_ids, kinds=('pi',), force=False, workers=None):
+    """
+    Render the documents of many orders with a pool of ``workers`` threads
+    (default ORDER_DOCUMENT_WORKERS), yielding a RenderResult for each as
+    it completes. Unchanged documents are skipped unless ``force``.
+    """
+    workers = workers or getattr(settings, 'ORDER_DOCUMENT_WORKERS', 2)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='order-document-batch') as pool:
+        futures = [
+            pool.submit(_render_timed, order_id, kind, force)
+            for order_id in order_ids
+            for kind in kinds
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,244 @@
+"""
+Order lifecycle.
+
+Orders move between statuses along Order.STATUS_TRANSITIONS; ``Order.save``
+rejects any other change and stamps ``status_changed_at`` and the matching
+timeline date. Every transition (and each order's creation) is appended to
+``OrderEvent`` and folded into the per-status ``OrderStatusCount`` counters
+by the signals in orders/signals.py, or directly by ``transition_many`` for
+bulk moves, so "orders in production now" or "average days from PI to
+shipment" are read from a handful of counter rows instead of scanning
+orders. ``rebuild_status_counts`` regenerates the counters from the log.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import analytics
+from .models import Order, OrderEvent, OrderStatusCount
+
+COUNTER_FIELDS = ('current', 'reached', 'seconds_from_pi', 'exited', 'seconds_in_status')
+
+
+def _seconds(start, end):
+    if not start or not end:
+        return 0
+    return max(int((end - start).total_seconds()), 0)
+
+
+class StatusDeltas:
+    """Accumulates counter increments and writes them with one UPDATE per status."""
+
+    def __init__(self):
+        self.statuses = defaultdict(lambda: [0] * len(COUNTER_FIELDS))
+
+    def enter(self, status, pi_date, when):
+        counters = self.statuses[status]
+        counters[0] += 1
+        counters[1] += 1
+        counters[2] += _seconds(pi_date, when)
+
+    def exit(self, status, since, when):
+        counters = self.statuses[status]
+        counters[0] -= 1
+        counters[3] += 1
+        counters[4] += _seconds(since, when)
+
+    def save(self):
+        if not self.statuses:
+            return
+        # Counters and events are written inside the save or transition that
+        # caused them; a savepoint of their own would only add round trips.
+        with transaction.atomic(savepoint=False):
+            for status, counters in self.statuses.items():
+                changes = {name: F(name) + value for name, value in zip(COUNTER_FIELDS, counters)}
+                if not OrderStatusCount.objects.filter(status=status).update(**changes):
+                    OrderStatusCount.objects.bulk_create([OrderStatusCount(status=status)], ignore_conflicts=True)
+                    OrderStatusCount.objects.filter(status=status).update(**changes)
+        self.statuses.clear()
+
+
+def record_created(orders, user=None):
+    """Log the creation of new orders and count them in their initial status."""
+    deltas = StatusDeltas()
+    events = []
+    for order in orders:
+        events.append(OrderEvent(order=order, to_status=order.status, user=user, created_at=order.status_changed_at))
+        deltas.enter(order.status, order.pi_date, order.status_changed_at)
+    with transaction.atomic(savepoint=False):
+        OrderEvent.objects.bulk_create(events)
+        deltas.save()
+
+
+def record_transition(order, previous_status, since, user=None, note=''):
+    """Log ``order`` leaving ``previous_status`` (entered at ``since``) for its current status."""
+    when = order.status_changed_at
+    deltas = StatusDeltas()
+    deltas.exit(previous_status, since, when)
+    deltas.enter(order.status, order.pi_date, when)
+    with transaction.atomic(savepoint=False):
+        OrderEvent.objects.create(
+            order=order, from_status=previous_status, to_status=order.status,
+            user=user, note=note, created_at=when,
+        )
+        deltas.save()
+
+
+def record_deleted(order):
+    """
+    Take a deleted order and its logged history out of the counters (before
+    its events are deleted). The status is read from the row, as the instance
+    being deleted may be stale.
+    """
+    counters = tally(
+        Order.objects.filter(pk=order.pk).values_list('pk', 'status', 'pi_date'),
+        OrderEvent.objects.filter(order_id=order.pk).order_by('created_at', 'pk')
+        .values_list('order_id', 'from_status', 'to_status', 'created_at'),
+    )
+    deltas = StatusDeltas()
+    for status, values in counters.items():
+        deltas.statuses[status] = [-values[name] for name in COUNTER_FIELDS]
+    deltas.save()
+
+
+def transition(order, to_status, user=None, note=''):
+    """
+    Move one order to ``to_status``; raises ValidationError if not allowed.
+    The order is re-read under a row lock and the transition checked against
+    that status, so concurrent moves of the same order are serialized.
+    Returns the updated order.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        order.status = to_status
+        order._status_user = user
+        order._status_note = note
+        order.save()
+    return order
+
+
+def transition_many(orders, to_status, user=None, note='', batch_size=500):
+    """
+    Move every order of a queryset to ``to_status`` with one UPDATE per batch,
+    logging the events and adjusting the counters in the same transaction.
+    Nothing is changed if any of the orders cannot make the transition.
+    Returns the number of orders moved.
+    """
+    with transaction.atomic():
+        rows = list(
+            orders.select_for_update().order_by('pk')
+            .values_list('pk', 'status', 'status_changed_at', 'pi_date')
+        )
+        invalid = [pk for pk, status, _, _ in rows if not Order.can_transition(status, to_status)]
+        if invalid:
+            shown = ', '.join(map(str, invalid[:20])) + (', ...' if len(invalid) > 20 else '')
+            raise ValidationError(f'Orders {shown} cannot move to {dict(Order.STATUS_CHOICES).get(to_status, to_status)}.')
+
+        now = timezone.now()
+        changes = {'status': to_status, 'status_changed_at': now, 'updated_at': now}
+        date_field = Order.STATUS_DATE_FIELDS.get(to_status)
+        if date_field:
+            changes[date_field] = Coalesce(F(date_field), Value(now))
+        for start in range(0, len(rows), batch_size):
+            Order.objects.filter(pk__in=[row[0] for row in rows[start:start + batch_size]]).update(**changes)
+
+        deltas = StatusDeltas()
+        events = []
+        for pk, status, since, pi_date in rows:
+            events.append(OrderEvent(
+                order_id=pk, from_status=status, to_status=to_status,
+                user=user, note=note, created_at=now,
+            ))
+            deltas.exit(status, since, now)
+            deltas.enter(to_status, pi_date, now)
+        OrderEvent.objects.bulk_create(events, batch_size=batch_size)
+        deltas.save()
+        analytics.refresh_later(analytics.month_of(pi_date) for _, _, _, pi_date in rows)
+    return len(rows)
+
+
+def history_from_dates(status, pi_date, updated_at, dates):
+    """
+    Best-effort (from_status, to_status, at) history of an order that
+    predates the event log, from its timeline dates: the statuses on the way
+    to its current one, dated by their timeline field when set.
+    """
+    if status == 'CANCELLED':
+        return [('', 'PI_GENERATED', pi_date), ('PI_GENERATED', 'CANCELLED', updated_at or pi_date)]
+    path, current = ['PI_GENERATED'], 'PI_GENERATED'
+    while current != status:
+        forward = [s for s in Order.STATUS_TRANSITIONS.get(current, ()) if s != 'CANCELLED']
+        if not forward:
+            return [('', status, pi_date)]
+        current = forward[0]
+        path.append(current)
+    history, previous, at = [], '', pi_date
+    for step in path:
+        if previous:
+            stamped = dates.get(Order.STATUS_DATE_FIELDS.get(step))
+            at = max(stamped or (updated_at if step == status else at), at)
+        history.append((previous, step, at))
+        previous = step
+    return history
+
+
+def tally(orders, events):
+    """
+    Counter values per status from ``orders`` ((pk, status, pi_date) rows) and
+    ``events`` ((order_id, from_status, to_status, created_at) rows ordered by
+    order and time).
+    """
+    counters = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    pi_dates = {}
+    for pk, status, pi_date in orders:
+        counters[status]['current'] += 1
+        pi_dates[pk] = pi_date
+    last_order, entered_at = None, None
+    for order_id, from_status, to_status, created_at in events:
+        if order_id != last_order:
+            last_order, entered_at = order_id, None
+        if from_status:
+            counters[from_status]['exited'] += 1
+            counters[from_status]['seconds_in_status'] += _seconds(entered_at, created_at)
+        counters[to_status]['reached'] += 1
+        counters[to_status]['seconds_from_pi'] += _seconds(pi_dates.get(order_id), created_at)
+        entered_at = created_at
+    return counters
+
+
+def rebuild_status_counts(chunk_size=2000):
+    """Regenerate OrderStatusCount from the orders and their event log."""
+    counters = tally(
+        Order.objects.order_by().values_list('pk', 'status', 'pi_date').iterator(chunk_size=chunk_size),
+        OrderEvent.objects.order_by('order_id', 'created_at', 'pk')
+        .values_list('order_id', 'from_status', 'to_status', 'created_at')
+        .iterator(chunk_size=chunk_size),
+    )
+    with transaction.atomic():
+        OrderStatusCount.objects.all().delete()
+        OrderStatusCount.objects.bulk_create([
+            OrderStatusCount(status=status, **counters.get(status, {}))
+            for status, _ in Order.STATUS_CHOICES
+        ])
+    return counters
+
+
+def status_summary():
+    """Current count and average lead times of every status, from the counters."""
+    rows = {row.status: row for row in OrderStatusCount.objects.all()}
+    summary = []
+    for status, label in Order.STATUS_CHOICES:
+        row = rows.get(status) or OrderStatusCount(status=status)
+        summary.append({
+            'status': status,
+            'label': label,
+            'orders': row.current,
+            'reached': row.reached,
+            'avg_days_from_pi': round(row.seconds_from_pi / row.reached / 86400, 2) if row.reached else None,
+            'avg_days_in_status': round(row.seconds_in_status / row.exited / 86400, 2) if row.exited else None,
+        })
+    return summary
@@ -0,0 +1,32 @@
+"""
+Django management command to re-parse order line size breakdowns
+Usage: python manage.py rebuild_order_line_sizes [--order ID ...]
+
+Size rows are written whenever a line is saved; run this after bulk edits
+that bypass OrderProduct.save() or the orders API. Lines whose breakdown
+cannot be parsed, or does not add up to the line quantity, keep their text
+but get no size rows; they are listed so they can be corrected.
+"""
+from django.core.management.base import BaseCommand
+
+from orders.models import OrderProduct
+from orders.sizes import rebuild_sizes
+
+
+class Command(BaseCommand):
+    help = 'Regenerates OrderLineSize rows from OrderProduct.size_breakdown'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', type=int, action='append', dest='orders')
+
+    def handle(self, *args, **options):
+        lines = OrderProduct.objects.all()
+        if options['orders']:
+            lines = lines.filter(order_id__in=options['orders'])
+        processed, unparseable = rebuild_sizes(lines)
+        self.stdout.write(self.style.SUCCESS(f'Parsed size breakdowns of {processed} order lines'))
+        if unparseable:
+            more = ', ...' if len(unparseable) > 20 else ''
+            self.stdout.write(self.style.WARNING(
+                f'{len(unparseable)} lines have breakdowns that cannot be read or do not add up to their quantity: {", ".join(map(str, unparseable[:20]))}{more}'
+            ))
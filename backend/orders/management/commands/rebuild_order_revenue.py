@@ -0,0 +1,18 @@
+"""
+Django management command to rebuild the order revenue rollups
+Usage: python manage.py rebuild_order_revenue
+
+Rollups are refreshed per month as orders change; run this once after
+upgrading and after raw SQL edits to orders or their lines.
+"""
+from django.core.management.base import BaseCommand
+
+from orders.analytics import rebuild_revenue
+
+
+class Command(BaseCommand):
+    help = 'Regenerates OrderRevenueMonthly rollups from orders and their lines'
+
+    def handle(self, *args, **options):
+        buckets = rebuild_revenue()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} order revenue rollup rows'))
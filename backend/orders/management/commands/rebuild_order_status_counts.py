@@ -0,0 +1,19 @@
+"""
+Django management command to rebuild the order status counters
+Usage: python manage.py rebuild_order_status_counts
+
+Counters are maintained incrementally from the order event log; run this
+after bulk edits that bypass Order.save() and orders/lifecycle.py.
+"""
+from django.core.management.base import BaseCommand
+
+from orders.lifecycle import rebuild_status_counts
+
+
+class Command(BaseCommand):
+    help = 'Regenerates OrderStatusCount from orders and their status events'
+
+    def handle(self, *args, **options):
+        counters = rebuild_status_counts()
+        total = sum(values['current'] for values in counters.values())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt status counters for {total} orders'))
@@ -0,0 +1,52 @@
+"""
+Django management command to render proforma / commercial invoice PDFs
+Usage: python manage.py render_order_documents [--kind pi|invoice] [--status PI_GENERATED] [--id ID ...] [--force] [--workers N]
+
+Documents whose order data has not changed since they were last rendered
+are skipped unless --force is given. Prints the render time of every
+document and a summary.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.invoices import DOCUMENT_KINDS, render_batch
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Renders order PDFs (PI / commercial invoice) in a worker pool, skipping unchanged ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', choices=sorted(DOCUMENT_KINDS))
+        parser.add_argument('--status')
+        parser.add_argument('--id', type=int, action='append', dest='ids')
+        parser.add_argument('--force', action='store_true', help='Render even if the stored PDF is current')
+        parser.add_argument('--workers', type=int)
+
+    def handle(self, *args, **options):
+        orders = Order.objects.order_by('pk')
+        if options['status']:
+            orders = orders.filter(status=options['status'].upper())
+        if options['ids']:
+            orders = orders.filter(pk__in=options['ids'])
+        order_ids = list(orders.values_list('pk', flat=True))
+        kinds = options['kinds'] or ['pi']
+
+        start = time.perf_counter()
+        rendered, cached, failed = [], 0, 0
+        for result in render_batch(order_ids, kinds, force=options['force'], workers=options['workers']):
+            if result.error:
+                failed += 1
+                self.stderr.write(f'Order {result.order_id} {result.kind}: {result.error}')
+            elif result.cached:
+                cached += 1
+            else:
+                rendered.append(result.seconds)
+                self.stdout.write(f'Order {result.order_id} {result.kind}: {result.seconds:.2f}s -> {result.path}')
+        elapsed = time.perf_counter() - start
+
+        summary = f'Rendered {len(rendered)}, unchanged {cached}, failed {failed} in {elapsed:.1f}s'
+        if rendered:
+            summary += f' (per document: mean {sum(rendered) / len(rendered):.2f}s, max {max(rendered):.2f}s)'
+        self.stdout.write(self.style.SUCCESS(summary) if not failed else self.style.WARNING(summary))
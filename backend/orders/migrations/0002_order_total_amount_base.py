@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_base_currency_amounts(apps, schema_editor):
+    # Other currencies need exchange rates: run load_fx_rates afterwards
+    Order = apps.get_model('orders', 'Order')
+    base = getattr(settings, 'BASE_CURRENCY', 'USD')
+    Order.objects.filter(currency__iexact=base).update(total_amount_base=F('total_amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_amount_base',
+            field=models.DecimalField(decimal_places=2, editable=False, help_text='Total amount in the base currency (see fx/rates.py)', max_digits=14, null=True),
+        ),
+        migrations.RunPython(copy_base_currency_amounts, migrations.RunPython.noop),
+    ]
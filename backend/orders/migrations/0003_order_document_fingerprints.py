@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_total_amount_base'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='invoice_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Content hash of the order data the commercial invoice PDF was rendered from', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='pi_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Content hash of the order data the PI PDF was rendered from (see orders/invoices.py)', max_length=16),
+        ),
+    ]
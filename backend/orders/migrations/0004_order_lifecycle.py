@@ -0,0 +1,85 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def log_existing_orders(apps, schema_editor):
+    from orders.lifecycle import COUNTER_FIELDS, history_from_dates, tally
+
+    Order = apps.get_model('orders', 'Order')
+    OrderEvent = apps.get_model('orders', 'OrderEvent')
+    OrderStatusCount = apps.get_model('orders', 'OrderStatusCount')
+    date_fields = ['advance_date', 'production_start_date', 'shipment_date']
+    orders, events, batch, stamped = [], [], [], []
+    rows = Order.objects.order_by('pk').values('pk', 'status', 'pi_date', 'updated_at', *date_fields)
+    for row in rows.iterator(chunk_size=1000):
+        history = history_from_dates(row['status'], row['pi_date'], row['updated_at'], row)
+        orders.append((row['pk'], row['status'], row['pi_date']))
+        for from_status, to_status, at in history:
+            events.append((row['pk'], from_status, to_status, at))
+            batch.append(OrderEvent(order_id=row['pk'], from_status=from_status, to_status=to_status, created_at=at))
+        stamped.append(Order(pk=row['pk'], status_changed_at=history[-1][2]))
+        if len(batch) >= 5000:
+            OrderEvent.objects.bulk_create(batch)
+            Order.objects.bulk_update(stamped, ['status_changed_at'])
+            batch, stamped = [], []
+    OrderEvent.objects.bulk_create(batch)
+    Order.objects.bulk_update(stamped, ['status_changed_at'])
+    counters = tally(orders, events)
+    OrderStatusCount.objects.bulk_create([
+        OrderStatusCount(status=status, **{name: counters[status][name] for name in COUNTER_FIELDS})
+        for status, _ in Order._meta.get_field('status').choices
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_document_fingerprints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusCount',
+            fields=[
+                ('status', models.CharField(choices=[('PI_GENERATED', 'PI Generated'), ('ADVANCE_RECEIVED', 'Advance Received'), ('PRODUCTION', 'In Production'), ('QC_PASSED', 'QC Passed'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20, primary_key=True, serialize=False)),
+                ('current', models.IntegerField(default=0, help_text='Orders in this status now')),
+                ('reached', models.IntegerField(default=0, help_text='Orders that entered this status')),
+                ('seconds_from_pi', models.BigIntegerField(default=0, help_text='Total time from PI date to entering this status')),
+                ('exited', models.IntegerField(default=0, help_text='Orders that left this status')),
+                ('seconds_in_status', models.BigIntegerField(default=0, help_text='Total time spent in this status by orders that left it')),
+            ],
+            options={
+                'verbose_name': 'Order Status Count',
+                'verbose_name_plural': 'Order Status Counts',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('PI_GENERATED', 'PI Generated'), ('ADVANCE_RECEIVED', 'Advance Received'), ('PRODUCTION', 'In Production'), ('QC_PASSED', 'QC Passed'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('to_status', models.CharField(choices=[('PI_GENERATED', 'PI Generated'), ('ADVANCE_RECEIVED', 'Advance Received'), ('PRODUCTION', 'In Production'), ('QC_PASSED', 'QC Passed'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.order')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Order Event',
+                'verbose_name_plural': 'Order Events',
+                'ordering': ['created_at', 'pk'],
+                'indexes': [models.Index(fields=['order', 'created_at'], name='order_event_timeline_idx'), models.Index(fields=['to_status', 'created_at'], name='order_event_status_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_orders, migrations.RunPython.noop),
+    ]
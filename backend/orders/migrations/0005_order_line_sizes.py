@@ -0,0 +1,91 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:38
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# A frozen copy of orders.sizes.parse_size_breakdown as of this migration
+_SEPARATORS = re.compile(r'[,;/\n]+')
+_ENTRY = re.compile(
+    r'^\s*(?:(?P<size>[A-Za-z0-9](?:[^\s:=]*[A-Za-z0-9])?)\s*[:=]\s*(?P<quantity>\d+)'
+    r'|(?P<letter_size>[A-Za-z]+)(?P<letter_quantity>\d+))\s*$'
+)
+
+
+def _parse(text):
+    """[(size, quantity), ...] from a breakdown, or None if it cannot be read unambiguously."""
+    sizes = {}
+    for entry in _SEPARATORS.split(text):
+        if not entry.strip():
+            continue
+        match = _ENTRY.match(entry)
+        if not match:
+            return None
+        size = (match['size'] or match['letter_size']).upper()
+        if len(size) > 20 or size in sizes:
+            return None
+        sizes[size] = int(match['quantity'] or match['letter_quantity'])
+    return list(sizes.items())
+
+
+def parse_existing_breakdowns(apps, schema_editor):
+    """Size rows for lines whose breakdown reads cleanly and adds up to the line quantity."""
+    OrderProduct = apps.get_model('orders', 'OrderProduct')
+    OrderLineSize = apps.get_model('orders', 'OrderLineSize')
+    batch, skipped = [], []
+    lines = (
+        OrderProduct.objects.exclude(size_breakdown='').order_by('pk')
+        .values_list('pk', 'order_id', 'quantity', 'size_breakdown')
+    )
+    for pk, order_id, line_quantity, text in lines.iterator(chunk_size=1000):
+        sizes = _parse(text)
+        if sizes is None or sum(quantity for _, quantity in sizes) != line_quantity:
+            # Keep the text as it is; the line just gets no size rows
+            skipped.append(pk)
+            continue
+        batch.extend(
+            OrderLineSize(line_id=pk, order_id=order_id, size=size, quantity=quantity, position=position)
+            for position, (size, quantity) in enumerate(sizes)
+        )
+        if len(batch) >= 5000:
+            OrderLineSize.objects.bulk_create(batch)
+            batch = []
+    OrderLineSize.objects.bulk_create(batch)
+    if skipped:
+        more = ', ...' if len(skipped) > 20 else ''
+        print(
+            f'\n  {len(skipped)} order lines have size breakdowns that cannot be read or do not add up to '
+            f'their quantity: {", ".join(map(str, skipped[:20]))}{more}. Correct them and run '
+            f'rebuild_order_line_sizes.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_lifecycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLineSize',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=20)),
+                ('quantity', models.PositiveIntegerField()),
+                ('position', models.PositiveSmallIntegerField(default=0, help_text='Place of the size in the breakdown')),
+                ('line', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sizes', to='orders.orderproduct')),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Order Line Size',
+                'verbose_name_plural': 'Order Line Sizes',
+                'ordering': ['line', 'position'],
+                'indexes': [models.Index(fields=['order', 'size'], name='order_line_size_idx')],
+                'constraints': [models.UniqueConstraint(fields=('line', 'size'), name='unique_order_line_size')],
+            },
+        ),
+        migrations.RunPython(parse_existing_breakdowns, migrations.RunPython.noop),
+    ]
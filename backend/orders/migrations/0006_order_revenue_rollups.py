@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0008_lead_search_index'),
+        ('orders', '0005_order_line_sizes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRevenueMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the PI month')),
+                ('currency', models.CharField(max_length=3)),
+                ('commercial_term', models.CharField(choices=[('EXW', 'EX Works'), ('FOB', 'Free On Board'), ('CIF', 'Cost, Insurance & Freight'), ('CIP', 'Carriage & Insurance Paid'), ('DDP_AIR', 'DDP Air'), ('DDP_SEA', 'DDP Sea')], max_length=20)),
+                ('buyer_company', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('PI_GENERATED', 'PI Generated'), ('ADVANCE_RECEIVED', 'Advance Received'), ('PRODUCTION', 'In Production'), ('QC_PASSED', 'QC Passed'), ('SHIPPED', 'Shipped'), ('DELIVERED', 'Delivered'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('pieces', models.BigIntegerField(default=0, help_text='Total quantity of the order lines')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, help_text="Total in the orders' currency", max_digits=16)),
+                ('amount_base', models.DecimalField(decimal_places=2, default=0, help_text='Total in the base currency', max_digits=16)),
+                ('unconverted', models.IntegerField(default=0, help_text='Orders without a base-currency amount (no exchange rate)')),
+            ],
+            options={
+                'verbose_name': 'Order Revenue Rollup',
+                'verbose_name_plural': 'Order Revenue Rollups',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['pi_date'], name='order_pi_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderrevenuemonthly',
+            constraint=models.UniqueConstraint(fields=('month', 'currency', 'commercial_term', 'buyer_company', 'status'), name='unique_order_revenue_bucket'),
+        ),
+    ]
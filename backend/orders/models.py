@@ -1,5 +1,12 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from documents.numbering import next_number
+from fx.rates import to_base
 
 
 class Order(models.Model):
@@ -47,9 +54,31 @@ class Order(models.Model):
     # Pricing
     total_amount = models.DecimalField(max_digits=12, decimal_places=2)
     currency = models.CharField(max_length=3, default='USD')
+    total_amount_base = models.DecimalField(
+        max_digits=14, decimal_places=2, editable=False, null=True,
+        help_text='Total amount in the base currency (see fx/rates.py)'
+    )
+    
+    # Allowed status changes (see orders/lifecycle.py)
+    STATUS_TRANSITIONS = {
+        'PI_GENERATED': ('ADVANCE_RECEIVED', 'CANCELLED'),
+        'ADVANCE_RECEIVED': ('PRODUCTION', 'CANCELLED'),
+        'PRODUCTION': ('QC_PASSED', 'CANCELLED'),
+        'QC_PASSED': ('SHIPPED', 'CANCELLED'),
+        'SHIPPED': ('DELIVERED',),
+        'DELIVERED': (),
+        'CANCELLED': (),
+    }
+    # Timeline field stamped when an order first enters a status
+    STATUS_DATE_FIELDS = {
+        'ADVANCE_RECEIVED': 'advance_date',
+        'PRODUCTION': 'production_start_date',
+        'SHIPPED': 'shipment_date',
+    }
     
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PI_GENERATED')
+    status_changed_at = models.DateTimeField(default=timezone.now, editable=False)
     
     # Timeline
     pi_date = models.DateTimeField(auto_now_add=True)
@@ -62,6 +91,14 @@ class Order(models.Model):
     invoice_url = models.FileField(upload_to='documents/invoices/', blank=True)
     packing_list_url = models.FileField(upload_to='documents/packing/', blank=True)
     awb_url = models.FileField(upload_to='documents/awb/', blank=True)
+    pi_fingerprint = models.CharField(
+        max_length=16, blank=True, editable=False,
+        help_text='Content hash of the order data the PI PDF was rendered from (see orders/invoices.py)'
+    )
+    invoice_fingerprint = models.CharField(
+        max_length=16, blank=True, editable=False,
+        help_text='Content hash of the order data the commercial invoice PDF was rendered from'
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -71,12 +108,59 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            # Per-month revenue rollups (see orders/analytics.py)
+            models.Index(fields=['pi_date'], name='order_pi_date_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._status_state = instance.status_state()
+        # PI date as loaded, so a save that moves the order to another month also refreshes the old one
+        instance._loaded_pi_date = instance.__dict__.get('pi_date')
+        return instance
+    
+    def status_state(self):
+        """(status, status_changed_at) as last saved, or None if deferred."""
+        if 'status' not in self.__dict__ or 'status_changed_at' not in self.__dict__:
+            return None
+        return (self.status, self.status_changed_at)
+    
+    def clean(self):
+        super().clean()
+        state = getattr(self, '_status_state', None)
+        if state is not None and state[0] != self.status and not self.can_transition(state[0], self.status):
+            raise ValidationError({'status': self._transition_error(state[0], self.status)})
+    
+    @classmethod
+    def can_transition(cls, from_status, to_status):
+        return to_status in cls.STATUS_TRANSITIONS.get(from_status, ())
+    
+    def _transition_error(self, from_status, to_status):
+        labels = dict(self.STATUS_CHOICES)
+        return f'An order cannot go from {labels.get(from_status, from_status)} to {labels.get(to_status, to_status)}.'
     
     def save(self, *args, **kwargs):
-        """Auto-generate PI number if not provided"""
+        """Auto-generate PI number if not provided; validate and stamp status changes"""
+        state = getattr(self, '_status_state', None)
+        if state is not None and 'status' in self.__dict__ and state[0] != self.status:
+            if not self.can_transition(state[0], self.status):
+                raise ValidationError({'status': self._transition_error(state[0], self.status)})
+            self._status_change = state
+            self.status_changed_at = timezone.now()
+            stamped = {'status_changed_at'}
+            date_field = self.STATUS_DATE_FIELDS.get(self.status)
+            if date_field and getattr(self, date_field) is None:
+                setattr(self, date_field, self.status_changed_at)
+                stamped.add(date_field)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'status' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | stamped
         if not self.pi_number:
-            import time
-            self.pi_number = f'PI-{int(time.time())}'
+            self.pi_number = next_number('PI')
+        self.currency = (self.currency or '').upper()
+        self.total_amount_base = to_base(self.total_amount, self.currency, self.pi_date)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -96,10 +180,148 @@ class OrderProduct(models.Model):
     total_price = models.DecimalField(max_digits=12, decimal_places=2)
     size_breakdown = models.CharField(max_length=255, blank=True, help_text='e.g., S:10, M:20, L:15')
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._size_state = instance.size_state()
+        return instance
+    
+    @staticmethod
+    def line_total(quantity, unit_price):
+        return (Decimal(quantity) * Decimal(str(unit_price))).quantize(Decimal('0.01'), rounding=ROUND_HALF_EVEN)
+    
     def save(self, *args, **kwargs):
         """Auto-calculate total price"""
-        self.total_price = self.quantity * self.unit_price
+        self.total_price = self.line_total(self.quantity, self.unit_price)
         super().save(*args, **kwargs)
     
+    def clean(self):
+        super().clean()
+        from .sizes import SizeBreakdownError, check_size_breakdown
+        
+        try:
+            check_size_breakdown(self.size_breakdown, self.quantity)
+        except SizeBreakdownError as exc:
+            raise ValidationError({'size_breakdown': str(exc)})
+    
+    def size_state(self):
+        """(order_id, size_breakdown) as stored in OrderLineSize, or None if deferred."""
+        if 'order_id' not in self.__dict__ or 'size_breakdown' not in self.__dict__:
+            return None
+        return (self.order_id, self.size_breakdown)
+    
     def __str__(self):
         return f'{self.style_name} x {self.quantity}'
+
+
+class OrderLineSize(models.Model):
+    """
+    One size of an order line's size breakdown, parsed from
+    OrderProduct.size_breakdown by orders/sizes.py. The order is copied from
+    the line so per-size totals over a set of orders need no join.
+    """
+    # Both foreign keys are covered by the composite indexes below
+    line = models.ForeignKey(OrderProduct, on_delete=models.CASCADE, related_name='sizes', db_index=False)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='+', db_index=False)
+    size = models.CharField(max_length=20)
+    quantity = models.PositiveIntegerField()
+    position = models.PositiveSmallIntegerField(default=0, help_text='Place of the size in the breakdown')
+    
+    class Meta:
+        ordering = ['line', 'position']
+        verbose_name = 'Order Line Size'
+        verbose_name_plural = 'Order Line Sizes'
+        constraints = [
+            models.UniqueConstraint(fields=['line', 'size'], name='unique_order_line_size'),
+        ]
+        indexes = [
+            # Per-size totals over a set of orders
+            models.Index(fields=['order', 'size'], name='order_line_size_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.size}:{self.quantity}'
+
+
+class OrderEvent(models.Model):
+    """
+    Append-only log of order status changes, written by orders/lifecycle.py.
+    ``from_status`` is blank for the event recording the order's creation.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    note = models.CharField(max_length=255, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['created_at', 'pk']
+        verbose_name = 'Order Event'
+        verbose_name_plural = 'Order Events'
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='order_event_timeline_idx'),
+            # Transitions into a status over a date range
+            models.Index(fields=['to_status', 'created_at'], name='order_event_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.order_id}: {self.from_status or "-"} -> {self.to_status} at {self.created_at}'
+
+
+class OrderStatusCount(models.Model):
+    """
+    Per-status order counters maintained by orders/lifecycle.py, so status
+    totals and average lead times are read from one row per status.
+    """
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, primary_key=True)
+    current = models.IntegerField(default=0, help_text='Orders in this status now')
+    reached = models.IntegerField(default=0, help_text='Orders that entered this status')
+    seconds_from_pi = models.BigIntegerField(default=0, help_text='Total time from PI date to entering this status')
+    exited = models.IntegerField(default=0, help_text='Orders that left this status')
+    seconds_in_status = models.BigIntegerField(default=0, help_text='Total time spent in this status by orders that left it')
+    
+    class Meta:
+        verbose_name = 'Order Status Count'
+        verbose_name_plural = 'Order Status Counts'
+    
+    def __str__(self):
+        return f'{self.status}: {self.current}'
+
+
+class OrderRevenueMonthly(models.Model):
+    """
+    Monthly rollup of orders by PI month, currency, commercial term, buyer
+    company and status, recomputed per month by orders/analytics.py whenever
+    orders in that month change.
+    """
+    month = models.DateField(help_text='First day of the PI month')
+    currency = models.CharField(max_length=3)
+    commercial_term = models.CharField(max_length=20, choices=Order.TERM_CHOICES)
+    buyer_company = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    pieces = models.BigIntegerField(default=0, help_text='Total quantity of the order lines')
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text='Total in the orders\' currency')
+    amount_base = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text='Total in the base currency')
+    unconverted = models.IntegerField(default=0, help_text='Orders without a base-currency amount (no exchange rate)')
+    
+    class Meta:
+        ordering = ['-month']
+        verbose_name = 'Order Revenue Rollup'
+        verbose_name_plural = 'Order Revenue Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'currency', 'commercial_term', 'buyer_company', 'status'],
+                name='unique_order_revenue_bucket',
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.month:%Y-%m} {self.currency} {self.status}: {self.orders} orders'
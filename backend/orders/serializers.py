@@ -0,0 +1,160 @@
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .conversion import attach_prefetched
+from .models import Order, OrderEvent, OrderLineSize, OrderProduct
+from .sizes import SizeBreakdownError, check_size_breakdown, format_size_breakdown, store_sizes
+from .totals import deferred_refresh, refresh_later
+
+
+class OrderLineSizeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLineSize
+        fields = ['size', 'quantity']
+        read_only_fields = fields
+
+
+class OrderProductSerializer(serializers.ModelSerializer):
+    """Order line; ``size_breakdown`` must add up to ``quantity`` and is stored normalized."""
+    sizes = OrderLineSizeSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = OrderProduct
+        fields = ['id', 'style_name', 'style_number', 'quantity', 'unit_price', 'total_price', 'size_breakdown', 'sizes']
+        read_only_fields = ['id', 'total_price']
+        extra_kwargs = {'quantity': {'min_value': 1}}
+
+    def validate(self, attrs):
+        if attrs.get('size_breakdown'):
+            try:
+                sizes = check_size_breakdown(attrs['size_breakdown'], attrs.get('quantity'))
+            except SizeBreakdownError as exc:
+                raise serializers.ValidationError({'size_breakdown': str(exc)})
+            attrs['size_breakdown'] = format_size_breakdown(sizes)
+        return attrs
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    """
+    Order with its lines. Lines given on create (or on update, replacing the
+    existing ones) are inserted with one bulk_create, and ``total_amount``
+    is then derived from them in the same transaction. ``line_count`` and
+    ``total_quantity`` are read from the annotations added by
+    OrderViewSet.get_queryset when present.
+    """
+    products = OrderProductSerializer(many=True, required=False)
+    line_count = serializers.SerializerMethodField()
+    total_quantity = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'lead', 'pi_number', 'buyer_name', 'buyer_company', 'buyer_address',
+            'buyer_email', 'buyer_phone', 'commercial_term', 'payment_terms', 'bank_details',
+            'total_amount', 'currency', 'total_amount_base', 'status', 'status_changed_at',
+            'pi_date', 'advance_date', 'production_start_date', 'shipment_date',
+            'pi_url', 'invoice_url', 'packing_list_url', 'awb_url',
+            'created_at', 'updated_at', 'products', 'line_count', 'total_quantity',
+        ]
+        read_only_fields = [
+            'id', 'pi_number', 'total_amount_base', 'status', 'status_changed_at', 'pi_date', 'created_at', 'updated_at',
+            'pi_url', 'invoice_url', 'packing_list_url', 'awb_url',
+        ]
+        extra_kwargs = {'total_amount': {'required': False}}
+
+    def get_line_count(self, obj):
+        if hasattr(obj, 'line_count'):
+            return obj.line_count
+        return len(obj.products.all())
+
+    def get_total_quantity(self, obj):
+        if hasattr(obj, 'total_quantity'):
+            return obj.total_quantity or 0
+        return sum(line.quantity for line in obj.products.all())
+
+    def validate(self, attrs):
+        if self.instance is None and not attrs.get('products') and attrs.get('total_amount') is None:
+            raise serializers.ValidationError({'total_amount': 'Required when the order has no lines.'})
+        return attrs
+
+    def create(self, validated_data):
+        lines = validated_data.pop('products', None)
+        with transaction.atomic():
+            if lines:
+                validated_data['total_amount'] = 0
+            order = Order(**validated_data)
+            request = self.context.get('request')
+            order._status_user = request.user if request else None
+            order.save()
+            if lines:
+                self._replace_lines(order, lines)
+        return order
+
+    def update(self, instance, validated_data):
+        lines = validated_data.pop('products', None)
+        with transaction.atomic():
+            if lines is not None:
+                validated_data.pop('total_amount', None)
+            order = super().update(instance, validated_data)
+            if lines is not None:
+                self._replace_lines(order, lines, delete_existing=True)
+        return order
+
+    def _replace_lines(self, order, lines, delete_existing=False):
+        with deferred_refresh():
+            if delete_existing:
+                OrderProduct.objects.filter(order=order).delete()
+            created = OrderProduct.objects.bulk_create([
+                OrderProduct(
+                    order=order,
+                    total_price=OrderProduct.line_total(line['quantity'], line['unit_price']),
+                    **line,
+                )
+                for line in lines
+            ])
+            sizes = store_sizes(created, replace=False)
+            # bulk_create sends no signals
+            refresh_later([order.pk])
+        order.refresh_from_db(fields=['total_amount', 'total_amount_base'])
+        # Lines prefetched for the old version of the order are stale; the new
+        # lines, their sizes and the line aggregates are known without another
+        # query.
+        by_line = {line.pk: [] for line in created}
+        for size in sizes:
+            by_line[size.line_id].append(size)
+        for line in created:
+            attach_prefetched(line, 'sizes', by_line[line.pk])
+        attach_prefetched(order, 'products', created)
+        order.line_count = len(lines)
+        order.total_quantity = sum(line['quantity'] for line in lines)
+
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderEvent
+        fields = ['id', 'from_status', 'to_status', 'note', 'user', 'created_at']
+        read_only_fields = fields
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+
+class LeadConversionLineSerializer(serializers.Serializer):
+    costing = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    size_breakdown = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+
+class LeadConversionSerializer(serializers.Serializer):
+    """Input of LeadViewSet.convert; lines default to the lead's only costing in the lead's quantity."""
+    items = LeadConversionLineSerializer(many=True, required=False)
+    commercial_term = serializers.ChoiceField(choices=Order.TERM_CHOICES, required=False)
+    payment_terms = serializers.CharField(max_length=255, required=False)
+    bank_details = serializers.CharField(required=False, allow_blank=True)
+    buyer_company = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    buyer_address = serializers.CharField(required=False, allow_blank=True)
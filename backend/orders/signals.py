@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import analytics, lifecycle
+from .models import Order, OrderProduct
+from .sizes import store_sizes
+from .totals import refresh_later
+
+
+@receiver(post_save, sender=OrderProduct, dispatch_uid='orders_refresh_total_on_line_save')
+@receiver(post_delete, sender=OrderProduct, dispatch_uid='orders_refresh_total_on_line_delete')
+def refresh_order_total(sender, instance, raw=False, **kwargs):
+    """Keep Order.total_amount equal to the sum of its lines for single-line edits (e.g. the admin)."""
+    if raw:
+        return
+    refresh_later([instance.order_id])
+
+
+@receiver(post_save, sender=OrderProduct, dispatch_uid='orders_store_line_sizes')
+def store_line_sizes(sender, instance, created, raw=False, **kwargs):
+    """Parse a saved line's size breakdown into OrderLineSize rows when it changed."""
+    if raw:
+        return
+    state = instance.size_state()
+    if created or state is None or state != getattr(instance, '_size_state', None):
+        store_sizes([instance], replace=not created)
+        instance._size_state = instance.size_state()
+
+
+@receiver(post_save, sender=Order, dispatch_uid='orders_record_status_events')
+def record_status_events(sender, instance, created, raw=False, **kwargs):
+    """Log status changes and keep OrderStatusCount in step with them."""
+    if raw:
+        return
+    status_change = instance.__dict__.pop('_status_change', None)
+    user = instance.__dict__.pop('_status_user', None)
+    note = instance.__dict__.pop('_status_note', '')
+    if created:
+        lifecycle.record_created([instance], user=user)
+    elif status_change:
+        lifecycle.record_transition(instance, *status_change, user=user, note=note)
+    instance._status_state = instance.status_state()
+
+
+@receiver(post_save, sender=Order, dispatch_uid='orders_refresh_revenue_on_save')
+@receiver(post_delete, sender=Order, dispatch_uid='orders_refresh_revenue_on_delete')
+def refresh_revenue_rollups(sender, instance, raw=False, **kwargs):
+    """Recompute the revenue rollups of the order's PI month (and the one it left) after commit."""
+    if raw:
+        return
+    pi_dates = {instance.pi_date, getattr(instance, '_loaded_pi_date', None)}
+    analytics.refresh_later(analytics.month_of(pi_date) for pi_date in pi_dates if pi_date)
+    instance._loaded_pi_date = instance.pi_date
+
+
+@receiver(pre_delete, sender=Order, dispatch_uid='orders_uncount_deleted_orders')
+def uncount_deleted_order(sender, instance, **kwargs):
+    """Remove a deleted order from the status counters while its events still exist."""
+    lifecycle.record_deleted(instance)
@@ -0,0 +1,163 @@
+"""
+Size breakdowns of order lines.
+
+``OrderProduct.size_breakdown`` stays the human-readable text shown on
+documents ("S:10, M:20, L:15"); it is parsed once on write into
+``OrderLineSize`` rows (one per line and size, with the order id copied in)
+so pieces per size can be summed across orders in SQL. Breakdowns must add
+up to the line quantity; older lines whose text cannot be parsed, or whose
+sizes do not add up, keep their text but have no size rows (see the
+rebuild_order_line_sizes command).
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import OrderLineSize, OrderProduct
+
+# Display order of common sizes; other sizes follow alphabetically.
+SIZE_ORDER = ['XXS', 'XS', 'S', 'M', 'L', 'XL', 'XXL', '3XL', '4XL', '5XL', 'FREESIZE']
+GROUP_FIELDS = ('style_number',)
+
+_SEPARATORS = re.compile(r'[,;/\n]+')
+# "SIZE:QUANTITY" / "SIZE=QUANTITY", or letters directly followed by digits ("S10")
+_ENTRY = re.compile(
+    r'^\s*(?:(?P<size>[A-Za-z0-9](?:[^\s:=]*[A-Za-z0-9])?)\s*[:=]\s*(?P<quantity>\d+)'
+    r'|(?P<letter_size>[A-Za-z]+)(?P<letter_quantity>\d+))\s*$'
+)
+
+
+class SizeBreakdownError(ValueError):
+    pass
+
+
+def parse_size_breakdown(text):
+    """
+    ``[(size, quantity), ...]`` from text like "S:10, M:20, L:15" (``=`` may
+    replace the colon, and a size made of letters may be written directly
+    before its quantity, as in "S10"; entries may be separated by commas,
+    semicolons, slashes or new lines). Sizes are upper-cased and cannot
+    contain spaces. Raises SizeBreakdownError for malformed or repeated
+    entries rather than guessing what "28 30 32" means.
+    """
+    sizes = []
+    seen = set()
+    for entry in _SEPARATORS.split(text or ''):
+        if not entry.strip():
+            continue
+        match = _ENTRY.match(entry)
+        if not match:
+            raise SizeBreakdownError(f'Cannot read "{entry.strip()}"; use SIZE:QUANTITY, e.g. "S:10, M:20".')
+        size = (match['size'] or match['letter_size']).upper()
+        quantity = int(match['quantity'] or match['letter_quantity'])
+        if len(size) > OrderLineSize._meta.get_field('size').max_length:
+            raise SizeBreakdownError(f'Size "{size}" is too long.')
+        if size in seen:
+            raise SizeBreakdownError(f'Size {size} is listed more than once.')
+        seen.add(size)
+        sizes.append((size, quantity))
+    return sizes
+
+
+def format_size_breakdown(sizes):
+    return ', '.join(f'{size}:{quantity}' for size, quantity in sizes)
+
+
+def check_size_breakdown(text, quantity):
+    """Parsed sizes of a new breakdown, which must add up to ``quantity`` if given."""
+    sizes = parse_size_breakdown(text)
+    total = sum(pieces for _, pieces in sizes)
+    if sizes and quantity is not None and total != quantity:
+        raise SizeBreakdownError(f'Sizes add up to {total} pieces but the line quantity is {quantity}.')
+    return sizes
+
+
+def size_rows(line):
+    """
+    Unsaved OrderLineSize rows for a saved line; none if its breakdown cannot
+    be parsed or does not add up to the line quantity.
+    """
+    try:
+        sizes = check_size_breakdown(line.size_breakdown, line.quantity)
+    except SizeBreakdownError:
+        return []
+    return [
+        OrderLineSize(line_id=line.pk, order_id=line.order_id, size=size, quantity=quantity, position=position)
+        for position, (size, quantity) in enumerate(sizes)
+    ]
+
+
+def store_sizes(lines, replace=True, batch_size=1000):
+    """Write the size rows of saved lines, replacing their existing rows; returns the new rows."""
+    lines = list(lines)
+    # Part of the caller's line write when there is one (no savepoint)
+    with transaction.atomic(savepoint=False):
+        if replace:
+            OrderLineSize.objects.filter(line__in=[line.pk for line in lines]).delete()
+        return OrderLineSize.objects.bulk_create(
+            [row for line in lines for row in size_rows(line)],
+            batch_size=batch_size,
+        )
+
+
+def rebuild_sizes(lines=None, batch_size=1000):
+    """
+    Re-parse the breakdowns of ``lines`` (default: all) in batches.
+    Returns ``(lines_processed, ids_of_unparseable_lines)``; the unparseable
+    lines include those whose sizes do not add up to their quantity.
+    """
+    queryset = (lines if lines is not None else OrderProduct.objects.all()).order_by('pk')
+    processed, unparseable, batch = 0, [], []
+    rows = queryset.only('pk', 'order_id', 'quantity', 'size_breakdown').iterator(chunk_size=batch_size)
+    for line in rows:
+        batch.append(line)
+        if line.size_breakdown and not size_rows(line):
+            unparseable.append(line.pk)
+        if len(batch) >= batch_size:
+            store_sizes(batch, batch_size=batch_size)
+            processed += len(batch)
+            batch = []
+    if batch:
+        store_sizes(batch, batch_size=batch_size)
+        processed += len(batch)
+    return processed, unparseable
+
+
+def _size_key(size):
+    return (SIZE_ORDER.index(size), '') if size in SIZE_ORDER else (len(SIZE_ORDER), size)
+
+
+def size_totals(orders, group_by=None):
+    """
+    Pieces per size over the lines of ``orders`` (a queryset), computed with
+    one GROUP BY; optionally per ``group_by`` (one of GROUP_FIELDS).
+    """
+    group_fields = [f'line__{group_by}'] if group_by else []
+    rows = (
+        OrderLineSize.objects
+        .filter(order__in=orders.order_by().values('pk'))
+        .order_by()
+        .values(*group_fields, 'size')
+        .annotate(pieces=Sum('quantity'), lines=Count('line_id'), orders=Count('order_id', distinct=True))
+    )
+    groups = {}
+    for row in rows:
+        key = row[group_fields[0]] if group_fields else None
+        groups.setdefault(key, []).append({
+            'size': row['size'],
+            'pieces': row['pieces'],
+            'lines': row['lines'],
+            'orders': row['orders'],
+        })
+    for sizes in groups.values():
+        sizes.sort(key=lambda item: _size_key(item['size']))
+    if not group_by:
+        sizes = groups.get(None, [])
+        return {'sizes': sizes, 'pieces': sum(item['pieces'] for item in sizes)}
+    return {
+        'groups': [
+            {group_by: key, 'sizes': sizes, 'pieces': sum(item['pieces'] for item in sizes)}
+            for key, sizes in sorted(groups.items())
+        ],
+    }
@@ -1,3 +1,476 @@
-from django.test import TestCase
+import io
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from costings.models import Costing
+from leads.models import Lead, LeadHistory
+from users.models import User
+
+from .analytics import month_of
+from .conversion import convert_lead
+from .invoices import document_status, fingerprint, render_batch
+from .lifecycle import rebuild_status_counts, transition
+from .models import Order, OrderEvent, OrderLineSize, OrderProduct, OrderRevenueMonthly, OrderStatusCount
+from .sizes import SizeBreakdownError, check_size_breakdown, parse_size_breakdown, rebuild_sizes
+
+
+class OrderQueryCountTests(TestCase):
+    """The orders API runs a fixed number of queries whatever the number of lines."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', email='seller@example.com', password='x', role='SELLER')
+        cls.lead = Lead.objects.create(
+            name='Lead', email='lead@example.com', country='DE', product_type='T-shirt', assigned_to=cls.seller,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def lines(self, count):
+        return [
+            {'style_name': f'Style {i}', 'style_number': f'N{i}', 'quantity': 30, 'unit_price': '2.50', 'size_breakdown': 'S:10, M:20'}
+            for i in range(count)
+        ]
+
+    def create_order(self, line_count):
+        response = self.client.post('/api/orders/', {
+            'lead': self.lead.pk, 'buyer_name': 'Buyer', 'buyer_email': 'buyer@example.com', 'products': self.lines(line_count),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_nested_create(self):
+        # The first order also reserves a block of PI numbers and creates the status counter row
+        self.create_order(1)
+        # Throttle, lead, savepoint, order, event, status counter, lines, sizes,
+        # total, base amount (2), revenue month, reload of the totals, release
+        for count in (1, 2, 40):
+            with self.subTest(lines=count), self.assertNumQueries(14):
+                order = self.create_order(count)
+            self.assertEqual(order['total_amount'], f'{75 * count:.2f}')
+            self.assertEqual(order['line_count'], count)
+
+    def test_detail(self):
+        small, large = self.create_order(2), self.create_order(40)
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/orders/{small["id"]}/')
+        self.assertEqual(len(response.json()['products']), 2)
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/orders/{large["id"]}/')
+        self.assertEqual(len(response.json()['products'][0]['sizes']), 2)
+
+    def test_list(self):
+        for _ in range(2):
+            self.create_order(2)
+        with self.assertNumQueries(4):
+            self.client.get('/api/orders/')
+        for _ in range(5):
+            self.create_order(40)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.json()['count'], 7)
+        self.assertEqual(sum(order['line_count'] for order in response.json()['results']), 204)
+
+
+class SizeBreakdownParseTests(SimpleTestCase):
+    """Breakdowns are read only when their meaning is unambiguous."""
+
+    def test_valid_forms(self):
+        self.assertEqual(parse_size_breakdown('S:10, M:20, L:15'), [('S', 10), ('M', 20), ('L', 15)])
+        self.assertEqual(parse_size_breakdown('s = 5; xl=3\n3XL: 2'), [('S', 5), ('XL', 3), ('3XL', 2)])
+        self.assertEqual(parse_size_breakdown('S10 / M20'), [('S', 10), ('M', 20)])
+        self.assertEqual(parse_size_breakdown('28:4, 10-12:6'), [('28', 4), ('10-12', 6)])
+        self.assertEqual(parse_size_breakdown(''), [])
+
+    def test_ambiguous_forms(self):
+        for text in ('32', '28 30 32', 'S10 M20', 'XL-10', 'FREE SIZE:10', 'S 10', 'XL-:10', ':10', 'S:', 'S:10, s:5'):
+            with self.subTest(text=text), self.assertRaises(SizeBreakdownError):
+                parse_size_breakdown(text)
+
+    def test_mismatched_total(self):
+        self.assertEqual(check_size_breakdown('S:10, M:20', 30), [('S', 10), ('M', 20)])
+        with self.assertRaises(SizeBreakdownError):
+            check_size_breakdown('S:10, M:20', 40)
+
+
+class SizeBackfillTests(TestCase):
+    """The migration backfill and rebuild_sizes store only breakdowns that add up to the line quantity."""
+
+    def setUp(self):
+        lead = Lead.objects.create(name='Lead', email='lead@example.com', country='DE', product_type='T-shirt')
+        order = Order.objects.create(lead=lead, buyer_name='Buyer', buyer_email='buyer@example.com', total_amount=0)
+        # bulk_create skips the save signals, like lines written before size rows existed
+        self.good, self.mismatched, self.unreadable = OrderProduct.objects.bulk_create([
+            OrderProduct(order=order, style_name='Tee', style_number=f'T-{i}', quantity=quantity, unit_price=1,
+                         total_price=quantity, size_breakdown=text)
+            for i, (quantity, text) in enumerate([(30, 'S:10, M:20'), (30, 'S:10, M:25'), (32, '28 30 32')])
+        ])
+
+    def stored(self):
+        return {
+            line_id: sizes for line_id, sizes in (
+                (line.pk, list(line.sizes.values_list('size', 'quantity')))
+                for line in OrderProduct.objects.order_by('pk')
+            )
+        }
+
+    def assert_backfilled(self):
+        self.assertEqual(self.stored(), {self.good.pk: [('S', 10), ('M', 20)], self.mismatched.pk: [], self.unreadable.pk: []})
+        self.assertEqual(
+            list(OrderProduct.objects.order_by('pk').values_list('size_breakdown', flat=True)),
+            ['S:10, M:20', 'S:10, M:25', '28 30 32'],
+        )
+
+    def test_rebuild_sizes(self):
+        processed, unparseable = rebuild_sizes()
+        self.assertEqual(processed, 3)
+        self.assertEqual(unparseable, [self.mismatched.pk, self.unreadable.pk])
+        self.assert_backfilled()
+
+    def test_migration(self):
+        migration = import_module('orders.migrations.0005_order_line_sizes')
+        output = io.StringIO()
+        with redirect_stdout(output):
+            migration.parse_existing_breakdowns(apps, None)
+        self.assertIn('2 order lines', output.getvalue())
+        self.assertIn(f'{self.mismatched.pk}, {self.unreadable.pk}', output.getvalue())
+        self.assert_backfilled()
+        self.assertEqual(OrderLineSize.objects.count(), 2)
+
+
+class ConvertLeadTests(TestCase):
+    """convert_lead creates the order in one transaction and a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', email='seller@example.com', password='x', role='SELLER')
+
+    def lead_with_costings(self, count):
+        lead = Lead.objects.create(
+            name='Lead', email='lead@example.com', country='DE', product_type='T-shirt',
+            assigned_to=self.seller, quantity=30, status='QUALIFIED',
+        )
+        costings = [
+            Costing.objects.create(
+                lead=lead, style_name=f'Style {i}', style_number=f'S-{i}',
+                fabric_cost=1, fabric_consumption=1, cm_cost=1,
+            )
+            for i in range(count)
+        ]
+        items = [{'costing': costing.pk, 'quantity': 30, 'size_breakdown': 'S:10, M:20'} for costing in costings]
+        return lead, items
+
+    def test_query_count(self):
+        # The first order also reserves a block of PI numbers and creates the status counter row
+        lead, items = self.lead_with_costings(1)
+        convert_lead(lead.pk, items, user=self.seller)
+        for count in (1, 25):
+            lead, items = self.lead_with_costings(count)
+            with self.subTest(lines=count), self.assertNumQueries(17):
+                order = convert_lead(lead.pk, items, user=self.seller)
+            self.assertEqual(order.products.count(), count)
+
+    def test_converts(self):
+        lead, items = self.lead_with_costings(2)
+        items[1]['unit_price'] = '3.00'
+        order = convert_lead(lead.pk, items, user=self.seller, payment_terms='100% Advance')
+
+        self.assertRegex(order.pi_number, r'^PI-\d{4}-\d{5}$')
+        self.assertEqual(order.total_amount, 30 * Costing.objects.get(pk=items[0]['costing']).exw_price + 90)
+        self.assertEqual((order.buyer_name, order.buyer_email, order.payment_terms), ('Lead', 'lead@example.com', '100% Advance'))
+        self.assertEqual(
+            list(OrderLineSize.objects.filter(order=order).values_list('size', 'quantity')),
+            [('S', 10), ('M', 20), ('S', 10), ('M', 20)],
+        )
+        lead.refresh_from_db()
+        self.assertEqual(lead.status, 'ORDER_CONFIRMED')
+        self.assertEqual(
+            list(LeadHistory.objects.filter(lead=lead).order_by('pk').values_list('field', 'action')),
+            [
+                ('status', 'Status changed from Qualified to Order Confirmed'),
+                ('', f'Converted to order {order.pi_number}'),
+            ],
+        )
+
+    def test_invalid_costing(self):
+        lead, items = self.lead_with_costings(1)
+        _, other_items = self.lead_with_costings(1)
+        with self.assertRaises(ValidationError):
+            convert_lead(lead.pk, items + other_items, user=self.seller)
+        lead.refresh_from_db()
+        self.assertEqual(lead.status, 'QUALIFIED')
+        self.assertFalse(Order.objects.exists())
+
+    def test_rolls_back_on_failure(self):
+        lead, items = self.lead_with_costings(2)
+        with mock.patch.object(LeadHistory.objects, 'bulk_create', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            convert_lead(lead.pk, items, user=self.seller)
+        lead.refresh_from_db()
+        self.assertEqual(lead.status, 'QUALIFIED')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderProduct.objects.exists())
+        self.assertFalse(OrderLineSize.objects.exists())
+
+
+class OrderLifecycleTests(TestCase):
+    """Status changes follow STATUS_TRANSITIONS and are logged and counted."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', email='seller@example.com', password='x', role='SELLER')
+        cls.lead = Lead.objects.create(
+            name='Lead', email='lead@example.com', country='DE', product_type='T-shirt', assigned_to=cls.seller,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def create_order(self, **fields):
+        return Order.objects.create(lead=self.lead, buyer_name='Buyer', buyer_email='buyer@example.com', total_amount=100, **fields)
+
+    def counts(self):
+        return {
+            row.status: (row.current, row.reached, row.exited)
+            for row in OrderStatusCount.objects.all() if row.current or row.reached or row.exited
+        }
+
+    def test_allowed_transition(self):
+        order = self.create_order()
+        response = self.client.post(f'/api/orders/{order.pk}/transition/', {'status': 'ADVANCE_RECEIVED', 'note': 'Paid'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['status'], 'ADVANCE_RECEIVED')
+
+        order.refresh_from_db()
+        self.assertIsNotNone(order.advance_date)
+        self.assertEqual(order.status_changed_at, order.advance_date)
+        self.assertEqual(
+            list(OrderEvent.objects.filter(order=order).order_by('pk').values_list('from_status', 'to_status', 'note', 'user')),
+            [('', 'PI_GENERATED', '', None), ('PI_GENERATED', 'ADVANCE_RECEIVED', 'Paid', self.seller.pk)],
+        )
+        self.assertEqual(self.counts(), {'PI_GENERATED': (0, 1, 1), 'ADVANCE_RECEIVED': (1, 1, 0)})
+
+    def test_forbidden_transition(self):
+        order = self.create_order()
+        response = self.client.post(f'/api/orders/{order.pk}/transition/', {'status': 'SHIPPED'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], ['An order cannot go from PI Generated to Shipped.'])
+
+        order.status = 'DELIVERED'
+        with self.assertRaises(ValidationError) as raised:
+            order.full_clean()
+        self.assertIn('status', raised.exception.message_dict)
+        with self.assertRaises(ValidationError):
+            order.save()
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PI_GENERATED')
+        self.assertEqual(OrderEvent.objects.filter(order=order).count(), 1)
+        self.assertEqual(self.counts(), {'PI_GENERATED': (1, 1, 0)})
+
+    def test_update_reports_model_errors(self):
+        order = self.create_order()
+        # status is read-only on the order endpoint...
+        response = self.client.patch(f'/api/orders/{order.pk}/', {'status': 'DELIVERED', 'buyer_name': 'New'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['status'], 'PI_GENERATED')
+        # ...and a ValidationError raised while saving is a 400, not a 500
+        error = ValidationError({'status': 'An order cannot go from PI Generated to Delivered.'})
+        with mock.patch.object(Order, 'save', side_effect=error):
+            response = self.client.patch(f'/api/orders/{order.pk}/', {'buyer_name': 'Other'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'status': ['An order cannot go from PI Generated to Delivered.']})
+
+    def test_bulk_transition(self):
+        orders = [self.create_order() for _ in range(3)]
+        transition(orders[0], 'CANCELLED')
+        response = self.client.post('/api/orders/transition/', {'ids': [o.pk for o in orders], 'status': 'ADVANCE_RECEIVED'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.filter(status='ADVANCE_RECEIVED').count(), 0)
+
+        response = self.client.post('/api/orders/transition/', {'ids': [o.pk for o in orders[1:]], 'status': 'ADVANCE_RECEIVED'}, format='json')
+        self.assertEqual(response.json(), {'moved': 2})
+        self.assertEqual(OrderEvent.objects.filter(from_status='PI_GENERATED', to_status='ADVANCE_RECEIVED').count(), 2)
+        self.assertEqual(
+            self.counts(),
+            {'PI_GENERATED': (0, 3, 3), 'CANCELLED': (1, 1, 0), 'ADVANCE_RECEIVED': (2, 2, 0)},
+        )
+
+    def test_delete(self):
+        kept, deleted = self.create_order(), self.create_order()
+        for order in (kept, deleted):
+            transition(order, 'ADVANCE_RECEIVED')
+        transition(deleted, 'PRODUCTION')
+        self.assertEqual(
+            self.counts(),
+            {'PI_GENERATED': (0, 2, 2), 'ADVANCE_RECEIVED': (1, 2, 1), 'PRODUCTION': (1, 1, 0)},
+        )
+        deleted.delete()
+        self.assertEqual(self.counts(), {'PI_GENERATED': (0, 1, 1), 'ADVANCE_RECEIVED': (1, 1, 0)})
+        self.assertFalse(OrderEvent.objects.filter(order_id=deleted.pk).exists())
+        self.assertEqual(rebuild_status_counts()['ADVANCE_RECEIVED']['current'], 1)
+        self.assertEqual(self.counts(), {'PI_GENERATED': (0, 1, 1), 'ADVANCE_RECEIVED': (1, 1, 0)})
+
+
+# One worker: connections to the in-memory test database lock each other's tables
+@override_settings(ORDER_DOCUMENT_WORKERS=1)
+class OrderDocumentTests(TransactionTestCase):
+    """PDFs are rendered again only when what they show changed, or when forced."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = self.settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # WeasyPrint is not needed to test what gets rendered
+        patcher = mock.patch('orders.invoices.render_pdf', side_effect=self.render_pdf)
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.failing = set()
+
+        seller = User.objects.create_user(username='seller', email='seller@example.com', password='x', role='SELLER')
+        lead = Lead.objects.create(name='Lead', email='lead@example.com', country='DE', product_type='T-shirt', assigned_to=seller)
+        self.orders = []
+        for i in range(3):
+            order = Order.objects.create(lead=lead, buyer_name=f'Buyer {i}', buyer_email='buyer@example.com', total_amount=0)
+            OrderProduct.objects.create(order=order, style_name='Tee', style_number=f'T-{i}', quantity=10, unit_price='2.00')
+            self.orders.append(order)
+
+    def render_pdf(self, html):
+        if any(f'Buyer {i}' in html for i in self.failing):
+            raise RuntimeError('Pango failed')
+        return b'%PDF-1.7 ' + html.encode()[:100]
+
+    def run_batch(self, **options):
+        return {result.order_id: result for result in render_batch([order.pk for order in self.orders], **options)}
+
+    def current_fingerprint(self, order):
+        order = Order.objects.get(pk=order.pk)
+        return fingerprint('pi', order, list(order.products.all()))
+
+    def test_fingerprint(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        lines = list(order.products.all())
+        original = fingerprint('pi', order, lines)
+        self.assertEqual(fingerprint('pi', order, list(reversed(lines))), original)
+        self.assertNotEqual(fingerprint('invoice', order, lines), original)
+        order.status = 'CANCELLED'
+        self.assertEqual(fingerprint('pi', order, lines), original)
+        order.buyer_address = 'New address'
+        self.assertNotEqual(fingerprint('pi', order, lines), original)
+        lines[0].quantity = 11
+        self.assertNotEqual(fingerprint('pi', Order.objects.get(pk=order.pk), lines), original)
+
+    def test_skips_unchanged(self):
+        results = self.run_batch()
+        self.assertEqual(self.render.call_count, 3)
+        self.assertFalse(any(result.cached or result.error for result in results.values()))
+        first = Order.objects.get(pk=self.orders[0].pk)
+        self.assertEqual(first.pi_fingerprint, self.current_fingerprint(first))
+        self.assertTrue(default_storage.exists(first.pi_url.name))
+        self.assertEqual(document_status(first), {'status': 'ready', 'url': first.pi_url.url})
+
+        results = self.run_batch()
+        self.assertEqual(self.render.call_count, 3)
+        self.assertTrue(all(result.cached for result in results.values()))
+
+        Order.objects.filter(pk=first.pk).update(buyer_company='Nordtex')
+        self.assertEqual(document_status(Order.objects.get(pk=first.pk))['status'], 'pending')
+        results = self.run_batch()
+        self.assertEqual(self.render.call_count, 4)
+        self.assertEqual([pk for pk, result in results.items() if not result.cached], [first.pk])
+        self.assertNotEqual(results[first.pk].path, first.pi_url.name)
+        self.assertFalse(default_storage.exists(first.pi_url.name))
+
+    def test_force(self):
+        self.run_batch()
+        paths = {order.pk: order.pi_url.name for order in Order.objects.all()}
+        results = self.run_batch(force=True)
+        self.assertEqual(self.render.call_count, 6)
+        self.assertFalse(any(result.cached for result in results.values()))
+        self.assertEqual({pk: result.path for pk, result in results.items()}, paths)
+
+    def test_worker_errors(self):
+        self.failing = {1}
+        with self.assertLogs('orders.invoices', 'ERROR'):
+            results = self.run_batch()
+        self.assertEqual(results[self.orders[1].pk].error, 'Pango failed')
+        self.assertIsNone(results[self.orders[1].pk].path)
+        self.assertIsNone(results[self.orders[0].pk].error)
+        self.assertFalse(Order.objects.get(pk=self.orders[1].pk).pi_fingerprint)
+
+        out, err = io.StringIO(), io.StringIO()
+        with self.assertLogs('orders.invoices', 'ERROR'):
+            call_command('render_order_documents', stdout=out, stderr=err)
+        self.assertIn(f'Order {self.orders[1].pk} pi: Pango failed', err.getvalue())
+        self.assertIn('Rendered 0, unchanged 2, failed 1', out.getvalue())
+
+
+class RevenueRollupTests(TestCase):
+    """Revenue rollups of every month an order leaves or joins are recomputed on commit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user(username='seller', email='seller@example.com', password='x', role='SELLER')
+        cls.lead = Lead.objects.create(name='Lead', email='lead@example.com', country='DE', product_type='T-shirt', assigned_to=seller)
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = Order.objects.create(
+                lead=self.lead, buyer_name='Buyer', buyer_email='buyer@example.com', total_amount=100, currency='USD',
+            )
+        self.order = Order.objects.get(pk=self.order.pk)
+        self.month = month_of(self.order.pi_date)
+
+    def rollups(self):
+        return sorted(OrderRevenueMonthly.objects.values_list('month', 'currency', 'orders', 'amount', 'unconverted'))
+
+    def test_created(self):
+        self.assertEqual(self.rollups(), [(self.month, 'USD', 1, Decimal('100.00'), 0)])
+
+    def test_refreshed_on_commit(self):
+        self.order.total_amount = 250
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.order.save()
+            self.assertEqual(self.rollups(), [(self.month, 'USD', 1, Decimal('100.00'), 0)])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.rollups(), [(self.month, 'USD', 1, Decimal('250.00'), 0)])
+
+    def test_moves_month(self):
+        january = datetime(2026, 1, 15, 12, tzinfo=dt_timezone.utc)
+        self.order.pi_date = january
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+        self.assertEqual(self.rollups(), [(month_of(january), 'USD', 1, Decimal('100.00'), 0)])
+
+    def test_changes_currency(self):
+        self.order.currency = 'eur'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+        # No EUR rate loaded: counted, but without a base amount
+        self.assertEqual(self.rollups(), [(self.month, 'EUR', 1, Decimal('100.00'), 1)])
+
+    def test_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(
+                lead=self.lead, buyer_name='Other', buyer_email='other@example.com', total_amount=50, currency='USD',
+            )
+        self.assertEqual(self.rollups(), [(self.month, 'USD', 2, Decimal('150.00'), 0)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        self.assertEqual(self.rollups(), [(self.month, 'USD', 1, Decimal('50.00'), 0)])
@@ -0,0 +1,74 @@
+"""
+Order totals.
+
+``Order.total_amount`` is the sum of its lines' ``total_price`` whenever the
+lines change: the API and the OrderProduct signals call ``refresh_totals``
+in the same transaction as the line writes, which recomputes the totals of
+many orders with one UPDATE and then their base-currency amounts. Inside
+``deferred_refresh()`` the signals only collect order ids, so bulk line
+edits refresh each order once.
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from fx.rates import NORMALIZED_AMOUNTS, normalize
+
+from . import analytics
+from .models import Order, OrderProduct
+
+_deferred = threading.local()
+
+
+def refresh_totals(order_ids):
+    """Set ``total_amount`` of the given orders to the sum of their lines."""
+    order_ids = {order_id for order_id in order_ids if order_id}
+    if not order_ids:
+        return 0
+    lines_total = (
+        OrderProduct.objects
+        .filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum('total_price'))
+        .values('total')
+    )
+    orders = Order.objects.filter(pk__in=order_ids)
+    updated = orders.update(
+        total_amount=Coalesce(
+            Subquery(lines_total, output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0.00')),
+        ),
+    )
+    spec = next(spec for spec in NORMALIZED_AMOUNTS if spec.model == 'orders.Order')
+    normalize(spec, orders)
+    analytics.orders_changed(order_ids)
+    return updated
+
+
+def refresh_later(order_ids):
+    """Refresh now, or when the enclosing deferred_refresh() block exits."""
+    pending = getattr(_deferred, 'order_ids', None)
+    if pending is None:
+        with transaction.atomic():
+            return refresh_totals(order_ids)
+    pending.update(order_ids)
+    return 0
+
+
+@contextmanager
+def deferred_refresh():
+    if getattr(_deferred, 'order_ids', None) is not None:
+        yield
+        return
+    _deferred.order_ids = set()
+    try:
+        yield
+        order_ids = _deferred.order_ids
+    finally:
+        _deferred.order_ids = None
+    refresh_totals(order_ids)
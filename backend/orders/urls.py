@@ -0,0 +1,7 @@
+from rest_framework.routers import DefaultRouter
+from .views import OrderViewSet
+
+router = DefaultRouter()
+router.register(r'', OrderViewSet, basename='order')
+
+urlpatterns = router.urls
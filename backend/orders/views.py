@@ -1,3 +1,206 @@
-from django.shortcuts import render
+from datetime import timedelta
 
-# Create your views here.
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from fx.rates import base_currency
+from users.throttling import WriteRateThrottle
+from . import analytics
+from .invoices import document_status, schedule_documents
+from .lifecycle import status_summary, transition, transition_many
+from .models import Order, OrderEvent, OrderRevenueMonthly
+from .serializers import OrderEventSerializer, OrderSerializer, OrderTransitionSerializer
+from .sizes import GROUP_FIELDS as SIZE_GROUP_FIELDS, size_totals
+
+
+class OrderViewSet(viewsets.ModelViewSet):
+    """
+    Orders / proforma invoices with their lines
+    - ADMIN: all orders
+    - SELLER: orders for leads assigned to them
+    - BUYER: their own orders, read-only
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [WriteRateThrottle]
+    filterset_fields = ['status', 'currency', 'commercial_term', 'lead']
+    search_fields = ['pi_number', 'buyer_name', 'buyer_company', 'buyer_email']
+    ordering_fields = ['created_at', 'pi_date', 'total_amount', 'total_amount_base', 'status']
+
+    def get_queryset(self):
+        # Lines and their sizes in two extra queries for the whole page; per-order line
+        # aggregates computed by the list query itself.
+        return self.visible_orders().order_by('-created_at').prefetch_related('products__sizes').annotate(
+            line_count=Count('products'),
+            total_quantity=Sum('products__quantity'),
+        )
+
+    def visible_orders(self):
+        user = self.request.user
+        role = getattr(user, 'role', '').upper()
+        if role == 'ADMIN':
+            return Order.objects.all()
+        if role == 'SELLER':
+            return Order.objects.filter(lead__assigned_to=user)
+        if role == 'BUYER':
+            return Order.objects.filter(lead__user=user)
+        return Order.objects.none()
+
+    def check_permissions(self, request):
+        super().check_permissions(request)
+        role = getattr(request.user, 'role', '').upper()
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and role not in ('ADMIN', 'SELLER'):
+            raise PermissionDenied('Only admin or seller users can manage orders')
+
+    def perform_create(self, serializer):
+        self._check_lead(serializer.validated_data['lead'])
+        order = self._save(serializer)
+        schedule_documents([order.pk])
+
+    def perform_update(self, serializer):
+        if 'lead' in serializer.validated_data:
+            self._check_lead(serializer.validated_data['lead'])
+        order = self._save(serializer)
+        schedule_documents([order.pk])
+
+    def _save(self, serializer):
+        # Order.save rejects illegal status changes; report them as a 400, not a 500
+        try:
+            return serializer.save()
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.message_dict if hasattr(exc, 'error_dict') else exc.messages)
+
+    @action(detail=True, methods=['get', 'post'], url_path='documents/(?P<kind>pi|invoice)')
+    def document(self, request, pk=None, kind=None):
+        """
+        GET: URL of the PI / commercial invoice PDF if it is up to date with
+        the order, otherwise 202 while it is rendered in the background.
+        POST: render it again even if unchanged.
+        """
+        order = self.get_object()
+        if request.method == 'POST':
+            schedule_documents([order.pk], kinds=(kind,), force=True)
+            return Response({'status': 'pending', 'url': None}, status=status.HTTP_202_ACCEPTED)
+        result = document_status(order, kind)
+        if result['status'] != 'ready':
+            schedule_documents([order.pk], kinds=(kind,))
+            return Response(result, status=status.HTTP_202_ACCEPTED)
+        return Response(result)
+
+    @action(detail=True, methods=['post'])
+    def transition(self, request, pk=None):
+        """Move an order to another status along the allowed transitions."""
+        order = self.get_object()
+        params = OrderTransitionSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        try:
+            transition(order, params.validated_data['status'], user=request.user, note=params.validated_data['note'])
+        except DjangoValidationError as exc:
+            raise ValidationError({'status': exc.messages})
+        return Response(self.get_serializer(self.get_queryset().get(pk=order.pk)).data)
+
+    @action(detail=False, methods=['post'], url_path='transition')
+    def bulk_transition(self, request):
+        """Move several orders (``ids``) to a status; none move if any of them cannot."""
+        params = OrderTransitionSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) for pk in ids):
+            raise ValidationError({'ids': 'Provide a list of order ids.'})
+        orders = self.visible_orders().filter(pk__in=ids)
+        try:
+            moved = transition_many(orders, params.validated_data['status'], user=request.user, note=params.validated_data['note'])
+        except DjangoValidationError as exc:
+            raise ValidationError({'status': exc.messages})
+        return Response({'moved': moved})
+
+    @action(detail=True, methods=['get'])
+    def events(self, request, pk=None):
+        """Status history of an order, oldest first."""
+        order = self.get_object()
+        queryset = OrderEvent.objects.filter(order=order).order_by('created_at', 'pk')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(OrderEventSerializer(page, many=True).data)
+        return Response(OrderEventSerializer(queryset, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def sizes(self, request):
+        """
+        Pieces per size over the lines of the orders matching the list filters
+        (e.g. ``?status=PRODUCTION``), optionally ``?group_by=style_number``.
+        """
+        group_by = request.query_params.get('group_by') or None
+        if group_by and group_by not in SIZE_GROUP_FIELDS:
+            raise ValidationError({'group_by': f'Use one of: {", ".join(SIZE_GROUP_FIELDS)}.'})
+        orders = self.filter_queryset(self.visible_orders())
+        return Response(size_totals(orders, group_by=group_by))
+
+    @action(detail=False, methods=['get'], url_path='status-summary')
+    def status_summary(self, request):
+        """Orders per status and average lead times, read from the status counters (admin only)."""
+        if getattr(request.user, 'role', '').upper() != 'ADMIN':
+            raise PermissionDenied('Only admin users can view order statistics')
+        return Response(status_summary())
+
+    @action(detail=False, methods=['get'], url_path='analytics/revenue')
+    def revenue(self, request):
+        """
+        Revenue from the monthly rollups (admin only). Query params: start/end
+        (YYYY-MM-DD, default the last year), group_by (period, currency,
+        commercial_term, buyer_company or status), period (month, quarter or
+        year), currency/commercial_term/buyer_company/status filters, and
+        include_cancelled. Also returns the current order count per status.
+        """
+        if getattr(request.user, 'role', '').upper() != 'ADMIN':
+            raise PermissionDenied('Only admin users can view order analytics')
+
+        params = request.query_params
+        end = self._parse_date(params, 'end') or timezone.localdate()
+        start = self._parse_date(params, 'start') or end - timedelta(days=365)
+        group_by = params.get('group_by') or 'period'
+        period = params.get('period', 'month')
+        if group_by not in analytics.GROUP_FIELDS:
+            raise ValidationError({'group_by': f'Use one of: {", ".join(analytics.GROUP_FIELDS)}.'})
+        if period not in analytics.PERIODS:
+            raise ValidationError({'period': f'Use one of: {", ".join(analytics.PERIODS)}.'})
+
+        rollups = OrderRevenueMonthly.objects.filter(month__gte=analytics.month_of(start), month__lte=end)
+        for field in ('currency', 'commercial_term', 'status'):
+            if params.get(field):
+                rollups = rollups.filter(**{field: params[field].upper()})
+        if params.get('buyer_company'):
+            rollups = rollups.filter(buyer_company=params['buyer_company'])
+        if not params.get('status') and params.get('include_cancelled', '').lower() not in ('1', 'true', 'yes'):
+            rollups = rollups.exclude(status='CANCELLED')
+
+        report = analytics.revenue_report(rollups, group_by=group_by, period=period)
+        pipeline = [{'status': row['status'], 'orders': row['orders']} for row in status_summary()]
+        return Response({
+            'start': start, 'end': end, 'base_currency': base_currency(),
+            **report, 'pipeline': pipeline,
+        })
+
+    @staticmethod
+    def _parse_date(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Use the YYYY-MM-DD format.'})
+        return parsed
+
+    def _check_lead(self, lead):
+        user = self.request.user
+        if user.role != 'ADMIN' and lead.assigned_to_id != user.pk:
+            raise PermissionDenied('You can only manage orders for leads assigned to you')
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
+from users.throttling import WriteRateThrottle
 from .models import Product
 from .serializers import ProductSerializer
 from rest_framework.decorators import action
@@ -23,6 +24,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]  # we'll enforce create/update permissions manually
+    throttle_classes = [WriteRateThrottle]
     filterset_fields = ['category', 'sub_category']
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'name', 'moq']
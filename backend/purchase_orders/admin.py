@@ -27,7 +27,7 @@ class PurchaseOrderAdmin(admin.ModelAdmin):
             'fields': ('po_number', 'supplier', 'type', 'linked_order', 'status')
         }),
         ('Pricing & Delivery', {
-            'fields': ('total_amount', 'delivery_date')
+            'fields': ('total_amount', 'currency', 'delivery_date')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -1,6 +1,9 @@
 from django.db import models
 from django.db.models import Sum
 
+from documents.numbering import next_number
+from fx.rates import to_base
+
 
 class PurchaseOrder(models.Model):
     """
@@ -35,6 +38,11 @@ class PurchaseOrder(models.Model):
     
     # Pricing
     total_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default='USD')
+    total_amount_base = models.DecimalField(
+        max_digits=14, decimal_places=2, editable=False, null=True,
+        help_text='Total amount in the base currency (see fx/rates.py)'
+    )
     delivery_date = models.DateField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=PO_STATUS_CHOICES, default='DRAFT')
     
@@ -52,8 +60,9 @@ class PurchaseOrder(models.Model):
         is_new = self.pk is None
         
         if not self.po_number:
-            import time
-            self.po_number = f'PO-{int(time.time())}'
+            self.po_number = next_number('PO')
+        self.currency = (self.currency or '').upper()
+        self.total_amount_base = to_base(self.total_amount, self.currency, self.created_at)
         
         super().save(*args, **kwargs)
         
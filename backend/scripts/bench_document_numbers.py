@@ -0,0 +1,70 @@
+"""
+Benchmark for documents.numbering.
+
+Times 10k document numbers handed out one by one (outside and inside a
+transaction) and reserved at once for a bulk insert, then has several
+threads number documents in their own transactions at the same time and
+checks that no number was handed out twice.
+
+Usage: python scripts/bench_document_numbers.py [--count 10000] [--threads 8]
+"""
+import argparse
+import threading
+import time
+
+from benchutil import Timer, scratch_database
+
+from django.db import close_old_connections, transaction
+
+from documents.numbering import allocator, next_number, next_numbers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=10_000)
+    parser.add_argument('--threads', type=int, default=8)
+    options = parser.parse_args()
+
+    with scratch_database():
+        timer = Timer()
+        for _ in range(options.count):
+            with timer():
+                next_number('PI')
+        print(f'one by one                   {timer.summary()}')
+
+        allocator.clear()
+        timer = Timer()
+        with transaction.atomic():
+            for _ in range(options.count):
+                with timer():
+                    next_number('PO')
+        print(f'one by one, one transaction  {timer.summary()}')
+
+        start = time.perf_counter()
+        numbers = next_numbers('PI', options.count)
+        print(f'bulk reservation of {len(numbers):<8} {(time.perf_counter() - start) * 1e3:.1f}ms')
+
+        allocator.clear()
+        handed_out = []
+
+        def worker():
+            mine = []
+            for _ in range(options.count // options.threads // 10):
+                with transaction.atomic():
+                    mine.extend(next_number('XX') for _ in range(10))
+            handed_out.extend(mine)
+            close_old_connections()
+
+        threads = [threading.Thread(target=worker) for _ in range(options.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        print(f'{options.threads} threads, {len(handed_out)} numbers in {elapsed:.2f}s: '
+              f'{len(handed_out) - len(set(handed_out))} duplicates')
+
+
+if __name__ == '__main__':
+    main()
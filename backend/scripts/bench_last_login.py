@@ -0,0 +1,108 @@
+"""
+Contention benchmark for users.last_login.
+
+Worker threads issue logins for a pool of users while another thread keeps
+making small writes, once with last_login written on every login
+(``flush_interval=0``) and once through the buffer. Reports the login
+latency, the latency of the competing writes and the number of last_login
+UPDATE statements.
+
+Usage: python scripts/bench_last_login.py [--threads 8] [--logins 500] [--users 2000]
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import timedelta
+
+from benchutil import Timer, scratch_database
+
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from users.last_login import LastLoginBuffer
+from users.models import User
+
+
+class UpdateCounter:
+    """Counts last_login UPDATEs on every connection, whichever thread opens it."""
+
+    def __init__(self):
+        self.updates = 0
+        self.lock = threading.Lock()
+        connection_created.connect(self.attach)
+        self.attach(connection=connection)
+
+    def attach(self, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.startswith('UPDATE') and 'last_login' in sql:
+            with self.lock:
+                self.updates += 1
+        return execute(sql, params, many, context)
+
+
+def run(mode, options, counter):
+    User.objects.update(last_login=None)
+    buffer = LastLoginBuffer(flush_interval=0 if mode == 'direct' else 0.5, granularity=0)
+    users = list(User.objects.only('pk', 'last_login'))
+    counter.updates = 0
+    logins, writes = Timer(), Timer()
+    stop = threading.Event()
+
+    def login_worker(seed):
+        rng = random.Random(seed)
+        for _ in range(options.logins):
+            user = rng.choice(users)
+            with logins():
+                buffer.record(user, timezone.now())
+        close_old_connections()
+
+    def competing_writer():
+        target = users[0]
+        while not stop.is_set():
+            with writes():
+                User.objects.filter(pk=target.pk).update(date_joined=timezone.now() - timedelta(days=1))
+            time.sleep(0.002)
+        close_old_connections()
+
+    threads = [threading.Thread(target=login_worker, args=(seed,)) for seed in range(options.threads)]
+    writer = threading.Thread(target=competing_writer)
+    start = time.perf_counter()
+    writer.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.shutdown()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    writer.join()
+
+    total = options.threads * options.logins
+    print(f'{mode:>8}: {total} logins in {elapsed:.2f}s ({total / elapsed:,.0f}/s), '
+          f'{counter.updates} last_login UPDATEs')
+    print(f'          logins  {logins.summary()}')
+    print(f'          writes  {writes.summary()}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=500, help='Logins per thread')
+    parser.add_argument('--users', type=int, default=2000)
+    options = parser.parse_args()
+
+    with scratch_database():
+        User.objects.bulk_create([
+            User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(options.users)
+        ])
+        counter = UpdateCounter()
+        for mode in ('direct', 'buffered'):
+            run(mode, options, counter)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark for leads.intake.
+
+Ingests submissions one per call (like single form posts) and in batches
+(like the batch endpoint), with a share of resubmitted duplicates, and
+reports leads per second and how many leads and merges resulted.
+
+Usage: python scripts/bench_lead_intake.py [--rows 10000] [--batch 200] [--duplicates 0.1]
+"""
+import argparse
+import random
+import time
+
+from benchutil import Timer, scratch_database
+
+from leads.intake import ingest_leads
+from leads.models import Lead, LeadHistory
+from users.models import User
+
+
+def submissions(count, duplicates, prefix):
+    rows = []
+    for i in range(count):
+        if rows and random.random() < duplicates:
+            rows.append(dict(random.choice(rows)))
+        else:
+            rows.append({
+                'name': f'Buyer {i}',
+                'email': f'{prefix}{i}@example.com',
+                'country': random.choice(['DE', 'US', 'FR', 'IN']),
+                'product_type': random.choice(['T-shirt', 'Hoodie', 'Polo']),
+                'quantity': random.randint(100, 5000),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--duplicates', type=float, default=0.1, help='Share of resubmitted rows')
+    options = parser.parse_args()
+    random.seed(1)
+
+    with scratch_database():
+        User.objects.bulk_create([
+            User(username=f'seller{i}', email=f'seller{i}@example.com', role='SELLER') for i in range(10)
+        ])
+
+        single = submissions(options.rows // 10, options.duplicates, 'single')
+        timer = Timer()
+        start = time.perf_counter()
+        for row in single:
+            with timer():
+                ingest_leads([row])
+        elapsed = time.perf_counter() - start
+        print(f'one per call   {len(single) / elapsed:8.0f} rows/s  {timer.summary()}')
+
+        batched = submissions(options.rows, options.duplicates, 'batch')
+        timer = Timer()
+        start = time.perf_counter()
+        for i in range(0, len(batched), options.batch):
+            with timer():
+                ingest_leads(batched[i:i + options.batch])
+        elapsed = time.perf_counter() - start
+        print(f'batches of {options.batch:<4}{len(batched) / elapsed:8.0f} rows/s  {timer.summary()}')
+
+        merged = LeadHistory.objects.filter(action='Duplicate inquiry merged').count()
+        print(f'{len(single) + len(batched)} submissions: {Lead.objects.count()} leads, {merged} merged duplicates')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark for costings.pricing at scale.
+
+Loads ``--rows`` costings with correct prices into a throwaway database,
+makes ``--drift`` percent of them stale with a QuerySet.update(), then times
+the drift scan, a drift-only recalculation and a full recalculation, and
+checks that nothing is left drifted and that only the stale costings got a
+revision.
+
+Usage: python scripts/bench_recalculate_costings.py [--rows 500000] [--drift 1] [--eur 10]
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from benchutil import scratch_database
+
+from costings.models import Costing, CostingRevision
+from costings.pricing import drifted, exw_price, recalculate
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    result = function()
+    print(f'{label:<28} {time.perf_counter() - start:7.2f}s  ({result})')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--drift', type=float, default=1, help='Percentage of costings made stale')
+    parser.add_argument('--eur', type=float, default=10, help='Percentage of costings in EUR')
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+    rng = random.Random(options.seed)
+
+    def cents(low, high):
+        return Decimal(rng.randint(low, high)).scaleb(-2)
+
+    with scratch_database():
+        start = time.perf_counter()
+        batch = []
+        for i in range(options.rows):
+            values = {
+                'fabric_cost': cents(100, 2000), 'fabric_consumption': cents(50, 300), 'trim_cost': cents(0, 300),
+                'cm_cost': cents(100, 1500), 'packing_cost': cents(0, 100), 'overhead_cost': cents(0, 200),
+                'profit_margin': cents(500, 4000),
+            }
+            price = exw_price(**values)
+            batch.append(Costing(
+                style_name=f'Style {i}', style_number=f'S-{i}', exw_price=price, total_price=price,
+                currency='EUR' if rng.random() * 100 < options.eur else 'USD', **values,
+            ))
+            if len(batch) == 5000:
+                Costing.objects.bulk_create(batch)
+                batch = []
+        Costing.objects.bulk_create(batch)
+        print(f'{"load":<28} {time.perf_counter() - start:7.2f}s  ({options.rows} costings)')
+
+        ids = list(Costing.objects.values_list('pk', flat=True))
+        stale = rng.sample(ids, int(len(ids) * options.drift / 100))
+        for offset in range(0, len(stale), 5000):
+            Costing.objects.filter(pk__in=stale[offset:offset + 5000]).update(cm_cost=Decimal('99.99'))
+
+        timed('drift scan', lambda: drifted(Costing.objects.all()).count())
+        timed('drift-only recalculation', lambda: recalculate(
+            Costing.objects.filter(pk__in=drifted(Costing.objects.all()).values('pk'))
+        ))
+        timed('full recalculation', lambda: recalculate(Costing.objects.all()))
+        print(f'drifted afterwards: {drifted(Costing.objects.all()).count()}, '
+              f'revisions: {CostingRevision.objects.count()} for {len(stale)} stale costings')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark for users.throttling.
+
+Measures the cost of a throttle check for allowed and for rejected
+requests, then has several threads hammer one bucket at once and checks
+that exactly the bucket's capacity was allowed (no lost updates).
+
+Usage: python scripts/bench_throttle.py [--checks 5000] [--threads 8] [--rate 100/hour]
+"""
+import argparse
+import threading
+
+from benchutil import Timer, scratch_database
+
+from django.db import close_old_connections
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from users.throttling import TokenBucketRateThrottle
+
+
+def throttle_class(rate):
+    return type('BenchThrottle', (TokenBucketRateThrottle,), {'scope': 'bench', 'THROTTLE_RATES': {'bench': rate}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checks', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rate', default='100/hour', help='Bucket size for the contention run')
+    options = parser.parse_args()
+    factory = RequestFactory()
+
+    def request(ip):
+        return Request(factory.post('/', REMOTE_ADDR=ip))
+
+    with scratch_database():
+        # Allowed: a fresh bucket per client, then one token taken from each
+        generous = throttle_class(f'{options.checks}/min')
+        timer = Timer()
+        for i in range(options.checks):
+            with timer():
+                generous().allow_request(request(f'10.0.{i // 250}.{i % 250}'), None)
+        print(f'first request per client   {timer.summary()}')
+        timer = Timer()
+        for i in range(options.checks):
+            with timer():
+                generous().allow_request(request(f'10.0.{i // 250}.{i % 250}'), None)
+        print(f'allowed, existing bucket   {timer.summary()}')
+
+        strict = throttle_class('1/hour')
+        strict().allow_request(request('10.9.9.9'), None)
+        timer = Timer()
+        for _ in range(options.checks):
+            with timer():
+                strict().allow_request(request('10.9.9.9'), None)
+        print(f'rejected                   {timer.summary()}')
+
+        contended = throttle_class(options.rate)
+        results = []
+
+        def worker():
+            for _ in range(options.checks // options.threads):
+                results.append(contended().allow_request(request('10.8.8.8'), None))
+            close_old_connections()
+
+        threads = [threading.Thread(target=worker) for _ in range(options.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        capacity = contended().num_requests
+        print(f'{options.threads} threads on one bucket of {capacity}: '
+              f'{sum(results)} of {len(results)} allowed')
+
+
+if __name__ == '__main__':
+    main()
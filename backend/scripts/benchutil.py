@@ -0,0 +1,59 @@
+"""
+Helpers shared by the benchmark scripts in this directory.
+
+Importing this module sets up Django. ``scratch_database`` runs a benchmark
+against a throwaway file-backed SQLite database (migrated like the test
+database), so benchmarks never touch db.sqlite3 and threads share the data.
+"""
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+
+@contextlib.contextmanager
+def scratch_database():
+    with tempfile.TemporaryDirectory() as directory:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+class Timer:
+    """Collects durations (in seconds) of timed blocks."""
+
+    def __init__(self):
+        self.samples = []
+
+    @contextlib.contextmanager
+    def __call__(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    def summary(self):
+        if not self.samples:
+            return 'no samples'
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (
+            f'n={len(ordered)} mean={statistics.mean(ordered) * 1e3:.3f}ms '
+            f'p50={statistics.median(ordered) * 1e3:.3f}ms p95={p95 * 1e3:.3f}ms'
+        )
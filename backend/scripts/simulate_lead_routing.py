@@ -0,0 +1,78 @@
+"""
+Routing simulation for leads.assignment.
+
+Assigns a stream of unsaved leads to a pool of sellers in intake-sized
+batches, updating the open-lead counters after each batch as intake does,
+and reports the time taken and how evenly the leads were spread. With
+``--rules`` the first seller also gets a routing rule for one country, so
+the spread is reported for the routed and the unrouted leads separately.
+
+Usage: python scripts/simulate_lead_routing.py [--leads 100000] [--sellers 5] [--batch-size 500]
+                                               [--strategy least_open|round_robin] [--rules]
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from benchutil import scratch_database
+
+from django.db import transaction
+
+from leads.assignment import STRATEGIES, assign_leads, record_new_leads
+from leads.models import Lead, LeadRoutingRule, SellerWorkload
+from users.models import User
+
+COUNTRIES = ['DE', 'FR', 'US', 'GB', 'NL', 'IT']
+PRODUCT_TYPES = ['T-shirt', 'Hoodie', 'Kaftan', 'Dress']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=100_000)
+    parser.add_argument('--sellers', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--strategy', choices=STRATEGIES, default='least_open')
+    parser.add_argument('--rules', action='store_true', help='Route one country to the first seller')
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+    rng = random.Random(options.seed)
+
+    with scratch_database():
+        sellers = User.objects.bulk_create([
+            User(username=f'seller{i}', email=f'seller{i}@example.com', role='SELLER')
+            for i in range(options.sellers)
+        ])
+        if options.rules:
+            LeadRoutingRule.objects.create(country=COUNTRIES[0], seller=sellers[0])
+
+        leads = [
+            Lead(name=f'Lead {i}', email=f'lead{i}@example.com',
+                 country=rng.choice(COUNTRIES), product_type=rng.choice(PRODUCT_TYPES))
+            for i in range(options.leads)
+        ]
+        start = time.perf_counter()
+        for offset in range(0, len(leads), options.batch_size):
+            batch = leads[offset:offset + options.batch_size]
+            with transaction.atomic():
+                assign_leads(batch, strategy=options.strategy)
+                record_new_leads(batch)
+        elapsed = time.perf_counter() - start
+
+        print(f'{options.leads:,} leads over {options.sellers} sellers ({options.strategy}, '
+              f'batches of {options.batch_size}): {elapsed:.2f}s')
+        groups = {'all': leads}
+        if options.rules:
+            groups = {
+                f'{COUNTRIES[0]} (routed)': [lead for lead in leads if lead.country == COUNTRIES[0]],
+                'other countries': [lead for lead in leads if lead.country != COUNTRIES[0]],
+            }
+        for label, group in groups.items():
+            counts = Counter(lead.assigned_to_id for lead in group)
+            print(f'  {label}: {dict(sorted(counts.items()))} spread={max(counts.values()) - min(counts.values())}')
+        counters = dict(SellerWorkload.objects.values_list('seller_id', 'open_leads'))
+        print(f'  open-lead counters: {dict(sorted(counters.items()))}')
+
+
+if __name__ == '__main__':
+    main()
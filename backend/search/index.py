@@ -0,0 +1,128 @@
+"""
+Word-token prefix search, shared by the user directory (users/search.py)
+and lead search (leads/search.py).
+
+The searchable text of an object is split into lowercase word tokens stored
+in a token model: one row per object and token, with an index on
+``(token, object)``. A search term matches a token when it is a prefix of
+it; an object must match every term, and results are ranked by the number
+of terms that match a word exactly.
+
+Prefix lookups are range scans on the token index. SQLite compares text by
+code point, so the prefix range is ``term <= token < term + U+10FFFF``.
+PostgreSQL collations other than C do not order text that way, so there a
+term is matched with ``LIKE 'term%'``, which a ``varchar_pattern_ops``
+index on the token column answers (see the token index migrations). Other
+databases need a binary collation on the token column.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Count, Q
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TOKEN_MAX_LENGTH = 64
+
+# Highest code point, used as the exclusive upper bound of a prefix range.
+_PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+def tokenize(text):
+    """Split text into unique lowercase word tokens, keeping their order."""
+    if not text:
+        return []
+    return list(dict.fromkeys(token[:TOKEN_MAX_LENGTH] for token in TOKEN_RE.findall(str(text).lower())))
+
+
+def prefix_filter(field, term):
+    """Q matching values of ``field`` that start with ``term``, answerable from the token index."""
+    if connection.vendor == 'postgresql':
+        return Q(**{f'{field}__startswith': term})
+    return Q(**{f'{field}__gte': term, f'{field}__lt': term + _PREFIX_UPPER_BOUND})
+
+
+class TokenIndex:
+    """
+    Search tokens of one model, stored in ``token_model`` (with a ``token``
+    field and a foreign key named ``owner`` to the indexed model). At most
+    ``max_tokens`` tokens are kept per object, taken in field order.
+    """
+
+    def __init__(self, token_model, owner, fields, max_tokens=None):
+        self.token_model = token_model
+        self.owner = owner
+        self.fields = tuple(fields)
+        self.max_tokens = max_tokens
+        self.related_name = token_model._meta.get_field(owner).remote_field.related_name
+
+    def tokens(self, values):
+        """Tokens of an object, given the object or a dict of its searchable fields."""
+        get = values.get if isinstance(values, dict) else lambda field: getattr(values, field, '')
+        tokens = dict.fromkeys(token for field in self.fields for token in tokenize(get(field)))
+        return set(list(tokens)[:self.max_tokens])
+
+    def _rows(self, pk, values):
+        owner_id = f'{self.owner}_id'
+        return [self.token_model(**{owner_id: pk, 'token': token}) for token in self.tokens(values)]
+
+    def _replace(self, pks, rows, batch_size):
+        self.token_model.objects.filter(**{f'{self.owner}_id__in': pks}).delete()
+        self.token_model.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+
+    def index(self, objects, batch_size=1000):
+        """Replace the tokens of the given saved objects."""
+        objects = list(objects)
+        if objects:
+            self._replace(
+                [obj.pk for obj in objects],
+                [row for obj in objects for row in self._rows(obj.pk, obj)],
+                batch_size,
+            )
+
+    def index_saved(self, instance, created=False, update_fields=None, before=None):
+        """
+        post_save hook: re-index ``instance`` unless the save cannot have
+        changed its tokens (``before`` optionally maps fields to their values
+        when the instance was loaded).
+        """
+        if update_fields is not None and not set(update_fields) & set(self.fields):
+            return
+        if not created and before is not None and all(
+            field in before and before[field] == getattr(instance, field) for field in self.fields
+        ):
+            return
+        self.index([instance])
+
+    def rebuild(self, queryset, batch_size=1000):
+        """Re-index every object in the queryset. Returns the number of objects indexed."""
+        count = 0
+        pks, rows = [], []
+        for values in queryset.values('pk', *self.fields).iterator(chunk_size=batch_size):
+            pks.append(values['pk'])
+            rows.extend(self._rows(values['pk'], values))
+            if len(pks) >= batch_size:
+                self._replace(pks, rows, batch_size)
+                count += len(pks)
+                pks, rows = [], []
+        if pks:
+            self._replace(pks, rows, batch_size)
+            count += len(pks)
+        return count
+
+    def search(self, queryset, query):
+        """
+        Filter a queryset of the indexed model to objects matching every term
+        of the query as a word prefix, ranked by the number of terms that
+        match a word exactly (ties newest first).
+        """
+        terms = tokenize(query)
+        if not terms:
+            return queryset
+
+        for term in terms:
+            matching = self.token_model.objects.filter(prefix_filter('token', term)).values(f'{self.owner}_id')
+            queryset = queryset.filter(pk__in=matching)
+
+        return queryset.annotate(
+            search_rank=Count(self.related_name, filter=Q(**{f'{self.related_name}__token__in': terms})),
+        ).order_by('-search_rank', '-created_at')
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import AdminUserListView, AdminUserDetailView
+from .views import AdminUserListView, AdminUserDetailView, AdminUserBulkStatusView, AdminUserExportView
 
 urlpatterns = [
     path('', AdminUserListView.as_view(), name='admin_user_list'),
     path('<int:pk>/', AdminUserDetailView.as_view(), name='admin_user_detail'),
+    path('bulk-status/', AdminUserBulkStatusView.as_view(), name='admin_user_bulk_status'),
+    path('export/', AdminUserExportView.as_view(), name='admin_user_export'),
 ]
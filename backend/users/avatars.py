@@ -0,0 +1,127 @@
+"""
+Avatar renditions.
+
+Uploaded avatars are kept as-is and normalized in a background thread pool:
+EXIF orientation is applied, the image is centre-cropped to a square and
+saved at each of AVATAR_SIZES as WebP and JPEG under a path containing a
+fingerprint of the original. Because the fingerprint changes with the
+content, rendition URLs never change meaning and can be cached forever.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SIZES = (32, 64, 128, 256)
+DEFAULT_AVATAR_SIZE = 128
+AVATAR_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='avatar')
+
+
+def rendition_path(user_id, fingerprint, size, ext):
+    return f'avatars/{user_id}/{fingerprint}/{size}.{ext}'
+
+
+def rendition_url(user, size=DEFAULT_AVATAR_SIZE, ext='jpg'):
+    """URL of the processed avatar closest to ``size``, or None if not processed yet."""
+    if not user.avatar or not user.avatar_fingerprint:
+        return None
+    size = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+    return default_storage.url(rendition_path(user.pk, user.avatar_fingerprint, size, ext))
+
+
+def rendition_urls(user):
+    """Map of size -> {ext: url} for every rendition of the user's avatar."""
+    if not user.avatar or not user.avatar_fingerprint:
+        return None
+    return {
+        size: {
+            ext: default_storage.url(rendition_path(user.pk, user.avatar_fingerprint, size, ext))
+            for ext, _, _ in AVATAR_FORMATS
+        }
+        for size in AVATAR_SIZES
+    }
+
+
+def delete_renditions(user_id, fingerprint):
+    if not fingerprint:
+        return
+    for size in AVATAR_SIZES:
+        for ext, _, _ in AVATAR_FORMATS:
+            default_storage.delete(rendition_path(user_id, fingerprint, size, ext))
+
+
+def process_avatar(user_id):
+    """Render all sizes of a user's current avatar and record its fingerprint."""
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id).only('avatar', 'avatar_fingerprint').first()
+    if user is None or not user.avatar:
+        return None
+
+    with user.avatar.open('rb') as source:
+        data = source.read()
+    fingerprint = hashlib.sha256(data).hexdigest()[:12]
+    if fingerprint == user.avatar_fingerprint:
+        return fingerprint
+
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for size in AVATAR_SIZES:
+            fitted = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for ext, image_format, options in AVATAR_FORMATS:
+                buffer = BytesIO()
+                fitted.save(buffer, image_format, **options)
+                path = rendition_path(user_id, fingerprint, size, ext)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                default_storage.save(path, ContentFile(buffer.getvalue()))
+
+    # Only publish the renditions if the avatar was not replaced meanwhile.
+    updated = (
+        User.objects
+        .filter(pk=user_id, avatar=user.avatar.name)
+        .update(avatar_fingerprint=fingerprint)
+    )
+    if not updated:
+        delete_renditions(user_id, fingerprint)
+        return None
+    if user.avatar_fingerprint:
+        delete_renditions(user_id, user.avatar_fingerprint)
+    return fingerprint
+
+
+def _process_in_background(user_id):
+    close_old_connections()
+    try:
+        process_avatar(user_id)
+    except Exception:
+        logger.exception('Failed to process avatar for user %s', user_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_avatar_processing(user):
+    """Queue rendition generation once the current transaction commits."""
+    transaction.on_commit(lambda: _executor.submit(_process_in_background, user.pk))
+
+
+def discard_avatar_files(user_id, avatar_name, fingerprint):
+    """Delete a replaced avatar original and its renditions once the transaction commits."""
+    def discard():
+        if avatar_name:
+            default_storage.delete(avatar_name)
+        delete_renditions(user_id, fingerprint)
+
+    transaction.on_commit(discard)
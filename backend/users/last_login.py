@@ -0,0 +1,114 @@
+"""
+Coalesced ``last_login`` writes.
+
+Issuing a token used to run one ``UPDATE users_user`` per login, which on
+SQLite queues behind every other writer. Logins are instead recorded in an
+in-process buffer and written out in a single ``bulk_update`` every
+``LAST_LOGIN_FLUSH_INTERVAL_SECONDS``, as soon as ``batch_size`` users are
+waiting, and when the process exits. Logins
+within ``LAST_LOGIN_UPDATE_GRANULARITY_SECONDS`` of the stored value are not
+recorded at all. Writes never move ``last_login`` backwards, so a flush
+cannot overwrite a newer value written elsewhere in the meantime.
+"""
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.db.models import DateTimeField, F, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginBuffer:
+    def __init__(self, flush_interval, granularity, batch_size=500):
+        self.flush_interval = flush_interval
+        self.granularity = timedelta(seconds=granularity)
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def record(self, user, when=None):
+        """Note that ``user`` logged in at ``when`` (defaults to now)."""
+        when = when or timezone.now()
+        if user.last_login and when - user.last_login < self.granularity:
+            return
+        user.last_login = when
+
+        if self.flush_interval <= 0:
+            get_user_model().objects.filter(
+                Q(last_login__isnull=True) | Q(last_login__lt=when), pk=user.pk,
+            ).update(last_login=when)
+            return
+
+        with self._lock:
+            self._pending[user.pk] = when
+            full = len(self._pending) >= self.batch_size
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write all buffered timestamps. Returns the number of users updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        User = get_user_model()
+        users = [User(pk=pk, last_login=self._latest(when)) for pk, when in pending.items()]
+        try:
+            User.objects.bulk_update(users, ['last_login'], batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Failed to flush %d last_login updates', len(users))
+            with self._lock:
+                for pk, when in pending.items():
+                    self._pending.setdefault(pk, when)
+            return 0
+        return len(users)
+
+    @staticmethod
+    def _latest(when):
+        value = Value(when, output_field=DateTimeField())
+        return Greatest(Coalesce(F('last_login'), value), value)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='last-login-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping:
+                # shutdown() does the final flush
+                break
+            close_old_connections()
+            self.flush()
+        # Worker threads own their DB connection; release it on exit.
+        connection.close()
+
+    def shutdown(self):
+        self._stopping = True
+        self._wakeup.set()
+        self.flush()
+
+
+last_login_buffer = LastLoginBuffer(
+    flush_interval=getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL_SECONDS', 30),
+    granularity=getattr(settings, 'LAST_LOGIN_UPDATE_GRANULARITY_SECONDS', 300),
+)
+atexit.register(last_login_buffer.shutdown)
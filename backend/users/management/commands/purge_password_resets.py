@@ -0,0 +1,51 @@
+"""
+Django management command to delete expired and used password reset requests
+Usage: python manage.py purge_password_resets [--retention-hours 24] [--batch-size 1000]
+
+Intended to run periodically (e.g. from cron). Rows are deleted in small
+batches, each in its own transaction, so concurrent resets are never blocked
+for long and a row that becomes active again between batches is left alone.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import PasswordResetRequest
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired and used password reset requests in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-hours',
+            type=int,
+            default=getattr(settings, 'PASSWORD_RESET_RETENTION_HOURS', 24),
+            help='Keep expired/used requests for this many hours (for auditing)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['retention_hours'])
+        batch_size = options['batch_size']
+        stale = Q(expires_at__lt=cutoff) | Q(used_at__lt=cutoff)
+
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    PasswordResetRequest.objects
+                    .filter(stale)
+                    .order_by()
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                count, _ = PasswordResetRequest.objects.filter(stale, pk__in=ids).delete()
+            deleted += count
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} password reset requests'))
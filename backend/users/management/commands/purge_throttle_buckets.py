@@ -0,0 +1,20 @@
+"""
+Django management command to delete throttle buckets that have refilled
+Usage: python manage.py purge_throttle_buckets
+
+Intended to run periodically (e.g. from cron). A refilled bucket behaves
+exactly like a missing one, so deleting it never changes a throttle decision.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.throttling import purge_buckets
+
+
+class Command(BaseCommand):
+    help = 'Deletes throttle buckets that have refilled'
+
+    def handle(self, *args, **options):
+        deleted = purge_buckets(time.time())
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} throttle buckets'))
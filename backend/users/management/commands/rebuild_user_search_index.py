@@ -0,0 +1,21 @@
+"""
+Django management command to rebuild the user directory search index
+Usage: python manage.py rebuild_user_search_index [--batch-size 1000]
+"""
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+
+from users.search import rebuild_index
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search tokens used by the admin user directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(User.objects.order_by('pk'), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} users'))
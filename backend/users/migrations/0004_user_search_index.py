@@ -0,0 +1,72 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:03
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copies of the tokenizer and searchable fields as of this migration
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+SEARCHABLE_FIELDS = ('email', 'first_name', 'last_name', 'company')
+
+
+def tokenize(text):
+    return {token[:64] for token in TOKEN_RE.findall(str(text or '').lower())}
+
+
+def build_search_index(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    UserSearchToken = apps.get_model('users', 'UserSearchToken')
+    batch = []
+    for row in User.objects.values('pk', *SEARCHABLE_FIELDS).iterator(chunk_size=1000):
+        tokens = set()
+        for field in SEARCHABLE_FIELDS:
+            tokens.update(tokenize(row[field]))
+        batch.extend(UserSearchToken(user_id=row['pk'], token=token) for token in tokens)
+        if len(batch) >= 5000:
+            UserSearchToken.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        UserSearchToken.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_user_approval_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'approval_status', '-created_at'], name='user_role_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['approval_status', '-created_at'], name='user_status_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='usersearchtoken',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='usersearchtoken',
+            index=models.Index(fields=['token', 'user'], name='user_search_token_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='usersearchtoken',
+            constraint=models.UniqueConstraint(fields=('user', 'token'), name='unique_user_search_token'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
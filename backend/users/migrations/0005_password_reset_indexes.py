@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passwordresetrequest',
+            index=models.Index(fields=['user', 'used_at', '-created_at'], name='pwreset_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetrequest',
+            index=models.Index(fields=['expires_at'], name='pwreset_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresetrequest',
+            index=models.Index(fields=['used_at'], name='pwreset_used_idx'),
+        ),
+    ]
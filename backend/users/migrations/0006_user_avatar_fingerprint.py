@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_password_reset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Content hash of the processed avatar renditions', max_length=16),
+        ),
+    ]
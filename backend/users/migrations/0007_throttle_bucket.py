@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-19 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_avatar_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.FloatField()),
+                ('full_at', models.FloatField(help_text='When the bucket has refilled and the row can be purged')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['full_at'], name='throttle_bucket_full_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:00
+
+from django.db import migrations
+
+INDEX_NAME = 'user_search_token_like_idx'
+
+
+def create_pattern_index(apps, schema_editor):
+    """On PostgreSQL, index tokens for LIKE 'prefix%' lookups whatever the collation (see search/index.py)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('users', 'UserSearchToken')._meta.db_table
+    schema_editor.execute(
+        f'CREATE INDEX {schema_editor.quote_name(INDEX_NAME)} '
+        f'ON {schema_editor.quote_name(table)} (token varchar_pattern_ops)'
+    )
+
+
+def drop_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(INDEX_NAME)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_throttle_bucket'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_pattern_index, drop_pattern_index),
+    ]
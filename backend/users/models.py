@@ -32,6 +32,7 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, blank=True)
     company = models.CharField(max_length=255, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True)
+    avatar_fingerprint = models.CharField(max_length=16, blank=True, editable=False, help_text='Content hash of the processed avatar renditions')
     created_at = models.DateTimeField(auto_now_add=True)
     approval_status = models.CharField(max_length=20, choices=APPROVAL_STATUS_CHOICES, default='APPROVED')
     approval_notes = models.TextField(blank=True)
@@ -46,6 +47,10 @@ class User(AbstractUser):
         ordering = ['-created_at']
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(fields=['role', 'approval_status', '-created_at'], name='user_role_status_idx'),
+            models.Index(fields=['approval_status', '-created_at'], name='user_status_created_idx'),
+        ]
     
     def __str__(self):
         return f'{self.get_full_name() or self.email} ({self.get_role_display()})'
@@ -67,6 +72,27 @@ class User(AbstractUser):
         return self.role == 'ADMIN'
 
 
+class UserSearchToken(models.Model):
+    """
+    Inverted index of lowercase words from a user's email, name and company.
+    Kept in sync by the signals in users/signals.py and used for prefix search.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'token'], name='unique_user_search_token'),
+        ]
+        indexes = [
+            models.Index(fields=['token', 'user'], name='user_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.token} -> {self.user_id}'
+
+
 class PasswordResetRequest(models.Model):
     """Stores password reset OTPs and tokens for email verification."""
 
@@ -81,6 +107,13 @@ class PasswordResetRequest(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Active request lookup in the verify/request views
+            models.Index(fields=['user', 'used_at', '-created_at'], name='pwreset_user_active_idx'),
+            # Sweeps by purge_password_resets
+            models.Index(fields=['expires_at'], name='pwreset_expires_idx'),
+            models.Index(fields=['used_at'], name='pwreset_used_idx'),
+        ]
 
     def __str__(self):
         return f'Password reset for {self.user.email} at {self.created_at:%Y-%m-%d %H:%M}'
@@ -88,3 +121,25 @@ class PasswordResetRequest(models.Model):
     @property
     def is_expired(self):
         return timezone.now() > self.expires_at
+
+
+class ThrottleBucket(models.Model):
+    """
+    Token bucket of one throttle scope and client, shared by all worker
+    processes. Buckets are only changed by conditional UPDATEs (see
+    users/throttling.py), so concurrent requests never lose a token.
+    Times are Unix timestamps.
+    """
+
+    key = models.CharField(max_length=255, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()
+    full_at = models.FloatField(help_text='When the bucket has refilled and the row can be purged')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['full_at'], name='throttle_bucket_full_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.key}: {self.tokens:.2f}'
@@ -0,0 +1,47 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+
+logger = logging.getLogger(__name__)
+
+
+def build_status_email(user, approved=True):
+    """Return the ``(subject, message, from_email, recipients)`` approval email for a user."""
+    subject = 'Your Prime Apparel account has been approved' if approved else 'Update on your Prime Apparel account'
+    if approved:
+        message = (
+            f"Hello {user.get_full_name() or 'there'},\n\n"
+            "Your seller/designer account has been approved by our team. "
+            "You can now log in and start using the Prime Apparel platform.\n\n"
+            "Thank you for partnering with us!"
+        )
+    else:
+        notes = user.approval_notes or 'Unfortunately, we could not approve your account at this time.'
+        message = (
+            f"Hello {user.get_full_name() or 'there'},\n\n"
+            "We reviewed your seller/designer application but could not approve it at this time.\n"
+            f"Reason: {notes}\n\n"
+            "If you believe this is a mistake or wish to re-apply, please contact our support team."
+        )
+
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@primeapparel.local')
+    return subject, message, from_email, [user.email]
+
+
+def queue_status_emails(users, approved=True):
+    """Send approval emails for many users over one connection, off the request thread."""
+    messages = [build_status_email(user, approved=approved) for user in users if user.email]
+    if not messages:
+        return None
+    thread = threading.Thread(target=_deliver, args=(messages,), name='status-emails', daemon=True)
+    thread.start()
+    return thread
+
+
+def _deliver(messages):
+    try:
+        send_mass_mail(messages, fail_silently=False)
+    except Exception:
+        logger.exception('Failed to send %d approval notifications', len(messages))
@@ -0,0 +1,34 @@
+"""
+Prefix search over the user directory.
+
+Every user is broken into lowercase word tokens (email, first/last name and
+company) stored in ``UserSearchToken``. A search term matches a token when it
+is a prefix of it, which is answered with an index range scan on
+``(token, user)`` instead of a ``LIKE '%term%'`` scan over the users table
+(see search/index.py).
+"""
+from search.index import TokenIndex
+
+from .models import UserSearchToken
+
+SEARCHABLE_FIELDS = ('email', 'first_name', 'last_name', 'company')
+
+user_index = TokenIndex(UserSearchToken, 'user', SEARCHABLE_FIELDS)
+
+
+def index_user(user):
+    """Bring the search tokens of a single user in line with its fields."""
+    user_index.index([user])
+
+
+def rebuild_index(queryset, batch_size=1000):
+    """Re-index every user in the queryset. Returns the number of users indexed."""
+    return user_index.rebuild(queryset, batch_size=batch_size)
+
+
+def search_users(queryset, query):
+    """
+    Filter a user queryset to users matching every term of the query as a
+    word prefix, ranked by the number of terms that match a word exactly.
+    """
+    return user_index.search(queryset, query)
@@ -6,6 +6,15 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 import requests
 from django.conf import settings
 
+from .avatars import (
+    DEFAULT_AVATAR_SIZE,
+    discard_avatar_files,
+    rendition_url,
+    rendition_urls,
+    schedule_avatar_processing,
+)
+from .last_login import last_login_buffer
+
 User = get_user_model()
 
 
@@ -15,25 +24,47 @@ class UserSerializer(serializers.ModelSerializer):
     role = serializers.SerializerMethodField()
     role_label = serializers.CharField(source='get_role_display', read_only=True)
     avatar = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
     approval_status_label = serializers.CharField(source='get_approval_status_display', read_only=True)
 
     class Meta:
         model = User
         fields = [
             'id', 'email', 'username', 'first_name', 'last_name',
-            'role', 'role_label', 'phone', 'company', 'avatar', 'created_at',
+            'role', 'role_label', 'phone', 'company', 'avatar', 'avatar_variants', 'created_at',
             'approval_status', 'approval_status_label', 'approval_notes', 'is_active',
         ]
         read_only_fields = ['id', 'created_at']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        # Eight URLs per user: only sent by detail views or when a list asks for them
+        if not self.context.get('avatar_variants'):
+            fields.pop('avatar_variants')
+        return fields
+
     def get_role(self, obj):
         return obj.role
 
     def get_avatar(self, obj):
+        """JPEG rendition at the context's `avatar_size`, or the original until it is processed."""
         if not obj.avatar:
             return None
+        size = self.context.get('avatar_size', DEFAULT_AVATAR_SIZE)
+        return self._absolute_url(rendition_url(obj, size) or obj.avatar.url)
+
+    def get_avatar_variants(self, obj):
+        """Every rendition as size -> {format: url}; only included if the context sets `avatar_variants`."""
+        variants = rendition_urls(obj)
+        if not variants:
+            return None
+        return {
+            size: {ext: self._absolute_url(url) for ext, url in urls.items()}
+            for size, urls in variants.items()
+        }
+
+    def _absolute_url(self, url):
         request = self.context.get('request') if hasattr(self, 'context') else None
-        url = obj.avatar.url
         if request:
             return request.build_absolute_uri(url)
         return url
@@ -59,8 +90,10 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         remove_avatar = validated_data.pop('remove_avatar', False)
         avatar = validated_data.pop('avatar', None)
 
+        previous_avatar = instance.avatar.name if instance.avatar else ''
+        previous_fingerprint = instance.avatar_fingerprint
+
         if remove_avatar and instance.avatar:
-            instance.avatar.delete(save=False)
             instance.avatar = None
 
         for attr, value in validated_data.items():
@@ -69,7 +102,16 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         if avatar is not None:
             instance.avatar = avatar
 
+        avatar_changed = (remove_avatar and previous_avatar) or avatar is not None
+        if avatar_changed:
+            instance.avatar_fingerprint = ''
+
         instance.save()
+
+        if avatar_changed:
+            discard_avatar_files(instance.pk, previous_avatar, previous_fingerprint)
+        if avatar is not None:
+            schedule_avatar_processing(instance)
         return instance
 
 
@@ -91,6 +133,14 @@ class AdminUserUpdateSerializer(serializers.ModelSerializer):
         }
 
 
+class AdminUserBulkStatusSerializer(serializers.Serializer):
+    """Payload for moderating many users in one request."""
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
+    approval_status = serializers.ChoiceField(choices=User.APPROVAL_STATUS_CHOICES)
+    approval_notes = serializers.CharField(required=False, allow_blank=True)
+
+
 class ChangePasswordSerializer(serializers.Serializer):
     """Serializer for updating the user's password"""
 
@@ -234,6 +284,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             detail = self.user.approval_notes or 'Your account application was rejected. Please contact support for details.'
             raise AuthenticationFailed(detail)
 
+        last_login_buffer.record(self.user)
+
         # Add user data to the response
         data['user'] = UserSerializer(self.user, context=self.context).data
         
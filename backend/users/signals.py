@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .search import user_index
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User, dispatch_uid='users_index_search_tokens')
+def index_user_search_tokens(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Keep the user directory search index in sync with saved users."""
+    if raw:
+        return
+    user_index.index_saved(instance, created, update_fields)
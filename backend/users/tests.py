@@ -1,3 +1,439 @@
+import hashlib
+import io
+import tempfile
+import threading
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from .avatars import AVATAR_FORMATS, AVATAR_SIZES, process_avatar, rendition_path, rendition_url
+from .last_login import LastLoginBuffer
+from .models import PasswordResetRequest, ThrottleBucket, User, UserSearchToken
+from .search import search_users
+from .throttling import AnonBurstRateThrottle, LoginIdentifierRateThrottle
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Asserts SQLite query plans')
+class PasswordResetIndexTests(TestCase):
+    """The reset lookups and the purge sweep use the indexes of migration 0005 at a million rows."""
+
+    ROWS = 1_000_000
+    USERS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com') for i in range(cls.USERS)
+        ])
+        first_user = User.objects.order_by('pk').values_list('pk', flat=True).first()
+        table = PasswordResetRequest._meta.db_table
+        with connection.cursor() as cursor:
+            # Spread over users and the past 30 days; a tenth used, most expired
+            cursor.execute(f'''
+                WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < %s)
+                INSERT INTO {table} (user_id, otp_hash, token, created_at, expires_at, verified_at, used_at, attempt_count)
+                SELECT
+                    %s + n %% %s, 'hash', 'token-' || n,
+                    datetime('now', '-' || (n %% 43200) || ' minutes'),
+                    datetime('now', '-' || (n %% 43200) || ' minutes', '+10 minutes'),
+                    NULL,
+                    CASE WHEN n %% 10 = 0 THEN datetime('now', '-' || (n %% 43200) || ' minutes', '+5 minutes') END,
+                    0
+                FROM seq
+            ''', [cls.ROWS, first_user, cls.USERS])
+            cursor.execute('ANALYZE')
+        cls.user = User.objects.get(username='user7')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        for name in index_names:
+            self.assertIn(name, plan)
+
+    def test_row_count(self):
+        self.assertEqual(PasswordResetRequest.objects.count(), self.ROWS)
+
+    def test_active_request_lookup(self):
+        self.assertUsesIndex(
+            PasswordResetRequest.objects.filter(user=self.user, used_at__isnull=True).order_by('-created_at')[:1],
+            'pwreset_user_active_idx',
+        )
+
+    def test_purge_sweep(self):
+        cutoff = timezone.now() - timedelta(hours=24)
+        stale = Q(expires_at__lt=cutoff) | Q(used_at__lt=cutoff)
+        self.assertUsesIndex(
+            PasswordResetRequest.objects.filter(stale).order_by().values_list('pk', flat=True)[:1000],
+            'pwreset_expires_idx', 'pwreset_used_idx',
+        )
+
+
+class LastLoginBufferTests(TestCase):
+    """Logins are buffered and written in batches, never one UPDATE per login."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f'login{i}', email=f'login{i}@example.com') for i in range(3)
+        ])
+
+    def setUp(self):
+        self.buffer = LastLoginBuffer(flush_interval=3600, granularity=300)
+        self.now = timezone.now()
+
+    def tearDown(self):
+        self.buffer._stopping = True
+        self.buffer._wakeup.set()
+
+    def watch_flushes(self, buffer):
+        flushed = threading.Event()
+        patcher = mock.patch.object(buffer, 'flush', side_effect=flushed.set)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return flushed
+
+    def stored(self, user):
+        return User.objects.values_list('last_login', flat=True).get(pk=user.pk)
+
+    def test_skips_logins_within_granularity(self):
+        user = self.users[0]
+        user.last_login = self.now - timedelta(seconds=299)
+        with self.assertNumQueries(0):
+            self.buffer.record(user, self.now)
+        self.assertEqual(self.buffer._pending, {})
+        self.buffer.record(user, self.now + timedelta(seconds=1))
+        self.assertEqual(self.buffer._pending, {user.pk: self.now + timedelta(seconds=1)})
+
+    def test_flush_writes_buffered_logins_in_one_update(self):
+        with self.assertNumQueries(0):
+            for user in self.users:
+                self.buffer.record(user, self.now)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 3)
+        for user in self.users:
+            self.assertEqual(self.stored(user), self.now)
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_flush_keeps_newer_last_login(self):
+        user = self.users[0]
+        self.buffer.record(user, self.now)
+        User.objects.filter(pk=user.pk).update(last_login=self.now + timedelta(hours=1))
+        self.buffer.flush()
+        self.assertEqual(self.stored(user), self.now + timedelta(hours=1))
+
+    def test_failed_flush_requeues(self):
+        user = self.users[0]
+        self.buffer.record(user, self.now)
+        with mock.patch.object(User.objects, 'bulk_update', side_effect=DatabaseError('locked')), \
+                self.assertLogs('users.last_login', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer._pending, {user.pk: self.now})
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.stored(user), self.now)
+
+    def test_worker_flushes_on_interval(self):
+        buffer = LastLoginBuffer(flush_interval=0.05, granularity=300)
+        self.addCleanup(buffer.shutdown)
+        flushed = self.watch_flushes(buffer)
+        buffer.record(self.users[0], self.now)
+        self.assertTrue(flushed.wait(5))
+
+    def test_worker_flushes_on_threshold(self):
+        buffer = LastLoginBuffer(flush_interval=3600, granularity=300, batch_size=3)
+        self.addCleanup(buffer.shutdown)
+        flushed = self.watch_flushes(buffer)
+        for user in self.users[:2]:
+            buffer.record(user, self.now)
+        self.assertFalse(flushed.wait(0.1))
+        buffer.record(self.users[2], self.now)
+        self.assertTrue(flushed.wait(5))
+
+    def test_shutdown_flushes_and_stops_the_worker(self):
+        self.buffer.record(self.users[0], self.now)
+        worker = self.buffer._thread
+        self.assertTrue(worker.is_alive())
+        self.buffer.shutdown()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(self.stored(self.users[0]), self.now)
+        self.assertEqual(self.buffer._pending, {})
+
+    def test_login_does_not_update_the_user(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret-pass')
+        with mock.patch('users.serializers.last_login_buffer', self.buffer), CaptureQueriesContext(connection) as queries:
+            response = APIClient().post('/api/auth/login/', {'email': 'buyer@example.com', 'password': 'secret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('UPDATE "users_user"')])
+        self.assertEqual(list(self.buffer._pending), [user.pk])
+        self.assertIsNone(self.stored(user))
+        self.buffer.flush()
+        self.assertIsNotNone(self.stored(user))
+
+    def test_zero_interval_writes_immediately(self):
+        buffer = LastLoginBuffer(flush_interval=0, granularity=300)
+        user = self.users[0]
+        with self.assertNumQueries(1):
+            buffer.record(user, self.now)
+        self.assertEqual(self.stored(user), self.now)
+        self.assertIsNone(buffer._thread)
+        User.objects.filter(pk=user.pk).update(last_login=self.now + timedelta(hours=1))
+        buffer.record(user, self.now + timedelta(minutes=10))
+        self.assertEqual(self.stored(user), self.now + timedelta(hours=1))
+
+
+class AdminUserBulkStatusTests(TestCase):
+    """Accounts the bulk endpoint will not touch are reported as skipped, not missing."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', role='ADMIN')
+        self.other_admin = User.objects.create_user(username='admin2', email='admin2@example.com', role='ADMIN')
+        self.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', role='BUYER', approval_status='PENDING',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_results(self):
+        ids = [self.buyer.pk, self.other_admin.pk, self.admin.pk, 999_999]
+        response = self.client.post(
+            '/api/users/manage/bulk-status/', {'ids': ids, 'approval_status': 'REJECTED'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        results = {entry['id']: entry for entry in response.data['results']}
+        self.assertEqual(results[self.buyer.pk]['result'], 'updated')
+        self.assertEqual(results[self.other_admin.pk]['result'], 'skipped')
+        self.assertIn('reason', results[self.other_admin.pk])
+        self.assertEqual(results[self.admin.pk]['result'], 'skipped')
+        self.assertEqual(results[999_999], {'id': 999_999, 'result': 'not_found'})
+        self.other_admin.refresh_from_db()
+        self.assertNotEqual(self.other_admin.approval_status, 'REJECTED')
+
+
+class FixedClockThrottle:
+    """Mixin: a 2/min rate and a clock the test moves by hand."""
+
+    THROTTLE_RATES = {'anon': '2/min', 'login_identifier': '2/min'}
+    clock = 1_000_000.0
+
+    def timer(self):
+        return FixedClockThrottle.clock
+
+
+class TestAnonThrottle(FixedClockThrottle, AnonBurstRateThrottle):
+    pass
+
+
+class TestIdentifierThrottle(FixedClockThrottle, LoginIdentifierRateThrottle):
+    pass
+
+
+class ThrottledView(APIView):
+    authentication_classes = []
+    permission_classes = []
+    throttle_classes = [TestAnonThrottle, TestIdentifierThrottle]
+
+    def get(self, request):
+        return Response({})
+
+    def post(self, request):
+        return Response({})
+
+
+class ThrottleTests(TestCase):
+    """Token bucket throttling of anonymous writes and of login identifiers."""
+
+    def setUp(self):
+        FixedClockThrottle.clock = 1_000_000.0
+        self.factory = APIRequestFactory()
+
+    def post(self, data=None, ip='10.0.0.1'):
+        return ThrottledView.as_view()(self.factory.post('/', data or {}, format='json', REMOTE_ADDR=ip))
+
+    def test_denies_over_the_limit(self):
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(self.post().status_code, 200)
+        response = self.post()
+        self.assertEqual(response.status_code, 429)
+        # One token refills every 30 seconds at 2/min
+        self.assertEqual(response['Retry-After'], '30')
+        FixedClockThrottle.clock += 20
+        self.assertEqual(self.post()['Retry-After'], '10')
+        FixedClockThrottle.clock += 10
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(self.post(ip='10.0.0.2').status_code, 200)
+
+    def test_reads_are_not_throttled(self):
+        for _ in range(5):
+            response = ThrottledView.as_view()(self.factory.get('/', REMOTE_ADDR='10.0.0.1'))
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(ThrottleBucket.objects.exists())
+
+    def test_identifier_is_hashed(self):
+        identifier = 'x' * 1000 + '@example.com'
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            self.assertEqual(self.post({'identifier': identifier}, ip=ip).status_code, 200)
+        self.assertEqual(self.post({'identifier': identifier.upper()}, ip='10.0.0.3').status_code, 429)
+        keys = ThrottleBucket.objects.values_list('key', flat=True)
+        self.assertTrue(all(len(key) < 100 and 'example' not in key for key in keys))
+
+    def test_non_object_body(self):
+        response = ThrottledView.as_view()(self.factory.post('/', [1, 2], format='json', REMOTE_ADDR='10.0.0.1'))
+        self.assertEqual(response.status_code, 200)
+
+
+class UserSearchTests(TestCase):
+    """Word-prefix search over the user directory and the token index behind it."""
+
+    def setUp(self):
+        self.john = User.objects.create_user(
+            username='john', email='john.smith@acme.com', first_name='John', last_name='Smith', company='Acme Apparel',
+        )
+        self.jo = User.objects.create_user(
+            username='jo', email='jo@example.com', first_name='Jo', last_name='Müller', company='Nordtex',
+        )
+
+    def search(self, query):
+        return list(search_users(User.objects.all(), query).values_list('username', flat=True))
+
+    def tokens(self, user):
+        return set(UserSearchToken.objects.filter(user=user).values_list('token', flat=True))
+
+    def test_prefix_terms(self):
+        self.assertEqual(self.search('smi'), ['john'])
+        self.assertEqual(self.search('ACME sm'), ['john'])
+        self.assertEqual(self.search('acme nord'), [])
+        self.assertEqual(self.search('mü'), ['jo'])
+        self.assertEqual(sorted(self.search('  ')), ['jo', 'john'])
+
+    def test_exact_words_rank_first(self):
+        self.assertEqual(self.search('jo'), ['jo', 'john'])
+
+    def test_index_follows_saves(self):
+        self.jo.company = 'Baltic Knit'
+        self.jo.save()
+        self.assertEqual(self.search('nordtex'), [])
+        self.assertEqual(self.search('balt'), ['jo'])
+        with self.assertNumQueries(1):
+            self.jo.save(update_fields=['role'])
+
+    def test_migration_backfill(self):
+        expected = {user.pk: self.tokens(user) for user in (self.john, self.jo)}
+        UserSearchToken.objects.all().delete()
+        import_module('users.migrations.0004_user_search_index').build_search_index(apps, None)
+        self.assertEqual({user.pk: self.tokens(user) for user in (self.john, self.jo)}, expected)
+        self.assertEqual(expected[self.jo.pk], {'jo', 'example', 'com', 'müller', 'nordtex'})
+
+
+class AvatarTests(TestCase):
+    """Avatars are rendered at every size and format; replaced ones are cleaned up."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = self.settings(MEDIA_ROOT=media.name, MEDIA_URL='/media/')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', role='BUYER')
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', role='ADMIN')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Render synchronously instead of on the worker pool
+        submit = mock.patch('users.avatars._executor.submit', side_effect=lambda _, user_id: process_avatar(user_id))
+        submit.start()
+        self.addCleanup(submit.stop)
+
+    def upload(self, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 200), color).save(buffer, 'PNG')
+        avatar = SimpleUploadedFile('avatar.png', buffer.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/auth/me/', {'avatar': avatar}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        return self.user.avatar.name, self.user.avatar_fingerprint
+
+    def renditions(self, fingerprint):
+        return [
+            rendition_path(self.user.pk, fingerprint, size, ext)
+            for size in AVATAR_SIZES for ext, _, _ in AVATAR_FORMATS
+        ]
+
+    def test_renditions(self):
+        original, fingerprint = self.upload('red')
+        self.assertTrue(fingerprint)
+        paths = self.renditions(fingerprint)
+        self.assertEqual(len(paths), 8)
+        for path in paths:
+            self.assertTrue(default_storage.exists(path), path)
+        with default_storage.open(rendition_path(self.user.pk, fingerprint, 64, 'jpg')) as rendition, Image.open(rendition) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (64, 64)))
+        self.assertEqual(rendition_url(self.user, 40), f'/media/avatars/{self.user.pk}/{fingerprint}/64.jpg')
+        # Rendering the same content again changes nothing
+        self.assertEqual(process_avatar(self.user.pk), fingerprint)
+        self.assertTrue(default_storage.exists(original))
+
+    def test_replace_and_remove(self):
+        first, first_fingerprint = self.upload('red')
+        second, second_fingerprint = self.upload('blue')
+        self.assertNotEqual(first_fingerprint, second_fingerprint)
+        self.assertFalse(default_storage.exists(first))
+        for path in self.renditions(first_fingerprint):
+            self.assertFalse(default_storage.exists(path), path)
+        for path in self.renditions(second_fingerprint):
+            self.assertTrue(default_storage.exists(path), path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/auth/me/', {'remove_avatar': 'true'}, format='multipart')
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.avatar.name, self.user.avatar_fingerprint), ('', ''))
+        self.assertFalse(default_storage.exists(second))
+        for path in self.renditions(second_fingerprint):
+            self.assertFalse(default_storage.exists(path), path)
+
+    def test_replaced_while_processing(self):
+        with mock.patch('users.avatars._executor.submit'):
+            original, fingerprint = self.upload('red')
+        self.assertEqual(fingerprint, '')
+        with default_storage.open(original) as source:
+            rendered = hashlib.sha256(source.read()).hexdigest()[:12]
+        fit = ImageOps.fit
+
+        def replace_then_fit(*args, **kwargs):
+            User.objects.filter(pk=self.user.pk).update(avatar='avatars/other.png')
+            return fit(*args, **kwargs)
+
+        with mock.patch('users.avatars.ImageOps.fit', side_effect=replace_then_fit):
+            self.assertIsNone(process_avatar(self.user.pk))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_fingerprint, '')
+        for path in self.renditions(rendered):
+            self.assertFalse(default_storage.exists(path), path)
+
+    def test_variants_are_opt_in(self):
+        _, fingerprint = self.upload('red')
+        response = self.client.get('/api/auth/me/')
+        self.assertEqual(len(response.json()['avatar_variants']), 4)
+        self.assertTrue(response.json()['avatar_variants']['256']['webp'].endswith(f'/{fingerprint}/256.webp'))
 
-# Create your tests here.
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/users/manage/')
+        row = response.json()['results'][0]
+        self.assertNotIn('avatar_variants', row)
+        self.assertTrue(row['avatar'].endswith(f'/{fingerprint}/64.jpg'))
+        response = self.client.get('/api/users/manage/?avatar_variants=1')
+        row = response.json()['results'][0]
+        self.assertEqual(set(row['avatar_variants']['32']), {'webp', 'jpg'})
+        response = self.client.get(f'/api/users/manage/{self.user.pk}/')
+        self.assertIn('avatar_variants', response.json())
@@ -0,0 +1,189 @@
+from hashlib import sha256
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+from .models import ThrottleBucket
+
+
+class TokenBucketRateThrottle(SimpleRateThrottle):
+    """
+    Token bucket variant of DRF's SimpleRateThrottle.
+
+    Each key is a single ``ThrottleBucket`` row of ``(tokens, updated_at)``
+    instead of a list of request timestamps. Refilling and taking a token is
+    one conditional UPDATE that only matches while a token is available, so
+    concurrent workers cannot overspend a bucket; an allowed request costs
+    one query. A rate of ``5/min`` allows a burst of 5 requests and refills
+    one token every 12 seconds. Rates are configured per scope in
+    ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``; refilled buckets are
+    deleted by the purge_throttle_buckets command. Bucket keys hold a hash of
+    the identifying value, so long or personal values (e.g. email
+    addresses) are neither truncated nor stored.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tokens = None
+
+    def get_ident_value(self, request, view):
+        """Return the value requests are counted by, or None to skip throttling."""
+        return self.get_ident(request)
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_value(request, view)
+        if not ident:
+            return None
+        digest = sha256(str(ident).encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': digest}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        if self._take():
+            return True
+
+        bucket = ThrottleBucket.objects.filter(key=self.key).values_list('tokens', 'updated_at').first()
+        if bucket is None:
+            try:
+                with transaction.atomic():
+                    ThrottleBucket.objects.create(
+                        key=self.key,
+                        tokens=self.num_requests - 1,
+                        updated_at=self.now,
+                        full_at=self.now + 1 / self.refill_rate,
+                    )
+                return True
+            except IntegrityError:
+                # Created by a concurrent request in the meantime
+                if self._take():
+                    return True
+                bucket = ThrottleBucket.objects.filter(key=self.key).values_list('tokens', 'updated_at').first()
+                if bucket is None:
+                    return True
+
+        tokens, updated_at = bucket
+        self.tokens = min(self.num_requests, tokens + max(self.now - updated_at, 0) * self.refill_rate)
+        return False
+
+    def _take(self):
+        """Refill the bucket and take one token if available; True on success."""
+        refilled = Least(
+            Value(float(self.num_requests)),
+            F('tokens') + Greatest(Value(self.now) - F('updated_at'), Value(0.0)) * Value(self.refill_rate),
+            output_field=FloatField(),
+        )
+        remaining = refilled - Value(1.0)
+        return bool(
+            ThrottleBucket.objects
+            .filter(GreaterThanOrEqual(refilled, 1.0), key=self.key)
+            .update(
+                tokens=remaining,
+                updated_at=Value(self.now),
+                full_at=Value(self.now) + (Value(float(self.num_requests)) - remaining) / Value(self.refill_rate),
+            )
+        )
+
+    @property
+    def refill_rate(self):
+        return self.num_requests / self.duration
+
+    def wait(self):
+        if self.tokens is None:
+            return None
+        # Rounded so float noise does not push Retry-After up a second
+        return round(max(1 - self.tokens, 0) / self.refill_rate, 6)
+
+
+def purge_buckets(now):
+    """Delete buckets that have refilled by ``now`` (a missing bucket is a full one)."""
+    count, _ = ThrottleBucket.objects.filter(full_at__lt=now).delete()
+    return count
+
+
+def request_value(request, name):
+    """A top-level field of the request body, or '' if the body is not an object."""
+    data = request.data
+    if not isinstance(data, dict):
+        return ''
+    return data.get(name) or ''
+
+
+class AnonBurstRateThrottle(TokenBucketRateThrottle):
+    """Limit anonymous unsafe requests per client IP; reads are not throttled and cost no write."""
+
+    scope = 'anon'
+
+    def get_ident_value(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class LoginRateThrottle(TokenBucketRateThrottle):
+    """Limit login attempts per client IP."""
+
+    scope = 'login'
+
+
+class LoginIdentifierRateThrottle(TokenBucketRateThrottle):
+    """Limit login attempts per account, whichever IP they come from."""
+
+    scope = 'login_identifier'
+
+    def get_ident_value(self, request, view):
+        identifier = request_value(request, 'identifier') or request_value(request, 'email')
+        return str(identifier).strip().lower() or None
+
+
+class RegisterRateThrottle(TokenBucketRateThrottle):
+    """Limit account registrations per client IP."""
+
+    scope = 'register'
+
+
+class PasswordResetRateThrottle(TokenBucketRateThrottle):
+    """Limit OTP requests per client IP."""
+
+    scope = 'password_reset'
+
+
+class PasswordResetEmailRateThrottle(TokenBucketRateThrottle):
+    """Limit OTP requests per email address."""
+
+    scope = 'password_reset_email'
+
+    def get_ident_value(self, request, view):
+        email = request_value(request, 'email')
+        return str(email).strip().lower() or None
+
+
+class PasswordResetVerifyRateThrottle(TokenBucketRateThrottle):
+    """Limit OTP verification and reset confirmation attempts per client IP."""
+
+    scope = 'password_reset_verify'
+
+
+class WriteRateThrottle(TokenBucketRateThrottle):
+    """Limit unsafe requests per user, or per IP for anonymous clients."""
+
+    scope = 'write'
+
+    def get_ident_value(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        if request.user and request.user.is_authenticated:
+            return f'user-{request.user.pk}'
+        return self.get_ident(request)
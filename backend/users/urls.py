@@ -10,6 +10,8 @@ from .views import (
     ChangePasswordView,
     AdminUserListView,
     AdminUserDetailView,
+    AdminUserBulkStatusView,
+    AdminUserExportView,
 )
 
 urlpatterns = [
@@ -23,4 +25,6 @@ urlpatterns = [
     path('change-password/', ChangePasswordView.as_view(), name='change_password'),
     path('manage/', AdminUserListView.as_view(), name='admin_user_list'),
     path('manage/<int:pk>/', AdminUserDetailView.as_view(), name='admin_user_detail'),
+    path('manage/bulk-status/', AdminUserBulkStatusView.as_view(), name='admin_user_bulk_status'),
+    path('manage/export/', AdminUserExportView.as_view(), name='admin_user_export'),
 ]
@@ -1,3 +1,6 @@
+import csv
+import itertools
+import json
 import logging
 import random
 from datetime import timedelta
@@ -10,9 +13,11 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.mail import send_mail
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
-from django.db.models import Q
+from django.db import transaction
 from rest_framework.exceptions import ValidationError
 
 from .serializers import (
@@ -20,6 +25,7 @@ from .serializers import (
     UserCreateSerializer,
     UserUpdateSerializer,
     AdminUserUpdateSerializer,
+    AdminUserBulkStatusSerializer,
     ChangePasswordSerializer,
     PasswordResetRequestSerializer,
     PasswordResetVerifySerializer,
@@ -27,7 +33,18 @@ from .serializers import (
     CustomTokenObtainPairSerializer,
 )
 from .models import PasswordResetRequest
+from .notifications import build_status_email, queue_status_emails
 from .permissions import IsAdminRole
+from .search import search_users
+from .throttling import (
+    AnonBurstRateThrottle,
+    LoginRateThrottle,
+    LoginIdentifierRateThrottle,
+    RegisterRateThrottle,
+    PasswordResetRateThrottle,
+    PasswordResetEmailRateThrottle,
+    PasswordResetVerifyRateThrottle,
+)
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -38,11 +55,13 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [AllowAny]
     serializer_class = UserCreateSerializer
+    throttle_classes = [AnonBurstRateThrottle, RegisterRateThrottle]
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     """Login endpoint - returns JWT tokens + user data"""
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [AnonBurstRateThrottle, LoginRateThrottle, LoginIdentifierRateThrottle]
 
 
 
@@ -59,13 +78,18 @@ class CurrentUserView(generics.RetrieveUpdateAPIView):
             return UserUpdateSerializer
         return UserSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['avatar_variants'] = True
+        return context
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', True)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        read_serializer = UserSerializer(user, context={'request': request})
+        read_serializer = UserSerializer(user, context=self.get_serializer_context())
         return Response(read_serializer.data, status=status.HTTP_200_OK)
 
 
@@ -74,6 +98,7 @@ class PasswordResetRequestView(generics.GenericAPIView):
 
     permission_classes = [AllowAny]
     serializer_class = PasswordResetRequestSerializer
+    throttle_classes = [AnonBurstRateThrottle, PasswordResetRateThrottle, PasswordResetEmailRateThrottle]
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -129,6 +154,7 @@ class PasswordResetVerifyView(generics.GenericAPIView):
 
     permission_classes = [AllowAny]
     serializer_class = PasswordResetVerifySerializer
+    throttle_classes = [AnonBurstRateThrottle, PasswordResetVerifyRateThrottle]
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -205,6 +231,7 @@ class PasswordResetConfirmView(generics.GenericAPIView):
 
     permission_classes = [AllowAny]
     serializer_class = PasswordResetConfirmSerializer
+    throttle_classes = [AnonBurstRateThrottle, PasswordResetVerifyRateThrottle]
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -283,29 +310,103 @@ class AdminUserListView(generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdminRole]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['avatar_size'] = 64
+        context['avatar_variants'] = self.request.query_params.get('avatar_variants', '').lower() in ('1', 'true', 'yes')
+        return context
+
     def get_queryset(self):
         queryset = super().get_queryset().exclude(role='ADMIN')
         search = self.request.query_params.get('search', '').strip()
         role = self.request.query_params.get('role', '').strip().upper()
 
-        if search:
-            queryset = queryset.filter(
-                Q(email__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(company__icontains=search)
-            )
-
         if role:
-            queryset = queryset.filter(role__iexact=role)
+            queryset = queryset.filter(role=role)
 
         status_param = self.request.query_params.get('status', '').strip().upper()
         if status_param:
             queryset = queryset.filter(approval_status=status_param)
 
+        if search:
+            queryset = search_users(queryset, search)
+
         return queryset
 
 
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv rows."""
+
+    def write(self, value):
+        return value
+
+
+# Leading characters that make spreadsheet applications evaluate a cell
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_safe(value):
+    """Quote user-entered text that a spreadsheet would run as a formula."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class AdminUserExportView(AdminUserListView):
+    """Stream the filtered user directory as CSV or NDJSON.
+
+    Accepts the same search/role/status filters as the list view plus
+    `export_format` (`csv`, the default, or `ndjson`). Rows are read with
+    values_list().iterator() and written as they are produced, so memory use
+    stays flat regardless of how many users match. CSV cells that start like
+    a formula are prefixed with a quote so spreadsheets show them as text.
+    """
+
+    EXPORT_FIELDS = [
+        'id', 'email', 'username', 'first_name', 'last_name', 'role', 'phone',
+        'company', 'approval_status', 'is_active', 'created_at', 'last_login', 'avatar',
+    ]
+    CHUNK_SIZE = 2000
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'csv').strip().lower()
+        if export_format not in ('csv', 'ndjson'):
+            raise ValidationError({'export_format': 'Use "csv" or "ndjson".'})
+
+        rows = (
+            self.get_queryset()
+            .values_list(*self.EXPORT_FIELDS)
+            .iterator(chunk_size=self.CHUNK_SIZE)
+        )
+        media_url = request.build_absolute_uri(settings.MEDIA_URL)
+        avatar_index = self.EXPORT_FIELDS.index('avatar')
+
+        def prepared_rows():
+            for row in rows:
+                row = list(row)
+                if row[avatar_index]:
+                    row[avatar_index] = media_url + row[avatar_index]
+                yield row
+
+        timestamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        if export_format == 'ndjson':
+            content = (
+                json.dumps(dict(zip(self.EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
+                for row in prepared_rows()
+            )
+            response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+        else:
+            writer = csv.writer(_Echo())
+            content = itertools.chain(
+                [writer.writerow(self.EXPORT_FIELDS)],
+                (writer.writerow([_csv_safe(value) for value in row]) for row in prepared_rows()),
+            )
+            response = StreamingHttpResponse(content, content_type='text/csv')
+
+        response['Content-Disposition'] = f'attachment; filename="users-{timestamp}.{export_format}"'
+        return response
+
+
 class AdminUserDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Allow admins to view, edit, or delete a specific user."""
 
@@ -317,6 +418,11 @@ class AdminUserDetailView(generics.RetrieveUpdateDestroyAPIView):
             return AdminUserUpdateSerializer
         return UserSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['avatar_variants'] = True
+        return context
+
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', True)
         instance = self.get_object()
@@ -331,7 +437,7 @@ class AdminUserDetailView(generics.RetrieveUpdateDestroyAPIView):
         elif user.approval_status == 'APPROVED' and not user.is_active:
             user.is_active = True
             user.save(update_fields=['is_active'])
-        read_serializer = UserSerializer(user, context={'request': request})
+        read_serializer = UserSerializer(user, context=self.get_serializer_context())
         return Response(read_serializer.data, status=status.HTTP_200_OK)
 
     def perform_destroy(self, instance):
@@ -367,25 +473,80 @@ class AdminUserDetailView(generics.RetrieveUpdateDestroyAPIView):
     def _send_status_email(self, user, approved=True):
         if not user.email:
             return
-        subject = 'Your Prime Apparel account has been approved' if approved else 'Update on your Prime Apparel account'
-        if approved:
-            message = (
-                f"Hello {user.get_full_name() or 'there'},\n\n"
-                "Your seller/designer account has been approved by our team. "
-                "You can now log in and start using the Prime Apparel platform.\n\n"
-                "Thank you for partnering with us!"
-            )
-        else:
-            notes = user.approval_notes or 'Unfortunately, we could not approve your account at this time.'
-            message = (
-                f"Hello {user.get_full_name() or 'there'},\n\n"
-                "We reviewed your seller/designer application but could not approve it at this time.\n"
-                f"Reason: {notes}\n\n"
-                "If you believe this is a mistake or wish to re-apply, please contact our support team."
-            )
-
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@primeapparel.local')
+        subject, message, from_email, recipients = build_status_email(user, approved=approved)
         try:
-            send_mail(subject, message, from_email, [user.email], fail_silently=False)
+            send_mail(subject, message, from_email, recipients, fail_silently=False)
         except Exception:
             logger.exception('Failed to send approval notification to %s', user.email)
+
+
+class AdminUserBulkStatusView(generics.GenericAPIView):
+    """Approve, reject or reset many users at once."""
+
+    permission_classes = [IsAuthenticated, IsAdminRole]
+    serializer_class = AdminUserBulkStatusSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        new_status = serializer.validated_data['approval_status']
+        notes = serializer.validated_data.get('approval_notes')
+
+        results = {pk: 'not_found' for pk in ids}
+        reasons = {}
+        if request.user.pk in results:
+            results[request.user.pk] = 'skipped'
+            reasons[request.user.pk] = 'You cannot change your own status.'
+
+        fields = {'approval_status': new_status}
+        if new_status == 'APPROVED':
+            fields.update(is_active=True, approved_at=timezone.now(), approved_by=request.user)
+        else:
+            fields.update(is_active=False, approved_at=None, approved_by=None)
+        if notes is not None:
+            fields['approval_notes'] = notes
+
+        with transaction.atomic():
+            candidates = (
+                User.objects
+                .select_for_update()
+                .filter(pk__in=ids)
+                .exclude(pk=request.user.pk)
+                .values_list('pk', 'role', 'approval_status')
+            )
+            changed = []
+            for pk, role, current_status in candidates:
+                if role == 'ADMIN':
+                    results[pk] = 'skipped'
+                    reasons[pk] = 'Admin accounts cannot be changed in bulk.'
+                elif current_status == new_status:
+                    results[pk] = 'unchanged'
+                else:
+                    changed.append(pk)
+                    results[pk] = 'updated'
+
+            if changed:
+                User.objects.filter(pk__in=changed).update(**fields)
+
+            if changed and new_status in ('APPROVED', 'REJECTED'):
+                recipients = list(
+                    User.objects
+                    .filter(pk__in=changed)
+                    .only('email', 'first_name', 'last_name', 'approval_notes')
+                )
+                transaction.on_commit(
+                    lambda: queue_status_emails(recipients, approved=new_status == 'APPROVED')
+                )
+
+        return Response(
+            {
+                'updated': len(changed),
+                'results': [
+                    {'id': pk, 'result': result, **({'reason': reasons[pk]} if pk in reasons else {})}
+                    for pk, result in results.items()
+                ],
+            },
+            status=status.HTTP_200_OK,
+        )